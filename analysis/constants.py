@@ -11,6 +11,14 @@
 # Таймаут на загрузку 1D данных (Этап 2: Проверка зрелости)
 FETCH_MATURITY_TIMEOUT = 180.0 
 
+# Отложенный (хеджированный) Fallback на Этапе 2:
+# Bybit запускается, только если Binance не ответил за перцентиль латентности
+HEDGE_LATENCY_PERCENTILE = 0.95
+HEDGE_DEFAULT_DELAY = 10.0   # Пока выборка латентностей мала
+HEDGE_MIN_SAMPLES = 10
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MAX_DELAY = 30.0
+
 # Таймаут на загрузку ВСЕХ ТФ для 1 монеты (Этап 3: Полный анализ)
 FETCH_ANALYSIS_TIMEOUT = 450.0
 
@@ -0,0 +1,59 @@
+# analysis/deadline.py
+
+"""
+Дедлайн запуска анализа.
+
+Хостинг "убивает" долгие запуски, поэтому запуск может быть ограничен
+по времени: этапы 2-3 перестают планировать новые пачки, когда до дедлайна
+остается меньше резерва на сохранение (config.RUN_DEADLINE_SAVE_RESERVE_SECONDS),
+а все, что успело завершиться, сохраняется.
+"""
+
+import time
+from typing import Optional
+
+import config
+
+
+class RunDeadline:
+    """
+    Дедлайн ОДНОГО запуска. seconds=None -> без ограничения.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, reserve_seconds: Optional[float] = None):
+        self.seconds = float(seconds) if seconds else None
+        self.reserve_seconds = (
+            float(reserve_seconds) if reserve_seconds is not None
+            else float(config.RUN_DEADLINE_SAVE_RESERVE_SECONDS)
+        )
+        self.started_at = time.monotonic()
+        self.hit = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.seconds is not None
+
+    def remaining(self) -> Optional[float]:
+        """Секунды до дедлайна (None, если дедлайна нет)."""
+        if not self.enabled:
+            return None
+        return self.seconds - (time.monotonic() - self.started_at)
+
+    def work_time_left(self) -> Optional[float]:
+        """Время на работу (до дедлайна минус резерв на сохранение)."""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return max(0.0, remaining - self.reserve_seconds)
+
+    def should_stop_scheduling(self) -> bool:
+        """True, если новые пачки планировать уже нельзя (запоминается в 'hit')."""
+        left = self.work_time_left()
+        if left is not None and left <= 0:
+            self.hit = True
+        return self.hit
+
+    def cap_timeout(self, timeout: float) -> float:
+        """Таймаут ожидания, не выходящий за дедлайн работы."""
+        left = self.work_time_left()
+        return timeout if left is None else max(0.0, min(timeout, left))
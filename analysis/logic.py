@@ -14,6 +14,10 @@ import gc
 import config
 from services import data_fetcher
 from services import mongo_service  # <-- Используем Mongo-сервис
+from services import exchange_registry
+from services import exchange_controller
+from services import history_service
+from services.checkpoint_service import RunCheckpoint
 
 # (ИЗМЕНЕНИЕ) Импортируем 'calculate_volume_categories'
 from metrics.ranking import calculate_volume_categories 
@@ -22,19 +26,73 @@ from metrics.ranking import calculate_volume_categories
 from .stage_0_prereqs import load_btc_and_blacklist
 from .stage_2_maturity import run_maturity_stage
 from .stage_3_analysis_workers import run_analysis_stage_workers
+from .deadline import RunDeadline
+from .priority import load_previous_meta, prioritize_coins
+from .refresh import load_previous_docs, plan_refresh, merge_with_previous
+from .staging import StagedResults
 
 # --- Настройка ---
 log = logging.getLogger(__name__)
 
 
+# --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ (ДЕДЛАЙН) ---
+
+async def _load_stale_coins(universe_symbols, fresh_symbols, log_prefix="", previous=None):
+    """
+    Монеты из текущего списка (Этап 1) без свежих метрик: берутся из
+    прошлого сохраненного результата и помечаются is_stale=True.
+    previous: уже загруженные документы (дифференциальный запуск).
+    """
+    if previous is None:
+        previous = await mongo_service.get_all_coins_from_mongo_async(f"{log_prefix}[Дедлайн]")
+    stale_coins = []
+    for coin in previous:
+        full_symbol = coin.get('full_symbol')
+        if full_symbol in universe_symbols and full_symbol not in fresh_symbols:
+            coin['is_stale'] = True
+            stale_coins.append(coin)
+    log.info(f"{log_prefix} ⏰ Перенесено {len(stale_coins)} монет с прошлыми (устаревшими) метриками.")
+    return stale_coins
+
+
+def _build_coverage(deadline, total_found, total_mature, total_fresh, stale_carried):
+    """Покрытие запуска (записывается в лог запуска)."""
+    return {
+        'deadline_seconds': deadline.seconds,
+        'deadline_hit': deadline.hit,
+        'universe': total_found,
+        'mature': total_mature,
+        'fresh': total_fresh,
+        'stale_carried': stale_carried,
+        'fresh_pct': round(total_fresh / total_found * 100, 1) if total_found else 0.0
+    }
+
+
 # --- ГЛАВНАЯ ЛОГИКА ---
 
-async def analysis_logic(run_id, log_prefix=""):
+async def analysis_logic(run_id, log_prefix="", resume=False, deadline_seconds=None):
     """
     Главная "дирижерская" функция анализа.
+
+    Результаты Этапов 1-3 сохраняются в контрольные точки под 'run_id'.
+    resume=True: завершенные этапы берутся из контрольных точек прерванного
+    запуска с тем же 'run_id', а на Этапе 3 пропускаются готовые монеты.
+
+    deadline_seconds: дедлайн запуска. Ближе к нему новые пачки не
+    планируются; сохраняется то, что успело завершиться (is_stale=False),
+    а монеты без свежих метрик переносятся из прошлого запуска (is_stale=True).
+    Покрытие записывается в лог запуска ('coverage').
+
+    Готовые пачки Этапа 3 пишутся в промежуточную коллекцию запуска, которая
+    на Этапе 4 атомарно подменяет 'coin-sifter' (см. analysis/staging.py).
     """
     start_time = time.time()
-    log.info(f"{log_prefix} --- НАЧАЛО АНАЛИЗА (Run ID: {run_id}) ---")
+    log.info(f"{log_prefix} --- НАЧАЛО АНАЛИЗА (Run ID: {run_id}{', ВОЗОБНОВЛЕНИЕ' if resume else ''}) ---")
+    
+    checkpoint = RunCheckpoint(run_id, log_prefix)
+    deadline = RunDeadline(deadline_seconds)
+    if deadline.enabled:
+        log.info(f"{log_prefix} ⏰ Дедлайн запуска: {deadline.seconds:.0f}с (резерв на сохранение: {deadline.reserve_seconds:.0f}с).")
 
     btc_cache_1d = None
     active_exchanges = {}
@@ -47,9 +105,21 @@ async def analysis_logic(run_id, log_prefix=""):
     saved_count = 0
     
     skipped_coins = defaultdict(set) 
+    universe_symbols = set()
+    stale_carried = 0
+    previous_docs = {}
+    write_report = None
 
     try:
-        # --- ЭТАП 0: КЭШ BTC И ЧЕРНЫЙ СПИСОК ---
+        # --- ЭТАП 0: ПРОВЕРКА БИРЖ (РЕЕСТР), КЭШ BTC И ЧЕРНЫЙ СПИСОК ---
+        
+        # Теплые экземпляры из реестра проверяются health-check'ом
+        # (при провале — пересоздаются)
+        await exchange_registry.ensure_healthy_exchanges(
+            config.EXCHANGES_TO_LOAD, f"{log_prefix}[Этап 0]"
+        )
+        # Лимиты конкурентности и цепи бирж "учатся" заново в каждом запуске
+        exchange_controller.reset_controllers()
         
         btc_cache_1d, blacklist = await load_btc_and_blacklist(log_prefix)
         
@@ -59,20 +129,47 @@ async def analysis_logic(run_id, log_prefix=""):
         
         # --- ЭТАП 1: ЗАГРУЗКА ДАННЫХ ---
         log_prefix_1 = f"{log_prefix}[Этап 1]"
-        log.info(f"{log_prefix_1} Загрузка всех монет...")
-        
-        all_coins_data, active_exchanges, markets_map, skipped_fetch = \
-            await data_fetcher.fetch_all_coins_data(
-                config.EXCHANGES_TO_LOAD,
-                config.QUOTE_CURRENCIES,
-                blacklist,
-                log_prefix_1
+        
+        stage1_checkpoint = await checkpoint.load_stage1() if resume else None
+        
+        if stage1_checkpoint is not None:
+            all_coins_data, skipped_fetch = stage1_checkpoint
+            log.info(f"{log_prefix_1} ♻️ Список монет ({len(all_coins_data)}) взят из контрольной точки.")
+            # Биржи (реестр) и рынки (кэш) нужны Этапам 2-3
+            active_exchanges, markets_map = await data_fetcher.init_exchanges_and_markets(
+                config.EXCHANGES_TO_LOAD, config.QUOTE_CURRENCIES, log_prefix_1
             )
+        else:
+            log.info(f"{log_prefix_1} Загрузка всех монет...")
+            
+            all_coins_data, active_exchanges, markets_map, skipped_fetch = \
+                await data_fetcher.fetch_all_coins_data(
+                    config.EXCHANGES_TO_LOAD,
+                    config.QUOTE_CURRENCIES,
+                    blacklist,
+                    log_prefix_1
+                )
+            if all_coins_data:
+                await checkpoint.save_stage1(all_coins_data, skipped_fetch)
         
         for reason, symbols in skipped_fetch.items():
             skipped_coins[reason].update(symbols)
 
+        # Дифференциальный запуск: на Этапе 3 пересчитываются только
+        # "просроченные" ТФ (config.TIMEFRAME_REFRESH_HOURS)
+        if config.DIFFERENTIAL_RUNS_ENABLED:
+            previous_docs = await load_previous_docs(log_prefix_1)
+            plan_refresh(all_coins_data, previous_docs, log_prefix=log_prefix_1)
+            # Полные документы содержат и метаданные для приоритета
+            previous_meta = previous_docs
+        else:
+            previous_meta = await load_previous_meta(log_prefix_1)
+
+        # Очередь по приоритету (объем, прошлая категория, устаревание метрик)
+        all_coins_data = prioritize_coins(all_coins_data, previous_meta, log_prefix=log_prefix_1)
+        
         total_found = len(all_coins_data)
+        universe_symbols = {c['full_symbol'] for c in all_coins_data}
         if total_found == 0:
             log.warning(f"{log_prefix_1} ⛔ (Этап 1) Не найдено ни одной монеты.")
             return 0, "Не найдено монет (Этап 1)"
@@ -81,12 +178,21 @@ async def analysis_logic(run_id, log_prefix=""):
 
         # --- ЭТАП 2: ПРОВЕРКА "ЗРЕЛОСТИ" ---
         
-        mature_coins_map, skipped_maturity = await run_maturity_stage(
-            all_coins_data,
-            active_exchanges,  
-            btc_cache_1d,
-            log_prefix
-        )
+        stage2_checkpoint = await checkpoint.load_stage2() if resume else None
+        
+        if stage2_checkpoint is not None:
+            mature_coins_map, skipped_maturity = stage2_checkpoint
+            log.info(f"{log_prefix}[Этап 2] ♻️ 'Зрелые' монеты ({len(mature_coins_map)}) взяты из контрольной точки.")
+        else:
+            mature_coins_map, skipped_maturity = await run_maturity_stage(
+                all_coins_data,
+                active_exchanges,  
+                btc_cache_1d,
+                log_prefix,
+                markets_map=markets_map,
+                deadline=deadline
+            )
+            await checkpoint.save_stage2(mature_coins_map, skipped_maturity)
         
         for reason, symbols in skipped_maturity.items():
             skipped_coins[reason].update(symbols)
@@ -101,13 +207,39 @@ async def analysis_logic(run_id, log_prefix=""):
 
         # --- ЭТАП 3: ПОЛНЫЙ АНАЛИЗ ---
         
+        # Готовые пачки сразу пишутся в промежуточную коллекцию запуска
+        staging = StagedResults(run_id, previous_docs, log_prefix)
+        await staging.start()
+        
+        completed_results = await checkpoint.load_stage3_results() if resume else []
+        if completed_results:
+            completed_symbols = {r['symbol'] for r in completed_results}
+            mature_coins_map = {
+                symbol: value for symbol, value in mature_coins_map.items()
+                if symbol not in completed_symbols
+            }
+            log.info(
+                f"{log_prefix}[Этап 3] ♻️ {len(completed_results)} монет уже проанализированы "
+                f"(контрольная точка). Осталось: {len(mature_coins_map)}."
+            )
+            await staging.write(completed_results)
+        
         final_data_to_save, skipped_analysis_set = await run_analysis_stage_workers(
             mature_coins_map,
             active_exchanges,
             markets_map,
             btc_cache_1d,
-            log_prefix
+            log_prefix,
+            checkpoint=checkpoint,
+            deadline=deadline,
+            staging=staging
         )
+        final_data_to_save = completed_results + final_data_to_save
+        
+        for coin in final_data_to_save:
+            # Метрики непересчитанных ТФ — из сохраненного документа
+            merge_with_previous(coin, previous_docs.get(coin['full_symbol']))
+            coin['is_stale'] = False
         
         if skipped_analysis_set:
             skipped_coins["Analysis (Error/Timeout)"].update(skipped_analysis_set)
@@ -122,6 +254,18 @@ async def analysis_logic(run_id, log_prefix=""):
             return 0, "Не удалось проанализировать монеты (Этап 3)"
             
         log.info(f"{log_prefix} (Этап 3) ✅ Успешно проанализировано {total_successful} монет.")
+        
+        # --- ДЕДЛАЙН: перенос прошлых метрик для непроанализированных монет ---
+        if deadline.hit:
+            stale_coins = await _load_stale_coins(
+                universe_symbols,
+                {c['full_symbol'] for c in final_data_to_save},
+                log_prefix,
+                previous=list(previous_docs.values()) if previous_docs else None
+            )
+            stale_carried = len(stale_coins)
+            final_data_to_save.extend(stale_coins)
+            await staging.write(stale_coins)
 
         # --- (ИЗМЕНЕНИЕ) ЭТАП 5 (РАНГИ) ПЕРЕМЕЩЕН ПЕРЕД ЭТАПОМ 4 ---
         log_prefix_5 = f"{log_prefix}[Этап 5]"
@@ -146,14 +290,43 @@ async def analysis_logic(run_id, log_prefix=""):
         log_prefix_4 = f"{log_prefix}[Этап 4]"
         log.info(f"{log_prefix_4} Сохранение {total_successful} монет в MongoDB...")
         try:
-            # (Логика clear_existing_data() теперь внутри save_coins_to_mongo)
-            saved_count = await mongo_service.save_coins_to_mongo(final_data_to_save, log_prefix_4)
+            if config.COINS_SAVE_MODE == 'diff':
+                # Только измененные поля + удаление выбывших монет
+                saved_count, write_report = await mongo_service.upsert_coins_diff(final_data_to_save, log_prefix_4)
+            else:
+                # Промежуточная коллекция (пачки Этапа 3) атомарно подменяет 'coin-sifter'
+                saved_count = await staging.promote(
+                    {c['full_symbol']: c['category'] for c in final_data_to_save if 'category' in c},
+                    expected_count=len(final_data_to_save)
+                )
+                if not saved_count:
+                    if staging.enabled:
+                        log.warning(f"{log_prefix_4} ⚠️ Поэтапная запись не удалась, сохраняю результат целиком...")
+                        await staging.discard()
+                    # (Версия целиком -> проверка -> атомарная подмена)
+                    saved_count = await mongo_service.save_coins_to_mongo_v3(final_data_to_save, log_prefix_4)
             log.info(f"{log_prefix_4} ✅ Успешно сохранено {saved_count} монет в MongoDB.")
+            
+            # История метрик (для графиков изменения метрик монеты)
+            if saved_count:
+                await history_service.append_run_metrics(final_data_to_save, run_id, log_prefix_4)
         
         except Exception as e:
             log.error(f"{log_prefix_4} ❌ Ошибка при сохранении в MongoDB: {e}", exc_info=True)
+        
+        log_fields = {
+            'coverage': _build_coverage(deadline, total_found, total_mature, total_successful, stale_carried)
+        }
+        if write_report:
+            log_fields['write_report'] = write_report
+        await mongo_service.update_mongo_log_fields(run_id, log_fields)
+        
+        # Запуск завершен -> контрольные точки больше не нужны
+        if saved_count:
+            await checkpoint.clear()
             
         del final_data_to_save
+        previous_docs = {}
         gc.collect()
             
         # (ИЗМЕНЕНИЕ) ЭТАП 5 УДАЛЕН ОТСЮДА
@@ -183,12 +356,17 @@ async def analysis_logic(run_id, log_prefix=""):
         log.info(f"{log_prefix} ║ Найдено (Объем): {total_found:>44} ║")
         log.info(f"{log_prefix} ║ Найдено ('Зрелых'): {total_mature:>40} ║")
         log.info(f"{log_prefix} ║ Успешно проанализировано: {total_successful:>33} ║")
+        if deadline.hit:
+            log.info(f"{log_prefix} ║ Перенесено (устаревшие, дедлайн): {stale_carried:>24} ║")
         log.info(f"{log_prefix} ║ Ошибок (всего): {total_skipped:>41} ║") 
         # (ИЗМЕНЕНИЕ) Обновлен текст
         log.info(f"{log_prefix} ║ Сохранено в MongoDB: {saved_count:>38} ║")
         log.info(f"{log_prefix} ╚{'═' * 60}╝")
         
-        return saved_count, f"Анализ завершен. Сохранено {saved_count} из {total_successful} 'зрелых' монет."
+        details = f"Анализ завершен. Сохранено {saved_count} из {total_successful} 'зрелых' монет."
+        if deadline.hit:
+            details += f" (Дедлайн: частичный результат, перенесено устаревших: {stale_carried})"
+        return saved_count, details
 
     except Exception as e:
         log.error(f"{log_prefix} КРИТИЧЕСКАЯ ОШИБКА в analysis_logic: {e}", exc_info=True)
@@ -207,15 +385,10 @@ async def analysis_logic(run_id, log_prefix=""):
         except Exception as e:
             log.error(f"{log_prefix} Ошибка при закрытии MongoDB в finally: {e}")
 
+        # (ИЗМЕНЕНИЕ) Соединения с биржами НЕ закрываются: ими владеет
+        # реестр (services/exchange_registry.py), они переиспользуются
+        # следующим запуском и закрываются на shutdown API.
         if active_exchanges:
-            log.info(f"{log_prefix} Закрытие {len(active_exchanges)} активных соединений...")
-            
-            close_tasks = []
-            for ex in active_exchanges.values():
-                if ex and hasattr(ex, 'close'):
-                    close_tasks.append(ex.close())
-            
-            if close_tasks:
-                await asyncio.gather(*close_tasks, return_exceptions=True)
-            
-            log.info(f"{log_prefix} Все соединения закрыты.")
\ No newline at end of file
+            log.info(f"{log_prefix} {len(active_exchanges)} соединений с биржами оставлены в реестре.")
+
+        exchange_controller.log_controller_summary(log_prefix)
\ No newline at end of file
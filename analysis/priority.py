@@ -0,0 +1,96 @@
+# analysis/priority.py
+
+"""
+Приоритет монет в очереди анализа (Этапы 2-3).
+
+Приоритет = взвешенная сумма (config.PRIORITY_WEIGHTS) трех компонент в [0, 1]:
+- volume:    перцентиль 'volume_24h_usd' в текущем списке монет;
+- category:  категория (ранг 1-6) из прошлого сохраненного результата;
+- staleness: возраст сохраненных метрик / config.PRIORITY_STALENESS_HORIZON_HOURS
+             (новая монета без метрик = 1.0).
+
+При медленном или обрезанном (дедлайн) запуске самые важные монеты
+обрабатываются первыми.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import config
+from services import mongo_service
+
+log = logging.getLogger(__name__)
+
+# Нейтральная категория для монет без истории
+DEFAULT_CATEGORY_SCORE = 0.5
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _staleness_score(analyzed_at: Optional[datetime], now: datetime) -> float:
+    if not isinstance(analyzed_at, datetime):
+        return 1.0
+    age_hours = (now - _as_utc(analyzed_at)).total_seconds() / 3600
+    horizon = config.PRIORITY_STALENESS_HORIZON_HOURS
+    return min(max(age_hours / horizon, 0.0), 1.0) if horizon > 0 else 1.0
+
+
+def _category_score(category: Any) -> float:
+    try:
+        return (min(max(int(category), 1), 6) - 1) / 5
+    except (TypeError, ValueError):
+        return DEFAULT_CATEGORY_SCORE
+
+
+async def load_previous_meta(log_prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    """Метаданные прошлого результата (категория, analyzed_at). Ошибка -> {}."""
+    try:
+        return await mongo_service.get_coins_meta_from_mongo_async(f"{log_prefix}[Priority]")
+    except Exception as e:
+        log.warning(f"{log_prefix}[Priority] ⚠️ Нет метаданных прошлого запуска: {e}")
+        return {}
+
+
+def prioritize_coins(
+    coins: List[dict],
+    previous_meta: Optional[Dict[str, Dict[str, Any]]] = None,
+    now: Optional[datetime] = None,
+    log_prefix: str = ""
+) -> List[dict]:
+    """
+    Проставляет 'coin["_priority"]' и возвращает монеты по убыванию приоритета.
+    """
+    previous_meta = previous_meta or {}
+    now = now or datetime.now(timezone.utc)
+    weights = config.PRIORITY_WEIGHTS
+
+    # Перцентиль объема (устойчив к "тяжелому хвосту" объемов)
+    by_volume = sorted(coins, key=lambda c: c.get('volume_24h_usd') or 0.0)
+    denominator = max(len(by_volume) - 1, 1)
+    volume_score = {id(c): idx / denominator for idx, c in enumerate(by_volume)}
+
+    for coin in coins:
+        meta = previous_meta.get(coin.get('full_symbol')) or {}
+        coin['_priority'] = round(
+            weights.get('volume', 0.0) * volume_score[id(coin)]
+            + weights.get('category', 0.0) * _category_score(meta.get('category'))
+            + weights.get('staleness', 0.0) * _staleness_score(meta.get('analyzed_at'), now),
+            6
+        )
+
+    ordered = sorted(coins, key=priority_sort_key, reverse=True)
+    if ordered:
+        log.info(
+            f"{log_prefix} 🎯 Приоритет очереди: {len(ordered)} монет "
+            f"(с историей: {sum(1 for c in coins if c.get('full_symbol') in previous_meta)}). "
+            f"Первые: {', '.join(c['symbol'] for c in ordered[:5])}"
+        )
+    return ordered
+
+
+def priority_sort_key(coin_data: dict):
+    """Ключ сортировки (reverse=True): приоритет, затем объем."""
+    return (coin_data.get('_priority', 0.0), coin_data.get('volume_24h_usd') or 0.0)
@@ -0,0 +1,112 @@
+# analysis/refresh.py
+
+"""
+Дифференциальные запуски: пересчет по таймфреймам.
+
+Метрика 1d не меняется в течение дня, поэтому каждый ТФ пересчитывается
+со своей частотой (config.TIMEFRAME_REFRESH_HOURS). Сохраненный документ
+монеты хранит время пересчета каждого ТФ в 'analyzed_at_tf'.
+
+- plan_refresh: до Этапа 2 проставляет 'coin["_due_timeframes"]' —
+  ТФ, которые пора загрузить и пересчитать (нет истории -> все ТФ);
+- Этап 3 загружает и считает только эти ТФ;
+- merge_with_previous: метрики остальных ТФ (и их отметки времени)
+  переносятся из сохраненного документа.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import config
+from services import mongo_service
+from metrics.calculator import TIMEFRAMES, metric_timeframe
+
+log = logging.getLogger(__name__)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def due_timeframes(tf_stamps: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> List[str]:
+    """
+    ТФ, которые пора пересчитать (порядок TIMEFRAMES).
+    Нет отметки или истек период config.TIMEFRAME_REFRESH_HOURS -> ТФ "просрочен".
+    """
+    tf_stamps = tf_stamps or {}
+    now = now or datetime.now(timezone.utc)
+    tolerance = timedelta(minutes=config.TIMEFRAME_REFRESH_TOLERANCE_MINUTES)
+
+    due = []
+    for tf in TIMEFRAMES:
+        stamp = tf_stamps.get(tf)
+        period = timedelta(hours=config.TIMEFRAME_REFRESH_HOURS.get(tf, 0))
+        if not isinstance(stamp, datetime) or now - _as_utc(stamp) >= period - tolerance:
+            due.append(tf)
+    return due
+
+
+async def load_previous_docs(log_prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    """Сохраненные документы монет {full_symbol: doc}. Ошибка -> {} (полный пересчет)."""
+    try:
+        docs = await mongo_service.get_all_coins_from_mongo_async(f"{log_prefix}[Refresh]")
+        return {doc['full_symbol']: doc for doc in docs if doc.get('full_symbol')}
+    except Exception as e:
+        log.warning(f"{log_prefix}[Refresh] ⚠️ Нет сохраненных документов, полный пересчет: {e}")
+        return {}
+
+
+def plan_refresh(
+    coins: List[dict],
+    previous_docs: Optional[Dict[str, Dict[str, Any]]] = None,
+    now: Optional[datetime] = None,
+    log_prefix: str = ""
+) -> Dict[str, int]:
+    """
+    Проставляет 'coin["_due_timeframes"]' и возвращает сводку
+    {ТФ: кол-во монет, которым его пора пересчитать}.
+    """
+    previous_docs = previous_docs or {}
+    now = now or datetime.now(timezone.utc)
+
+    summary = {tf: 0 for tf in TIMEFRAMES}
+    for coin in coins:
+        previous = previous_docs.get(coin.get('full_symbol')) or {}
+        coin['_due_timeframes'] = due_timeframes(previous.get('analyzed_at_tf'), now)
+        for tf in coin['_due_timeframes']:
+            summary[tf] += 1
+
+    if coins:
+        total_work = sum(summary.values())
+        log.info(
+            f"{log_prefix} 🔁 Дифференциальный запуск: "
+            f"{', '.join(f'{tf}={count}' for tf, count in summary.items())} "
+            f"({total_work}/{len(coins) * len(TIMEFRAMES)} пар монета×ТФ)"
+        )
+    return summary
+
+
+def merge_with_previous(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Дополняет свежий результат метриками непересчитанных ТФ из
+    сохраненного документа (вместе с их отметками 'analyzed_at_tf').
+    """
+    if not previous:
+        return result
+
+    fresh_stamps = result.get('analyzed_at_tf') or {}
+    previous_stamps = previous.get('analyzed_at_tf') or {}
+    carried_tfs = {tf for tf in previous_stamps if tf not in fresh_stamps}
+    if not carried_tfs:
+        return result
+
+    for key, value in previous.items():
+        if key not in result and metric_timeframe(key) in carried_tfs:
+            result[key] = value
+
+    result['analyzed_at_tf'] = {
+        **{tf: previous_stamps[tf] for tf in carried_tfs},
+        **fresh_stamps
+    }
+    return result
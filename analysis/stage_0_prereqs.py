@@ -9,10 +9,9 @@ import config
 # (УДАЛЕНО) from services import load_blacklist_from_mongo_async
 from services import data_fetcher
 from services import mongo_service
+from services import exchange_registry
 # --- (КОНЕЦ ИЗМЕНЕНИЯ) ---
 
-# Импорты из нашего нового модуля
-from .helpers import exchange_manager
 from .constants import FETCH_MATURITY_TIMEOUT
 
 log = logging.getLogger(__name__)
@@ -34,27 +33,26 @@ async def load_btc_and_blacklist(log_prefix=""):
         tf = '1d'
         days = config.HISTORY_LOAD_DAYS.get(tf, 180) # (Из config)
         
-        async with exchange_manager(exchange_id, f"{log_prefix} [BTC]") as btc_ex:
-            if btc_ex:
-                # --- (ИЗМЕНЕНИЕ №2) ---
-                ohlcv_map = await asyncio.wait_for(
-                    data_fetcher.fetch_all_ohlcv_data(
-                        btc_ex, 
-                        symbol,
-                        {tf: days}, # (Загружаем только 1 ТФ)
-                        f"{log_prefix} [BTC]"
-                    ),
-                    timeout=FETCH_MATURITY_TIMEOUT
-                )
-                # --- (КОНЕЦ ИЗМЕНЕНИЯ) ---
-                
-                if ohlcv_map and tf in ohlcv_map:
-                    btc_cache_1d = ohlcv_map[tf]
-                    log.info(f"{log_prefix} ✅ Кэш BTC (1d) успешно загружен ({len(btc_cache_1d)} свечей).")
-                else:
-                    log.warning(f"{log_prefix} ❌ Не удалось загрузить кэш BTC (1d).")
+        # (ИЗМЕНЕНИЕ) Экземпляр из реестра (не закрывается, переиспользуется Этапом 1)
+        btc_ex = await exchange_registry.get_exchange(exchange_id, f"{log_prefix} [BTC]")
+        if btc_ex:
+            ohlcv_map = await asyncio.wait_for(
+                data_fetcher.fetch_all_ohlcv_data(
+                    btc_ex, 
+                    symbol,
+                    {tf: days}, # (Загружаем только 1 ТФ)
+                    f"{log_prefix} [BTC]"
+                ),
+                timeout=FETCH_MATURITY_TIMEOUT
+            )
+            
+            if ohlcv_map and tf in ohlcv_map:
+                btc_cache_1d = ohlcv_map[tf]
+                log.info(f"{log_prefix} ✅ Кэш BTC (1d) успешно загружен ({len(btc_cache_1d)} свечей).")
             else:
-                log.warning(f"{log_prefix} ❌ Не удалось инициализировать биржу для BTC.")
+                log.warning(f"{log_prefix} ❌ Не удалось загрузить кэш BTC (1d).")
+        else:
+            log.warning(f"{log_prefix} ❌ Не удалось инициализировать биржу для BTC.")
                 
     except asyncio.TimeoutError:
         log.warning(f"{log_prefix} ❌ Таймаут при загрузке кэша BTC.")
@@ -4,13 +4,24 @@ import logging
 import asyncio
 import pandas as pd
 import statistics
+import time
 from collections import defaultdict
 from typing import Optional, Tuple, Any
 
 import config
 from services import data_fetcher
+from services.exchange_controller import get_controller
 
-from .constants import FETCH_MATURITY_TIMEOUT
+from .constants import (
+    FETCH_MATURITY_TIMEOUT,
+    HEDGE_LATENCY_PERCENTILE,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_DELAY,
+    HEDGE_MAX_DELAY
+)
+from .stage_2_prescreen import prescreen_maturity, remember_mature
+from .priority import priority_sort_key
 
 log = logging.getLogger(__name__)
 
@@ -73,19 +84,72 @@ async def _maturity_check_single_exchange(
 
 
 # ============================================================================
-# CORE TASK: Проверка с параллельным Fallback
+# HEDGING: Политика отложенного Fallback
 # ============================================================================
 
-async def _check_coin_maturity_task(coin_data, exchanges, btc_cache_1d, log_prefix=""):
+class HedgePolicy:
     """
-    Запускает проверку зрелости на всех доступных биржах одновременно
-    и возвращает результат от первой успешной биржи.
+    Политика "отложенного хеджирования" запросов (в рамках ОДНОГО запуска).
+
+    Сначала запрашивается предпочтительная биржа. Fallback запускается,
+    только если она не ответила за задержку хеджа (перцентиль латентности,
+    выученный в этом запуске) или вернула ошибку / незрелый результат.
+    """
+
+    def __init__(
+        self,
+        percentile=HEDGE_LATENCY_PERCENTILE,
+        default_delay=HEDGE_DEFAULT_DELAY,
+        min_samples=HEDGE_MIN_SAMPLES
+    ):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.latencies = defaultdict(list)
+        self.stats = defaultdict(int)
+
+    def record(self, exchange_id, seconds):
+        """Запоминает латентность ответа биржи (только завершенные запросы)."""
+        self.latencies[exchange_id].append(seconds)
+
+    def hedge_delay(self, exchange_id):
+        """Задержка перед запуском Fallback для биржи (секунды)."""
+        samples = self.latencies.get(exchange_id)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        idx = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return min(max(ordered[idx], HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+
+async def _timed_maturity_check(coin_data, exchange_obj, exchange_id, log_prefix_task, hedge_policy):
+    """Обертка над _maturity_check_single_exchange с замером латентности."""
+    started = time.monotonic()
+    df_1d, skip_reason = await _maturity_check_single_exchange(
+        coin_data, exchange_obj, exchange_id, log_prefix_task
+    )
+    # Таймауты и ошибки не "учат" политику (иначе задержка хеджа раздувается)
+    if df_1d is not None or (skip_reason and "Got " in skip_reason):
+        hedge_policy.record(exchange_id, time.monotonic() - started)
+    return df_1d, skip_reason
+
+
+# ============================================================================
+# CORE TASK: Проверка с отложенным (хеджированным) Fallback
+# ============================================================================
+
+async def _check_coin_maturity_task(coin_data, exchanges, btc_cache_1d, log_prefix="", hedge_policy=None):
+    """
+    Проверяет зрелость на предпочтительной бирже (Binance), а Bybit
+    запускает только как хедж (по задержке) или после провала первой.
+    Возвращает результат от первой успешной биржи.
     """
     symbol = coin_data['symbol']
     exchanges_list = coin_data.get('exchanges', [])
     log_prefix_task = f"{log_prefix} [{symbol}]"
     
-    tasks = {} 
+    if hedge_policy is None:
+        hedge_policy = HedgePolicy()
     
     has_binance = 'binanceusdm' in exchanges_list and exchanges.get('binanceusdm') is not None
     has_bybit = 'bybit' in exchanges_list and exchanges.get('bybit') is not None
@@ -99,77 +163,92 @@ async def _check_coin_maturity_task(coin_data, exchanges, btc_cache_1d, log_pref
         exchanges_to_check.append(('binanceusdm', exchanges['binanceusdm']))
     if has_bybit:
         exchanges_to_check.append(('bybit', exchanges['bybit']))
+    
+    # Цепь основной биржи разомкнута -> сразу начинаем с резервной
+    if len(exchanges_to_check) > 1 and get_controller(exchanges_to_check[0][0]).is_open():
+        exchanges_to_check.reverse()
+        hedge_policy.stats['circuit_reordered'] += 1
 
-    for ex_id, ex_obj in exchanges_to_check:
-        tasks[ex_id] = asyncio.create_task(
-            _maturity_check_single_exchange(coin_data, ex_obj, ex_id, log_prefix_task)
+    def _start(ex_id, ex_obj):
+        return asyncio.create_task(
+            _timed_maturity_check(coin_data, ex_obj, ex_id, log_prefix_task, hedge_policy)
         )
 
-    done, pending = await asyncio.wait(
-        tasks.values(),
-        return_when=asyncio.FIRST_COMPLETED 
-    )
-
-    for task in done:
-        try:
-            df_1d, skip_reason = task.result()
-            
-            if df_1d is not None:
-                exchange_id_success = next(ex_id for ex_id, t in tasks.items() if t == task)
-                
-                for p_task in pending:
-                    p_task.cancel()
-                    
-                return coin_data, df_1d, None, exchange_id_success
-        
-        except asyncio.CancelledError:
-            pass 
-        except Exception as e:
-            log.error(f"{log_prefix_task} ❌ Крит. ошибка в параллельной задаче: {e}", exc_info=True)
-            
-    if pending:
-        log.debug(f"{log_prefix_task} 💡 Первый запрос провален, ждем оставшиеся ({len(pending)} задач)...")
-        
-        results_from_pending = await asyncio.gather(*pending, return_exceptions=True)
+    primary_id, primary_obj = exchanges_to_check[0]
+    tasks = {}
+    last_error = "Maturity (All attempts failed)"
+    fallback_started = False
+    
+    # (try охватывает и ожидание хеджа: отмена задачи монеты таймаутом
+    # батча не должна оставлять запрос к бирже без владельца)
+    try:
+        tasks[primary_id] = _start(primary_id, primary_obj)
         
-        last_error = "Maturity (All attempts failed)"
+        # 1. Ждем предпочтительную биржу не дольше задержки хеджа
+        if len(exchanges_to_check) > 1:
+            await asyncio.wait(tasks.values(), timeout=hedge_policy.hedge_delay(primary_id))
+        else:
+            await asyncio.wait(tasks.values())
         
-        for result in results_from_pending:
-            if isinstance(result, Exception):
-                 last_error = f"Maturity (Critical: {type(result).__name__})"
-                 continue
-                 
-            df_1d, skip_reason = result
-            if df_1d is not None:
-                exchange_id_success = next(ex_id for ex_id, t in tasks.items() if t.done() and t.result()[0] is not None)
-                return coin_data, df_1d, None, exchange_id_success
-            
-            if skip_reason:
-                last_error = skip_reason 
+        while True:
+            # 2. Проверяем завершенные задачи
+            for ex_id, task in list(tasks.items()):
+                if not task.done():
+                    continue
+                del tasks[ex_id]
+                try:
+                    df_1d, skip_reason = task.result()
+                except asyncio.CancelledError:
+                    continue
+                except Exception as e:
+                    log.error(f"{log_prefix_task} ❌ Крит. ошибка в задаче {ex_id}: {e}", exc_info=True)
+                    last_error = f"Maturity (Critical: {type(e).__name__})"
+                    continue
                 
-        log.debug(f"{log_prefix_task} ❌ Все доступные биржи провалились. Последняя ошибка: {last_error}")
-        return coin_data, None, last_error, None
-        
-    last_error = "Maturity (All attempts failed after first check)"
-    for task in done:
-        try:
-            _, skip_reason = task.result()
-            if skip_reason:
-                last_error = skip_reason
-        except:
-             pass
-
+                if df_1d is not None:
+                    return coin_data, df_1d, None, ex_id
+                if skip_reason:
+                    last_error = skip_reason
+            
+            # 3. Запускаем Fallback (хедж по задержке или после провала)
+            if not fallback_started and len(exchanges_to_check) > 1:
+                fallback_started = True
+                fallback_id, fallback_obj = exchanges_to_check[1]
+                if tasks:
+                    hedge_policy.stats['hedged'] += 1
+                    log.debug(f"{log_prefix_task} ⏳ {primary_id} медлит, запускаем хедж на {fallback_id}...")
+                else:
+                    hedge_policy.stats['fallback_after_failure'] += 1
+                    log.debug(f"{log_prefix_task} 💡 {primary_id} провален, запускаем {fallback_id}...")
+                tasks[fallback_id] = _start(fallback_id, fallback_obj)
+            
+            if not tasks:
+                break
+            
+            await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Отменяем "проигравший" запрос
+        for task in tasks.values():
+            task.cancel()
+    
     log.debug(f"{log_prefix_task} ❌ Все доступные биржи провалились. Последняя ошибка: {last_error}")
     return coin_data, None, last_error, None
 
 
+
 # ============================================================================
 # ORCHESTRATOR: Запуск батчинга
 # ============================================================================
 
-async def run_maturity_stage(coins_to_check, exchanges, btc_cache_1d, log_prefix=""):
+async def run_maturity_stage(coins_to_check, exchanges, btc_cache_1d, log_prefix="", markets_map=None, deadline=None):
     """
     Запускает проверку "зрелости" (Этап 2) пачками (батчами).
+    
+    Сначала пре-скрининг по метаданным (дата листинга, кэш известных
+    зрелых), затем свечи 1d загружаются ТОЛЬКО для пограничных монет.
+    Монеты, принятые без свечей, попадают в карту как (coin_data, None).
+    Пограничные монеты проверяются в порядке приоритета (priority.py); при
+    дедлайне ('deadline': RunDeadline) непроверенные монеты пропускаются.
     """
     log_prefix = f"{log_prefix}[Этап 2]"
     log.info(f"{log_prefix} Проверка 'зрелости' {len(coins_to_check)} монет...")
@@ -181,43 +260,81 @@ async def run_maturity_stage(coins_to_check, exchanges, btc_cache_1d, log_prefix
     exchange_usage = defaultdict(int)
     fallback_success = 0 
     
-    total_to_check = len(coins_to_check)
+    total_input = len(coins_to_check)
     
-    if total_to_check == 0:
+    if total_input == 0:
         log.info(f"{log_prefix} (Этап 2) Проверка пропущена: нет монет для анализа.")
         return mature_coins_map, skipped_coins
-        
-    import config 
-    from .constants import FETCH_MATURITY_TIMEOUT 
     
-    batch_size = config.ANALYSIS_BATCH_SIZE
+    # --- ПРЕ-СКРИНИНГ (без запросов к бирже) ---
+    accepted, coins_to_check, rejected = prescreen_maturity(coins_to_check, markets_map, log_prefix)
+    
+    for coin_data in accepted:
+        mature_coins_map[coin_data['symbol']] = (coin_data, None)
+    for reason, symbols in rejected.items():
+        skipped_coins[reason].extend(symbols)
+    
+    # Самые важные монеты — первыми (важно при дедлайне)
+    coins_to_check = sorted(coins_to_check, key=priority_sort_key, reverse=True)
+    total_to_check = len(coins_to_check)
+    
+    # Латентности бирж "учатся" заново в каждом запуске
+    hedge_policy = HedgePolicy()
+    
+    # Размер пачки следует за лимитом конкурентности основной биржи (AIMD)
+    primary_controller = get_controller('binanceusdm' if 'binanceusdm' in exchanges else next(iter(exchanges), 'bybit'))
     
-    for i in range(0, total_to_check, batch_size):
+    i = 0
+    batch_num = 0
+    while i < total_to_check:
+        # Дедлайн запуска: новые пачки не планируются
+        if deadline is not None and deadline.should_stop_scheduling():
+            not_checked = [c['symbol'] for c in coins_to_check[i:]]
+            skipped_coins["Maturity (Deadline)"].extend(not_checked)
+            log.warning(f"{log_prefix} ⏰ Дедлайн запуска: {len(not_checked)} монет не проверены.")
+            break
+        
+        batch_size = primary_controller.scale_batch_size(config.ANALYSIS_BATCH_SIZE)
         batch_coins = coins_to_check[i : i + batch_size]
+        batch_num += 1
         
-        tasks = []
-        for coin_data in batch_coins:
-            tasks.append(
+        tasks = {
+            asyncio.create_task(
                 _check_coin_maturity_task(
                     coin_data, 
                     exchanges,
                     btc_cache_1d, 
-                    log_prefix
+                    log_prefix,
+                    hedge_policy
                 )
-            )
+            ): coin_data
+            for coin_data in batch_coins
+        }
             
-        batch_timeout = FETCH_MATURITY_TIMEOUT + 5.0 
+        # Fallback стартует не позже HEDGE_MAX_DELAY после основной биржи
+        batch_timeout = FETCH_MATURITY_TIMEOUT + HEDGE_MAX_DELAY + 5.0 
+        if deadline is not None:
+            batch_timeout = deadline.cap_timeout(batch_timeout)
+        
+        # Завершившиеся задачи сохраняются, даже если пачка не уложилась в таймаут
+        done, pending = await asyncio.wait(tasks, timeout=batch_timeout)
         
-        try:
-            results = await asyncio.wait_for(
-                asyncio.gather(*tasks, return_exceptions=True),
-                timeout=batch_timeout
+        if pending:
+            timeout_reason = (
+                "Maturity (Deadline)" if deadline is not None and deadline.should_stop_scheduling()
+                else "Maturity (Batch Timeout)"
             )
-        except asyncio.TimeoutError:
-            log.error(f"{log_prefix} ⌛ (ПАЧКА {i//batch_size+1}) Таймаут {batch_timeout}с. Пропуск {len(batch_coins)} монет.")
-            for coin in batch_coins:
-                skipped_coins["Maturity (Batch Timeout)"].append(coin['symbol'])
-            continue
+            log.error(f"{log_prefix} ⌛ (ПАЧКА {batch_num}) Таймаут {batch_timeout:.0f}с. Пропуск {len(pending)} монет.")
+            for task in pending:
+                task.cancel()
+                skipped_coins[timeout_reason].append(tasks[task]['symbol'])
+        
+        results = []
+        for task in done:
+            try:
+                results.append(task.result())
+            except Exception as e:
+                results.append(e)
 
         for result in results:
             if isinstance(result, Exception):
@@ -249,15 +366,20 @@ async def run_maturity_stage(coins_to_check, exchanges, btc_cache_1d, log_prefix
             else:
                 skipped_coins["Maturity (Unknown)"].append(symbol)
         
-        processed_count = min(i + batch_size, total_to_check)
+        i += len(batch_coins)
+        processed_count = i
         
         # --- ПРОГРЕСС В КОНСОЛИ ---
         print(f"{log_prefix} Обработано {processed_count}/{total_to_check}...\r", end="", flush=True)
     
-    print()  
+    if total_to_check > 0:
+        print()  
         
     total_mature = len(mature_coins_map)
     
+    # Запоминаем зрелые монеты: в следующих запусках они пройдут без свечей
+    remember_mature((c['full_symbol'] for c, _ in mature_coins_map.values()), log_prefix)
+    
     if candle_counts:
         avg_candles = statistics.mean(candle_counts)
         median_candles = statistics.median(candle_counts)
@@ -269,7 +391,7 @@ async def run_maturity_stage(coins_to_check, exchanges, btc_cache_1d, log_prefix
         log.info(f"{log_prefix} ├─ Среднее кол-во свечей:       {avg_candles:.1f}")
         log.info(f"{log_prefix} ├─ Медиана свечей:              {median_candles:.0f}")
         log.info(f"{log_prefix} ├─ Мин/Макс свечей:             {min(candle_counts)}/{max(candle_counts)}")
-        log.info(f"{log_prefix} └─ Зрелых монет:                {total_mature} ({total_mature/total_to_check*100:.1f}%)")
+        log.info(f"{log_prefix} └─ Зрелых монет:                {total_mature} ({total_mature/total_input*100:.1f}%)")
         
         if exchange_usage:
             log.info(f"{log_prefix} ")
@@ -280,6 +402,15 @@ async def run_maturity_stage(coins_to_check, exchanges, btc_cache_1d, log_prefix
             if fallback_success > 0:
                 log.info(f"{log_prefix} └─ Fallback (Bybit вместо Binance): {fallback_success} монет 🔄")
         
+        checked = total_to_check - hedge_policy.stats['hedged'] - hedge_policy.stats['fallback_after_failure']
+        log.info(f"{log_prefix} ")
+        log.info(f"{log_prefix} 📊 ХЕДЖИРОВАНИЕ ЗАПРОСОВ:")
+        log.info(f"{log_prefix} ├─ Только основная биржа:       {checked}")
+        log.info(f"{log_prefix} ├─ Хедж по задержке:            {hedge_policy.stats['hedged']}")
+        log.info(f"{log_prefix} ├─ Fallback после провала:      {hedge_policy.stats['fallback_after_failure']}")
+        log.info(f"{log_prefix} ├─ Резерв первым (цепь разомкн.): {hedge_policy.stats['circuit_reordered']}")
+        log.info(f"{log_prefix} └─ Задержка хеджа (binanceusdm): {hedge_policy.hedge_delay('binanceusdm'):.1f}с")
+        
         log.info(f"{log_prefix} " + "=" * 60)
     
     if skipped_coins:
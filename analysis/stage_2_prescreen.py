@@ -0,0 +1,172 @@
+# analysis/stage_2_prescreen.py
+
+"""
+Пре-скрининг "зрелости" (Этап 2) БЕЗ загрузки свечей.
+
+1. Монеты из кэша "известных зрелых" (прошлые запуски) принимаются сразу:
+   возраст контракта только растет.
+2. Дата листинга из метаданных рынка ('created' / info.onboardDate (Binance) /
+   info.launchTime (Bybit)):
+   - моложе порога (с буфером)   -> отклоняется;
+   - явно старше порога (с буфером) -> принимается;
+   - в пограничной зоне или без даты -> проверка по свечам (как раньше).
+"""
+
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+
+log = logging.getLogger(__name__)
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Ключи с датой листинга в 'market["info"]' (если ccxt не заполнил 'created')
+LISTING_INFO_KEYS = ('onboardDate', 'launchTime', 'listTime')
+
+# --- Кэш "известных зрелых" монет (full_symbol) ---
+_known_mature: Optional[Set[str]] = None
+
+
+# ============================================================================
+# === Кэш "известных зрелых" ===
+# ============================================================================
+
+def load_known_mature() -> Set[str]:
+    """Возвращает множество известных зрелых монет (лениво читается с диска)."""
+    global _known_mature
+    if _known_mature is None:
+        _known_mature = set()
+        path = config.MATURITY_CACHE_PATH
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _known_mature = set(json.load(f))
+            except Exception as e:
+                log.warning(f"[Maturity.Cache] ⚠️ Не удалось прочитать {path}: {e}")
+    return _known_mature
+
+
+def remember_mature(full_symbols: Iterable[str], log_prefix="") -> int:
+    """Добавляет монеты в кэш известных зрелых и сохраняет его на диск."""
+    known = load_known_mature()
+    before = len(known)
+    known.update(s for s in full_symbols if s)
+    added = len(known) - before
+
+    if added:
+        path = config.MATURITY_CACHE_PATH
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(sorted(known), f)
+            os.replace(tmp_path, path)
+            log.info(f"{log_prefix} [Maturity.Cache] ✅ +{added} монет (всего известных зрелых: {len(known)}).")
+        except Exception as e:
+            log.warning(f"{log_prefix} [Maturity.Cache] ⚠️ Не удалось сохранить {path}: {e}")
+    return added
+
+
+# ============================================================================
+# === Дата листинга ===
+# ============================================================================
+
+def get_listing_timestamp_ms(market: Dict[str, Any]) -> Optional[int]:
+    """Извлекает дату листинга контракта (мс) из метаданных рынка ccxt."""
+    if not market:
+        return None
+
+    candidates = [market.get('created')]
+    info = market.get('info') or {}
+    candidates.extend(info.get(key) for key in LISTING_INFO_KEYS)
+
+    for value in candidates:
+        try:
+            ts = int(float(value))
+        except (TypeError, ValueError):
+            continue
+        if ts > 0:
+            return ts
+    return None
+
+
+def get_listing_age_days(coin_data, markets_map, now_ms=None) -> Optional[float]:
+    """
+    Возраст контракта в днях. Если монета торгуется на нескольких биржах,
+    берется САМЫЙ СТАРЫЙ листинг (для зрелости достаточно одной биржи).
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    symbol = coin_data['symbol']
+
+    ages = []
+    for ex_id in coin_data.get('exchanges', []):
+        market = (markets_map.get(ex_id) or {}).get(symbol)
+        ts = get_listing_timestamp_ms(market)
+        if ts is not None and ts <= now_ms:
+            ages.append((now_ms - ts) / MS_PER_DAY)
+
+    return max(ages) if ages else None
+
+
+# ============================================================================
+# === Пре-скрининг ===
+# ============================================================================
+
+def prescreen_maturity(
+    coins_to_check: List[dict],
+    markets_map: Optional[Dict[str, Dict[str, Any]]],
+    log_prefix: str = ""
+) -> Tuple[List[dict], List[dict], Dict[str, List[str]]]:
+    """
+    Делит монеты на три группы по метаданным (без запросов к бирже).
+
+    Returns:
+        (accepted, borderline, rejected)
+        - accepted:   зрелые (известные или по дате листинга) -> без свечей
+        - borderline: нужна проверка по свечам 1d
+        - rejected:   {reason: [symbols]} -> слишком молодые
+    """
+    markets_map = markets_map or {}
+    known_mature = load_known_mature()
+    min_days = config.MIN_CANDLES_FOR_MATURITY
+    margin = config.MATURITY_PRESCREEN_MARGIN_DAYS
+    now_ms = int(time.time() * 1000)
+
+    accepted, borderline = [], []
+    rejected = defaultdict(list)
+    stats = defaultdict(int)
+
+    for coin_data in coins_to_check:
+        if coin_data.get('full_symbol') in known_mature:
+            accepted.append(coin_data)
+            stats['known'] += 1
+            continue
+
+        age_days = get_listing_age_days(coin_data, markets_map, now_ms)
+
+        if age_days is None:
+            borderline.append(coin_data)
+            stats['no_date'] += 1
+        elif age_days < min_days - margin:
+            rejected[f"Maturity (Listing: {int(age_days)}d < {min_days}d)"].append(coin_data['symbol'])
+            stats['young'] += 1
+        elif age_days >= min_days + margin:
+            accepted.append(coin_data)
+            stats['listing'] += 1
+        else:
+            borderline.append(coin_data)
+            stats['borderline'] += 1
+
+    log.info(f"{log_prefix} 🔎 ПРЕ-СКРИНИНГ ЗРЕЛОСТИ (без свечей):")
+    log.info(f"{log_prefix} ├─ Известные зрелые (кэш):   {stats['known']}")
+    log.info(f"{log_prefix} ├─ Зрелые по дате листинга:  {stats['listing']}")
+    log.info(f"{log_prefix} ├─ Молодые (отклонены):      {stats['young']}")
+    log.info(f"{log_prefix} └─ Нужна проверка свечей:    {len(borderline)} "
+             f"(погранич.: {stats['borderline']}, без даты: {stats['no_date']})")
+
+    return accepted, borderline, rejected
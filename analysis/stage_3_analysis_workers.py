@@ -6,6 +6,8 @@ import time
 import asyncio
 import gc
 
+from services.data_fetcher import OhlcvRunCache
+
 from .stage_3_wave_binance import run_binance_wave
 from .stage_3_wave_bybit import run_bybit_wave
 
@@ -17,7 +19,10 @@ async def run_analysis_stage_workers(
     active_exchanges,
     markets_map,
     btc_cache_1d,
-    log_prefix=""
+    log_prefix="",
+    checkpoint=None,
+    deadline=None,
+    staging=None
 ):
     """
     Разделяет "зрелые" монеты на две волны (Binance Wave и Bybit Wave) и запускает анализ.
@@ -30,6 +35,9 @@ async def run_analysis_stage_workers(
     final_data_to_save = []
     skipped_analysis_set = set()
     
+    # Кэш успешно загруженных ТФ (живет только в этом запуске)
+    run_cache = OhlcvRunCache()
+    
     # ========================================================================
     # 1. РАЗДЕЛЕНИЕ МОНЕТ ПО БИРЖАМ (ПРИОРИТЕТ BINANCE)
     # ========================================================================
@@ -83,7 +91,11 @@ async def run_analysis_stage_workers(
             coins_to_process=binance_coins,
             exchange=active_exchanges['binanceusdm'],
             btc_cache_1d=btc_cache_1d,
-            log_prefix=f"{log_prefix}[Binance Wave]"
+            log_prefix=f"{log_prefix}[Binance Wave]",
+            run_cache=run_cache,
+            checkpoint=checkpoint,
+            deadline=deadline,
+            staging=staging
         )
         final_data_to_save.extend(binance_results)
         skipped_analysis_set.update(skipped_binance)
@@ -105,7 +117,11 @@ async def run_analysis_stage_workers(
             coins_to_process=bybit_only_coins,
             exchange=active_exchanges['bybit'],
             btc_cache_1d=btc_cache_1d,
-            log_prefix=f"{log_prefix}[Bybit Wave]"
+            log_prefix=f"{log_prefix}[Bybit Wave]",
+            run_cache=run_cache,
+            checkpoint=checkpoint,
+            deadline=deadline,
+            staging=staging
         )
         final_data_to_save.extend(bybit_results)
         skipped_analysis_set.update(skipped_bybit)
@@ -122,5 +138,7 @@ async def run_analysis_stage_workers(
     
     total_successful = len(final_data_to_save)
     log.info(f"{log_prefix} ✅ Полный анализ завершен. Успешно обработано: {total_successful} монет.")
+    if run_cache.hits:
+        log.info(f"{log_prefix} ♻️  ТФ повторно использовано из кэша запуска (без загрузки): {run_cache.hits}")
     
     return final_data_to_save, skipped_analysis_set
\ No newline at end of file
@@ -3,12 +3,14 @@
 import logging
 import asyncio
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 
 import config
 from services import data_fetcher
+from services.exchange_controller import get_controller
 from metrics.calculator import calculate_all_metrics
 
+from .priority import priority_sort_key
 from .constants import (
     FETCH_ANALYSIS_TIMEOUT,
     MAX_RETRIES,
@@ -54,32 +56,53 @@ def _log_progress(current, total, success_count, failed_count, retry_count, elap
 # CORE ANALYSIS FUNCTIONS
 # ============================================================================
 
-async def _analyze_coin_metrics_task(coin_data, exchange, btc_cache_1d, df_1d, log_prefix=""):
+async def _analyze_coin_metrics_task(coin_data, exchange, btc_cache_1d, df_1d, log_prefix="", run_cache=None):
     """
     Загружает и анализирует одну монету.
     """
     symbol = coin_data['symbol']
     
     try:
-        ohlcv_data_map = await asyncio.wait_for(
-            data_fetcher.fetch_all_ohlcv_data(
-                exchange, 
-                symbol,
-                config.TIMEFRAMES_TO_LOAD,
-                log_prefix
-            ),
-            timeout=FETCH_ANALYSIS_TIMEOUT
-        )
+        # Дифференциальный запуск: только "просроченные" ТФ (None -> все)
+        due_tfs = coin_data.get('_due_timeframes')
+        if due_tfs is None:
+            due_tfs = list(config.TIMEFRAMES_TO_LOAD)
+        
+        # 1d уже загружен на Этапе 2 -> повторно не загружаем.
+        # (df_1d is None, если монета принята пре-скринингом без свечей)
+        tf_config = {tf: days for tf, days in config.TIMEFRAMES_TO_LOAD.items() if tf in due_tfs}
+        if df_1d is not None:
+            tf_config = {tf: days for tf, days in tf_config.items() if tf != '1d'}
         
-        if not ohlcv_data_map:
-            return None, "Analysis (Missing TFs)"
+        ohlcv_data_map = {}
+        if tf_config:
+            ohlcv_data_map = await asyncio.wait_for(
+                data_fetcher.fetch_all_ohlcv_data(
+                    exchange, 
+                    symbol,
+                    tf_config,
+                    log_prefix,
+                    run_cache
+                ),
+                timeout=FETCH_ANALYSIS_TIMEOUT
+            )
+            
+            if not ohlcv_data_map:
+                return None, "Analysis (Missing TFs)"
 
-        ohlcv_data_map['1d'] = df_1d
+        if '1d' in due_tfs:
+            if df_1d is not None:
+                ohlcv_data_map['1d'] = df_1d
+            elif len(ohlcv_data_map.get('1d', ())) < config.MIN_CANDLES_FOR_MATURITY:
+                return None, "Analysis (Immature 1d)"
         
-        metrics = calculate_all_metrics(ohlcv_data_map, btc_cache_1d)
+        metrics = calculate_all_metrics(ohlcv_data_map, btc_cache_1d, timeframes=due_tfs)
         
-        if not metrics:
+        # Пустые метрики допустимы, только если пересчитывать было нечего
+        if not metrics and due_tfs:
             return None, "Analysis (Calc Error)"
+        
+        refreshed_at = datetime.now(timezone.utc)
             
         final_data = {
             'symbol': symbol,
@@ -96,7 +119,12 @@ async def _analyze_coin_metrics_task(coin_data, exchange, btc_cache_1d, df_1d, l
             'change24h': coin_data['change24h'],
             'exchanges': coin_data['exchanges'],
             'logoUrl': coin_data['logoUrl'],
-            'analyzed_at': datetime.now()
+            'analyzed_at': datetime.now(),
+            # Время пересчета каждого ТФ (см. analysis/refresh.py)
+            'analyzed_at_tf': {
+                tf: refreshed_at for tf in due_tfs
+                if len(ohlcv_data_map.get(tf, ())) > 0
+            }
         }
         
         final_data.update(metrics)
@@ -110,9 +138,11 @@ async def _analyze_coin_metrics_task(coin_data, exchange, btc_cache_1d, df_1d, l
         return None, f"Analysis (Error: {type(e).__name__})"
 
 
-async def _analyze_with_retry(coin_data, exchange, btc_cache_1d, df_1d, log_prefix=""):
+async def _analyze_with_retry(coin_data, exchange, btc_cache_1d, df_1d, log_prefix="", run_cache=None):
     """
     Retry механизм (до MAX_RETRIES попыток).
+    Успешно загруженные ТФ сохраняются в 'run_cache', поэтому повторная
+    попытка загружает только недостающие ТФ.
     """
     symbol = coin_data['symbol']
     exchanges_list = coin_data.get('exchanges', [])
@@ -120,29 +150,37 @@ async def _analyze_with_retry(coin_data, exchange, btc_cache_1d, df_1d, log_pref
     
     log.debug(f"{task_log_prefix} ➡️ Начинаю анализ. Источник бирж: {exchanges_list}. Использую: {exchange.id}")
     
+    if run_cache is None:
+        run_cache = data_fetcher.OhlcvRunCache()
+    
     retry_count = 0
     
-    for attempt in range(1, MAX_RETRIES + 1):
-        final_data, error_reason = await _analyze_coin_metrics_task(
-            coin_data,
-            exchange,
-            btc_cache_1d,
-            df_1d,
-            task_log_prefix
-        )
-        
-        if final_data and not error_reason:
-            if attempt > 1:
-                log.debug(f"{task_log_prefix} ✅ Успешно с попытки {attempt}/{MAX_RETRIES}")
-            return final_data, None, retry_count
-        
-        if attempt < MAX_RETRIES:
-            retry_count += 1
-            wait_time = RETRY_DELAY_BASE ** attempt
-            log.debug(f"{task_log_prefix} 🔄 Попытка {attempt}/{MAX_RETRIES} провалена ({error_reason}), жду {wait_time:.1f}с...")
-            await asyncio.sleep(wait_time)
-        else:
-            log.warning(f"{task_log_prefix} ❌ Все {MAX_RETRIES} попытки провалены: {error_reason}")
+    try:
+        for attempt in range(1, MAX_RETRIES + 1):
+            final_data, error_reason = await _analyze_coin_metrics_task(
+                coin_data,
+                exchange,
+                btc_cache_1d,
+                df_1d,
+                task_log_prefix,
+                run_cache
+            )
+            
+            if final_data and not error_reason:
+                if attempt > 1:
+                    log.debug(f"{task_log_prefix} ✅ Успешно с попытки {attempt}/{MAX_RETRIES}")
+                return final_data, None, retry_count
+            
+            if attempt < MAX_RETRIES:
+                retry_count += 1
+                wait_time = RETRY_DELAY_BASE ** attempt
+                log.debug(f"{task_log_prefix} 🔄 Попытка {attempt}/{MAX_RETRIES} провалена ({error_reason}), жду {wait_time:.1f}с...")
+                await asyncio.sleep(wait_time)
+            else:
+                log.warning(f"{task_log_prefix} ❌ Все {MAX_RETRIES} попытки провалены: {error_reason}")
+    finally:
+        # Монета обработана -> ее ТФ больше не нужны
+        run_cache.drop_symbol(exchange.id, symbol)
     
     return None, error_reason, retry_count
 
@@ -155,12 +193,24 @@ async def run_binance_wave(
     coins_to_process,  # {symbol: (coin_data, df_1d)}
     exchange,
     btc_cache_1d,
-    log_prefix
+    log_prefix,
+    run_cache=None,
+    checkpoint=None,
+    deadline=None,
+    staging=None
 ):
     """
     Асинхронная пакетная загрузка монет с Binance.
     """
-    all_symbols = list(coins_to_process.keys())
+    if run_cache is None:
+        run_cache = data_fetcher.OhlcvRunCache()
+    
+    # Самые важные монеты — первыми (важно при дедлайне)
+    all_symbols = sorted(
+        coins_to_process,
+        key=lambda sym: priority_sort_key(coins_to_process[sym][0]),
+        reverse=True
+    )
     total_coins = len(all_symbols)
     results_list = []
     
@@ -169,7 +219,8 @@ async def run_binance_wave(
     total_retry_count = 0
     
     start_time = time.time()
-    batch_size = config.ANALYSIS_BATCH_SIZE 
+    batch_size = config.ANALYSIS_BATCH_SIZE
+    controller = get_controller(exchange.id)
     
     log.info(f"{log_prefix} 🌊 Начало загрузки {total_coins} монет с Binance (Батч: {batch_size})")
     
@@ -178,8 +229,21 @@ async def run_binance_wave(
     
     log_interval = LOG_PROGRESS_EVERY_N_COINS
     
-    for i in range(0, total_coins, batch_size):
+    i = 0
+    batch_num = 0
+    while i < total_coins:
+        # Дедлайн запуска: новые пачки не планируются
+        if deadline is not None and deadline.should_stop_scheduling():
+            log.warning(f"{log_prefix} ⏰ Дедлайн запуска: {total_coins - i} монет не запланированы.")
+            break
+        
+        # Биржа деградировала -> пауза вместо пачки, которая упадет по таймаутам
+        await controller.wait_until_available(log_prefix)
+        
+        # Размер пачки следует за лимитом конкурентности (AIMD)
+        batch_size = controller.scale_batch_size(config.ANALYSIS_BATCH_SIZE)
         batch_symbols = all_symbols[i:i + batch_size]
+        batch_num += 1
         batch_tasks = []
         
         for symbol in batch_symbols:
@@ -190,15 +254,30 @@ async def run_binance_wave(
                     exchange,
                     btc_cache_1d,
                     df_1d,
-                    log_prefix
+                    log_prefix,
+                    run_cache
                 )
             )
         
+        if deadline is not None and deadline.enabled:
+            # Завершившиеся к дедлайну монеты сохраняются, остальные отменяются
+            batch_tasks = [asyncio.create_task(t) for t in batch_tasks]
+            _, pending = await asyncio.wait(batch_tasks, timeout=deadline.work_time_left())
+            for task in pending:
+                task.cancel()
+            if pending:
+                deadline.should_stop_scheduling()
+                log.warning(f"{log_prefix} ⏰ Дедлайн запуска: {len(pending)} монет пачки отменены.")
+        
         results = await asyncio.gather(*batch_tasks, return_exceptions=True)
 
         batch_success_symbols = [] 
+        batch_results = []
 
         for result in results:
+            if isinstance(result, asyncio.CancelledError):
+                failed_count += 1
+                continue
             if isinstance(result, Exception):
                 log.error(f"{log_prefix} ❌ Крит. ошибка в пакете: {result}")
                 continue
@@ -209,22 +288,33 @@ async def run_binance_wave(
             
             if final_data:
                 results_list.append(final_data)
+                batch_results.append(final_data)
                 success_count += 1
                 batch_success_symbols.append(final_data['symbol']) 
             else:
                 failed_count += 1 
 
-        current_processed = i + len(batch_tasks)
+        # Контрольная точка: готовые монеты не пересчитываются после рестарта
+        if checkpoint is not None and batch_results:
+            await checkpoint.save_stage3_results(batch_results)
+        # Поэтапная запись: пачка сразу уходит в промежуточную коллекцию
+        if staging is not None and batch_results:
+            await staging.write(batch_results)
+
+        i += len(batch_tasks)
+        current_processed = i
+        previous_processed = i - len(batch_tasks)
         
         # --- ДЕТАЛИЗАЦИЯ ЛОГА ---
         log.debug(
-            f"{log_prefix} [Пакет {i//batch_size + 1}] Обработано {len(batch_tasks)} монет. "
+            f"{log_prefix} [Пакет {batch_num}] Обработано {len(batch_tasks)} монет. "
             f"✅ Успех: {len(batch_success_symbols)}. "
             f"Успешные монеты: {', '.join(batch_success_symbols[:5])}..."
         )
         # --- КОНЕЦ ДЕТАЛИЗАЦИИ ЛОГА ---
 
-        if current_processed % log_interval == 0 or current_processed == total_coins:
+        # (Пачки переменного размера: лог при пересечении кратного log_interval)
+        if current_processed // log_interval > previous_processed // log_interval or current_processed == total_coins:
             elapsed = time.time() - start_time
             _log_progress(
                 current=current_processed,
@@ -0,0 +1,98 @@
+# analysis/staging.py
+
+"""
+Поэтапная запись результатов запуска в MongoDB.
+
+Готовые пачки Этапа 3 сразу пишутся в промежуточную коллекцию запуска
+('coin-sifter__staging_<run_id>'), а Этап 4 дописывает категории и
+атомарно подменяет ею 'coin-sifter'. Запись распределена по запуску, а
+падение в конце Этапа 3 не теряет уже записанные монеты (коллекция
+переживает рестарт с тем же run_id).
+
+Если промежуточная коллекция недоступна, запуск сохраняет результат
+одной записью в конце (mongo_service.save_coins_to_mongo_v3).
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import config
+from services import mongo_service
+
+from .refresh import merge_with_previous
+
+log = logging.getLogger(__name__)
+
+
+class StagedResults:
+    """
+    Промежуточная коллекция ОДНОГО запуска.
+    """
+
+    def __init__(self, run_id: str, previous_docs: Optional[Dict[str, Dict[str, Any]]] = None, log_prefix: str = ""):
+        self.collection_name = mongo_service.staging_collection_name(run_id)
+        self.previous_docs = previous_docs or {}
+        self.log_prefix = f"{log_prefix}[Staging]"
+        # Режим 'diff' пишет изменения прямо в 'coin-sifter'
+        self.enabled = config.STAGED_WRITES_ENABLED and config.COINS_SAVE_MODE != 'diff'
+        self.failed = False
+        self.written = 0
+
+    @property
+    def usable(self) -> bool:
+        """True, если все пачки записаны и коллекцию можно "продвигать"."""
+        return self.enabled and not self.failed
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        if not await mongo_service.prepare_staging_collection(self.collection_name, self.log_prefix):
+            self.failed = True
+            log.warning(f"{self.log_prefix} ⚠️ Поэтапная запись недоступна, результат будет сохранен в конце.")
+
+    def _prepare(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Документ в том виде, в каком он сохраняется (метрики прошлых ТФ, is_stale)."""
+        merge_with_previous(doc, self.previous_docs.get(doc.get('full_symbol')))
+        doc.setdefault('is_stale', False)
+        return doc
+
+    async def write(self, results: List[Dict[str, Any]]) -> int:
+        """Записывает пачку готовых монет."""
+        if not self.usable or not results:
+            return 0
+
+        docs = [self._prepare(doc) for doc in results]
+        written = await mongo_service.write_coins_chunk(self.collection_name, docs, self.log_prefix)
+        if written < len(docs):
+            # Пропущенная пачка -> подменять коллекцию неполным набором нельзя
+            self.failed = True
+            log.warning(
+                f"{self.log_prefix} ⚠️ Записано {written}/{len(docs)} монет пачки. "
+                f"Результат будет сохранен одной записью в конце."
+            )
+        self.written += written
+        return written
+
+    async def promote(self, categories: Optional[Dict[str, int]] = None, expected_count: Optional[int] = None) -> int:
+        """
+        Дописывает категории и атомарно подменяет 'coin-sifter'.
+        'expected_count' — сколько монет должно быть в коллекции (иначе подмена отменяется).
+        Возвращает кол-во монет (0 = не подменено).
+        """
+        if not self.usable:
+            return 0
+
+        if categories:
+            await mongo_service.set_coins_fields(
+                self.collection_name,
+                {full_symbol: {'category': int(rank)} for full_symbol, rank in categories.items()},
+                self.log_prefix
+            )
+        return await mongo_service.promote_staging_collection(
+            self.collection_name, self.log_prefix, expected_count
+        )
+
+    async def discard(self) -> None:
+        """Удаляет промежуточную коллекцию (результат сохранен иначе)."""
+        if self.enabled:
+            await mongo_service.drop_collection(self.collection_name, self.log_prefix)
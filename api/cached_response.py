@@ -0,0 +1,82 @@
+# api/cached_response.py
+
+"""
+Ответы из заранее сериализованных представлений кэша.
+
+Тело, его сжатые варианты (gzip / brotli) и ETag готовятся один раз на
+версию кэша (data_cache_service.prepare_body). Запрос получает:
+- пустой 304, если If-None-Match совпадает с текущей версией;
+- иначе — готовые байты в лучшей кодировке из Accept-Encoding.
+"""
+
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+
+# При равном q предпочитаем brotli (плотнее)
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def etag_matches(if_none_match: Optional[str], *etags: str) -> bool:
+    """Сравнение If-None-Match с ETag (слабое сравнение, RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") in etags for tag in candidates)
+
+
+def choose_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """Лучшая из доступных кодировок по Accept-Encoding (None -> без сжатия)."""
+    if not accept_encoding or not available:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in available:
+            continue
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def cached_response(
+    request: Request,
+    prepared: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """200 с готовым (сжатым) телом или 304, если у клиента та же версия."""
+    encoded = prepared.get("encoded") or {}
+    encoding = choose_encoding(request.headers.get("accept-encoding"), encoded)
+    variant = encoded[encoding] if encoding else prepared
+
+    response_headers = {
+        "ETag": variant["etag"],
+        # Клиент может хранить ответ, но обязан перепроверять его (If-None-Match)
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        **(headers or {})
+    }
+
+    # Любой вариант того же содержимого -> у клиента актуальная версия
+    known_etags = [prepared["etag"], *(v["etag"] for v in encoded.values())]
+    if etag_matches(request.headers.get("if-none-match"), *known_etags):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=variant["body"], media_type=prepared["media_type"], headers=response_headers)
@@ -10,6 +10,8 @@ from .trigger import trigger_router
 from .coins import coins_router
 # (ИЗМЕНЕНИЕ №1) Добавляем новый роутер
 from .formatted_symbols import formatted_symbols_router
+from .markets import markets_router
+from .query import query_router
 
 __all__ = [
     "health_router",
@@ -19,4 +21,6 @@ __all__ = [
     "trigger_router",
     "coins_router",
     "formatted_symbols_router", # (ИЗМЕНЕНИЕ №1)
+    "markets_router",
+    "query_router",
 ]
\ No newline at end of file
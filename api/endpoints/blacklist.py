@@ -7,7 +7,8 @@ from fastapi import APIRouter, HTTPException, Depends
 # --- (ИСПРАВЛЕНИЕ) ---
 # (БЫЛО) import services
 # (СТАЛО) Импортируем НАПРЯМУЮ
-from services.mongo_service import load_blacklist_from_mongo_async
+from services.mongo_service import add_to_blacklist, remove_from_blacklist
+from services import blacklist_cache
 # --- (КОНЕЦ ИСПРАВЛЕНИЯ) ---
 
 # Import our security module
@@ -20,21 +21,60 @@ blacklist_router = APIRouter()
 # Symbol validation
 SYMBOL_REGEX = re.compile(r"^[A-Z0-9/:-]{1,50}$")
 
+
+def _validate_symbol(symbol: str) -> str:
+    """Нормализует символ (верхний регистр) и проверяет формат."""
+    symbol = (symbol or "").strip().upper()
+    if not SYMBOL_REGEX.match(symbol):
+        raise HTTPException(status_code=400, detail=f"Invalid symbol: '{symbol}'")
+    return symbol
+
 # --- API Endpoints (Blacklist) ---
 
 @blacklist_router.get("/blacklist", dependencies=[Depends(verify_token)])
-async def get_blacklist():
-    """(V3) Gets the ENTIRE Blacklist (MongoDB)."""
+async def get_blacklist(force_reload: bool = False):
+    """(V3) Gets the ENTIRE Blacklist (кэш в памяти, MongoDB при истечении TTL)."""
     try:
-        # --- (ИСПРАВЛЕНИЕ) ---
-        # (БЫЛО) blacklist = await services.load_blacklist_from_mongo_async(...)
-        # (СТАЛО) Вызываем напрямую
-        blacklist = await load_blacklist_from_mongo_async(
+        blacklist = await blacklist_cache.get_blacklist(
+            force_reload=force_reload,
             log_prefix="[API /blacklist GET]"
         )
-        # --- (КОНЕЦ ИСПРАВЛЕНИЯ) ---
         
-        return {"count": len(blacklist), "blacklist": list(blacklist)}
+        return {
+            "count": len(blacklist),
+            "version": blacklist_cache.get_blacklist_version(),
+            "blacklist": sorted(blacklist)
+        }
     except Exception as e:
         log.error(f"[API /blacklist GET] Error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@blacklist_router.post("/blacklist/{symbol}", dependencies=[Depends(verify_token)])
+async def add_blacklist_symbol(symbol: str):
+    """Добавляет базовый символ в Blacklist и сразу инвалидирует кэш."""
+    log_prefix = "[API /blacklist POST]"
+    symbol = _validate_symbol(symbol)
+    try:
+        added = await add_to_blacklist(symbol, log_prefix=log_prefix)
+        blacklist_cache.invalidate_blacklist(log_prefix)
+        return {"symbol": symbol, "added": added}
+    except Exception as e:
+        log.error(f"{log_prefix} Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@blacklist_router.delete("/blacklist/{symbol}", dependencies=[Depends(verify_token)])
+async def remove_blacklist_symbol(symbol: str):
+    """Удаляет символ из Blacklist и сразу инвалидирует кэш."""
+    log_prefix = "[API /blacklist DELETE]"
+    symbol = _validate_symbol(symbol)
+    try:
+        removed = await remove_from_blacklist(symbol, log_prefix=log_prefix)
+    except Exception as e:
+        log.error(f"{log_prefix} Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Symbol '{symbol}' is not in blacklist")
+    blacklist_cache.invalidate_blacklist(log_prefix)
+    return {"symbol": symbol, "removed": True}
@@ -1,19 +1,26 @@
 # api/endpoints/coins.py
 
 import logging
-import io
-import pandas as pd
-from fastapi import APIRouter, HTTPException, Depends, Response
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Response, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
 
-import config
 # Импортируем сервисы напрямую
-from services.data_cache_service import get_cached_coins_data
-from services.mongo_service import load_blacklist_from_mongo_async
+from services.data_cache_service import (
+    get_cached_coins_data,
+    get_filtered_views,
+    extract_base_symbol,
+    iter_csv_chunks
+)
+from services.mongo_service import rollback_coins_collection
+from services.history_service import get_metric_history
+from services import export_service
 
 # Import our security module
 from api.security import verify_token
+from api.cached_response import cached_response
 
 # --- Setup ---
 log = logging.getLogger(__name__)
@@ -23,23 +30,16 @@ coins_router = APIRouter()
 # ============================================================================
 # === _extract_base_symbol_from_full ===
 # ============================================================================
-def _extract_base_symbol_from_full(full_symbol: str) -> str:
-    """
-    Извлекает базовый символ из полного формата (e.g., 'SOL/USDT:USDT' -> 'SOL').
-    Это обеспечивает единую логику сравнения с Черным списком.
-    """
-    if not full_symbol:
-        return ""
-    # Базовый символ - это часть до первого слэша (/)
-    ccxt_symbol = full_symbol.split(':')[0] 
-    return ccxt_symbol.split('/')[0]
+# (Логика фильтрации перенесена в data_cache_service: представления строятся
+# один раз на версию кэша, а не на каждый запрос)
+_extract_base_symbol_from_full = extract_base_symbol
 
 
 # ============================================================================
 # === ЗАЩИЩЁННЫЙ ЭНДПОИНТ (JSON) ===
 # ============================================================================
 @coins_router.get("/coins/filtered", dependencies=[Depends(verify_token)])
-async def get_filtered_coins():
+async def get_filtered_coins(request: Request):
     """
     (V3) Возвращает ВСЕ отфильтрованные монеты из КЭША (MongoDB).
     Фильтрация:
@@ -50,61 +50,17 @@ async def get_filtered_coins():
     log.info(f"{log_prefix} Запрошены монеты (JSON) из кэша...")
     
     try:
-        # 1. Получаем данные из кэша
-        all_coins = await get_cached_coins_data(
-            force_reload=False, 
-            log_prefix=f"{log_prefix} [Cache]"
-        )
+        # Готовое представление (пересчитывается только при обновлении кэша/blacklist)
+        views = await get_filtered_views(log_prefix=f"{log_prefix} [Views]")
         
-        # 2. Получаем Черный список
-        blacklist = await load_blacklist_from_mongo_async(
-            log_prefix=f"{log_prefix} [Blacklist]"
-        )
-        
-        if not all_coins:
+        if not views:
             log.warning(f"{log_prefix} Кэш пуст.")
             raise HTTPException(status_code=404, detail="No data available in cache.")
             
-        # 3. Фильтрация
-        filtered_coins = []
-        stats = {
-            "blacklist": 0,
-            "low_correlation": 0
-        }
-        
-        for coin in all_coins:
-            # --- ПРОВЕРКА 1: Blacklist ---
-            base_symbol = _extract_base_symbol_from_full(coin.get('symbol', ''))
-            if base_symbol in blacklist:
-                stats["blacklist"] += 1
-                continue
-
-            # --- ПРОВЕРКА 2: BTC Correlation < 0.4 ---
-            # (Метрика из calculator.py: 'btc_corr_1d_w30')
-            btc_corr = coin.get('btc_corr_1d_w30')
-            
-            # Если корреляции нет (None) или она меньше 0.4 -> пропускаем
-            if btc_corr is None or btc_corr < 0.4:
-                stats["low_correlation"] += 1
-                continue
-
-            # Если всё ок -> добавляем
-            filtered_coins.append(coin)
-        
-        count_after = len(filtered_coins)
-
-        log.info(f"{log_prefix} Filtering result: {len(all_coins)} -> {count_after} coins.")
-        if stats["blacklist"] > 0:
-            log.warning(f"{log_prefix} 🚫 Отсеяно по Черному списку: {stats['blacklist']}")
-        if stats["low_correlation"] > 0:
-            log.warning(f"{log_prefix} 📉 Отсеяно по Correlation (<0.4): {stats['low_correlation']}")
-            
-        log.info(f"{log_prefix} ✅ Успешно. Возвращаем {count_after} монет.")
+        log.info(f"{log_prefix} ✅ Успешно. Возвращаем {len(views['coins'])} монет.")
         
-        return JSONResponse(content=jsonable_encoder({
-            "count": count_after,
-            "data": filtered_coins
-        }))
+        # Готовое тело + ETag (304, если у клиента та же версия)
+        return cached_response(request, views["bodies"]["filtered"])
         
     except HTTPException:
         raise 
@@ -117,7 +73,10 @@ async def get_filtered_coins():
 # === ПУБЛИЧНЫЙ ЭНДПОИНТ (CSV) ===
 # ============================================================================
 @coins_router.get("/coins/filtered/csv")
-async def get_filtered_coins_csv():
+async def get_filtered_coins_csv(
+    request: Request,
+    stream: bool = Query(False, description="Отдать CSV потоком по строкам (без готового файла)")
+):
     """
     (V3) Возвращает ВСЕ монеты из КЭША (MongoDB) в CSV формате.
     Фильтрация:
@@ -128,74 +87,127 @@ async def get_filtered_coins_csv():
     log.info(f"{log_prefix} Запрошены монеты (CSV)...")
 
     try:
-        # 1. Получаем данные из кэша
-        all_coins = await get_cached_coins_data(
-            force_reload=False, 
-            log_prefix=f"{log_prefix} [Cache]"
-        )
-
-        # 2. Получаем Черный список
-        blacklist = await load_blacklist_from_mongo_async(
-            log_prefix=f"{log_prefix} [Blacklist]"
-        )
+        views = await get_filtered_views(log_prefix=f"{log_prefix} [Views]")
         
-        if not all_coins:
+        if not views:
             log.warning(f"{log_prefix} Кэш пуст.")
             return Response(content="No data available in cache", status_code=404, media_type="text/plain")
 
-        # 3. Фильтрация
-        filtered_coins = []
-        stats = {
-            "blacklist": 0,
-            "low_correlation": 0
-        }
-        
-        for coin in all_coins:
-            # --- ПРОВЕРКА 1: Blacklist ---
-            base_symbol = _extract_base_symbol_from_full(coin.get('symbol', ''))
-            if base_symbol in blacklist:
-                stats["blacklist"] += 1
-                continue
-            
-            # --- ПРОВЕРКА 2: BTC Correlation < 0.4 ---
-            btc_corr = coin.get('btc_corr_1d_w30')
-            if btc_corr is None or btc_corr < 0.4:
-                stats["low_correlation"] += 1
-                continue
-                
-            filtered_coins.append(coin)
-        
-        count_after = len(filtered_coins)
-        
-        log.info(f"{log_prefix} Filtering result: {len(all_coins)} -> {count_after} coins.")
-        if stats["blacklist"] > 0:
-            log.warning(f"{log_prefix} 🚫 Отсеяно по Черному списку: {stats['blacklist']}")
-        if stats["low_correlation"] > 0:
-            log.warning(f"{log_prefix} 📉 Отсеяно по Correlation (<0.4): {stats['low_correlation']}")
-        
-        if not filtered_coins: 
+        if not views["coins"]: 
             log.warning(f"{log_prefix} No data after filtering.")
             return Response(content="No data found after filtering", status_code=404, media_type="text/plain")
 
-        # 4. Конвертация в DataFrame
-        df = pd.DataFrame(filtered_coins) 
-        
-        columns_in_order = [col for col in config.DATABASE_SCHEMA.keys() if col in df.columns]
-        df = df[columns_in_order]
+        if stream or not views["bodies"]["csv"]:
+            # Порции строк прямо из представления (весь файл в памяти не собирается)
+            log.info(f"{log_prefix} Streaming CSV ({len(views['coins'])} rows).")
+            return StreamingResponse(
+                iter_csv_chunks(views["coins"], views["csv_columns"]),
+                media_type="text/csv",
+                headers={"Content-Disposition": "attachment; filename=coins_data.csv"}
+            )
 
-        log.info(f"{log_prefix} DataFrame created. {df.shape[0]} rows. Sending CSV.")
-        
-        stream = io.StringIO()
-        df.to_csv(stream, index=False)
+        log.info(f"{log_prefix} Sending CSV ({len(views['coins'])} rows).")
         
-        response = StreamingResponse(
-            iter([stream.getvalue()]), 
-            media_type="text/csv"
+        return cached_response(
+            request,
+            views["bodies"]["csv"],
+            headers={"Content-Disposition": "attachment; filename=coins_data.csv"}
         )
-        response.headers["Content-Disposition"] = "attachment; filename=coins_data.csv"
-        
-        return response
 
     except Exception as e:
         log.error(f"{log_prefix} ❌ Ошибка: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+# ============================================================================
+# === ЗАЩИЩЁННЫЙ ЭНДПОИНТ (ОТКАТ ВЕРСИИ) ===
+# ============================================================================
+@coins_router.post(
+    "/coins/rollback",
+    summary="Вернуть предыдущую версию монет (до последнего сохранения)",
+    dependencies=[Depends(verify_token)]
+)
+async def rollback_coins():
+    """
+    Атомарно возвращает предыдущую версию коллекции монет и перезагружает кэш.
+    """
+    log_prefix = "[API /coins/rollback POST]"
+    log.info(f"{log_prefix} 🔄 Получен запрос на откат версии монет...")
+
+    restored_count = await rollback_coins_collection(log_prefix=log_prefix)
+    if not restored_count:
+        raise HTTPException(status_code=404, detail="No previous version available.")
+
+    reloaded = await get_cached_coins_data(force_reload=True, log_prefix=f"{log_prefix} [Cache]")
+    log.info(f"{log_prefix} ✅ Откат выполнен. В кэше {len(reloaded)} монет.")
+    return {
+        "message": "Восстановлена предыдущая версия монет.",
+        "coins_restored": restored_count
+    }
+
+
+# ============================================================================
+# === ЗАЩИЩЁННЫЙ ЭНДПОИНТ (ИСТОРИЯ МЕТРИК) ===
+# ============================================================================
+@coins_router.get("/coins/history", dependencies=[Depends(verify_token)])
+async def get_coin_history(
+    symbol: str = Query(..., description="full_symbol монеты, например 'SOL/USDT:USDT:USDT'"),
+    metrics: Optional[str] = Query(None, description="Метрики через запятую (по умолчанию все)"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """
+    История метрик монеты за период (по одной точке на запуск анализа).
+    """
+    log_prefix = "[API /coins/history GET]"
+    metric_list = [m.strip() for m in metrics.split(',') if m.strip()] if metrics else None
+
+    try:
+        points = await get_metric_history(symbol, metric_list, start, end, limit, log_prefix)
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    log.info(f"{log_prefix} ✅ {symbol}: {len(points)} точек истории.")
+    return JSONResponse(content=jsonable_encoder({
+        "symbol": symbol,
+        "count": len(points),
+        "data": points
+    }))
+
+
+# ============================================================================
+# === ЗАЩИЩЁННЫЙ ЭНДПОИНТ (ARROW / PARQUET) ===
+# ============================================================================
+@coins_router.get("/coins/export", dependencies=[Depends(verify_token)])
+async def export_coins(
+    request: Request,
+    format: str = Query("arrow", pattern="^(arrow|parquet)$"),
+    columns: Optional[str] = Query(None, description="Колонки через запятую (по умолчанию все)"),
+    snapshot: str = Query("current", pattern="^(current|previous)$"),
+    at: Optional[datetime] = Query(None, description="Снимок истории метрик на момент времени")
+):
+    """
+    Типизированная колоночная выгрузка монет (Arrow IPC или Parquet).
+    """
+    log_prefix = "[API /coins/export GET]"
+
+    column_list = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+    try:
+        prepared = await export_service.get_export(format, column_list, snapshot, at, log_prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    if not prepared:
+        raise HTTPException(status_code=404, detail="No data available for this snapshot.")
+
+    extension = "arrow" if format == "arrow" else "parquet"
+    return cached_response(
+        request,
+        prepared,
+        headers={"Content-Disposition": f"attachment; filename=coins_{snapshot}.{extension}"}
+    )
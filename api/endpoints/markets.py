@@ -0,0 +1,44 @@
+# api/endpoints/markets.py
+
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+
+import config
+from services.market_cache import get_cached_symbols, get_market_cache_stats
+
+# Import our security module
+from api.security import verify_token
+
+# --- Setup ---
+log = logging.getLogger(__name__)
+markets_router = APIRouter()
+
+
+# ============================================================================
+# === Эндпоинт (Символы из кэша рынков) ===
+# ============================================================================
+
+@markets_router.get("/markets/symbols", dependencies=[Depends(verify_token)])
+async def get_market_symbols(exchange_id: Optional[str] = Query(None)):
+    """
+    Возвращает активные фьючерсные символы из КЭША рынков
+    (память / снимок на диске), БЕЗ обращения к бирже.
+    """
+    log_prefix = "[API /markets/symbols GET]"
+    exchange_ids = [exchange_id] if exchange_id else config.EXCHANGES_TO_LOAD
+
+    result = {}
+    for ex_id in exchange_ids:
+        symbols = get_cached_symbols(ex_id, config.QUOTE_CURRENCIES)
+        if symbols is not None:
+            result[ex_id] = {"count": len(symbols), "symbols": symbols}
+
+    if not result:
+        log.warning(f"{log_prefix} Кэш рынков пуст ({exchange_ids}).")
+        raise HTTPException(status_code=404, detail="No market metadata in cache.")
+
+    return {
+        "exchanges": result,
+        "cache": get_market_cache_stats()
+    }
@@ -0,0 +1,136 @@
+# api/endpoints/query.py
+
+import logging
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Response, Query
+from pydantic import BaseModel, Field
+
+import config
+from services.data_cache_service import get_filtered_views, dumps_json
+from services.columnar_index import run_query
+from services.screener import screen_mask
+
+# Import our security module
+from api.security import verify_token
+
+# --- Setup ---
+log = logging.getLogger(__name__)
+query_router = APIRouter()
+
+
+class CoinsQueryRequest(BaseModel):
+    """
+    Параметры запроса к колоночному индексу кэша.
+    filters: {"hurst_4h": {"min": 0.55}, "category": [4, 5, 6], "btc_corr_1d_w30": {"min": 0.4}}
+    where: "hurst_4h > 0.55 and adx_above_25_pct_90d_4h > 40" (выражение скринера)
+    screen: имя сохраненного скрина (config.SAVED_SCREENS)
+    sort: ["-hurst_4h", "category"] ('-' = по убыванию)
+    """
+    filters: Dict[str, Any] = Field(default_factory=dict)
+    where: Optional[str] = None
+    screen: Optional[str] = None
+    sort: List[str] = Field(default_factory=list)
+    fields: Optional[List[str]] = None
+    limit: int = 100
+    cursor: Optional[str] = None
+
+
+# ============================================================================
+# === Эндпоинт (Query API) ===
+# ============================================================================
+
+@query_router.post("/coins/query", dependencies=[Depends(verify_token)])
+async def query_coins(params: CoinsQueryRequest):
+    """
+    Фильтры по диапазонам любых метрик, сортировка, проекция полей и
+    курсорная пагинация по монетам кэша (вне черного списка).
+    """
+    log_prefix = "[API /coins/query POST]"
+
+    views = await get_filtered_views(log_prefix=f"{log_prefix} [Views]")
+    if not views:
+        log.warning(f"{log_prefix} Кэш пуст.")
+        raise HTTPException(status_code=404, detail="No data available in cache.")
+
+    index = views["index"]
+    try:
+        base_mask = None
+        if params.screen:
+            if params.screen not in views["screens"]:
+                raise HTTPException(status_code=404, detail=f"Unknown screen: '{params.screen}'")
+            base_mask = views["screens"][params.screen]
+        if params.where:
+            where_mask = screen_mask(index, params.where)
+            base_mask = where_mask if base_mask is None else base_mask & where_mask
+
+        result = run_query(
+            index,
+            filters=params.filters,
+            sort=params.sort,
+            fields=params.fields,
+            limit=params.limit,
+            cursor=params.cursor,
+            base_mask=base_mask
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    log.info(f"{log_prefix} ✅ Найдено {result['total']}, отдано {result['count']}.")
+    return Response(content=dumps_json(result), media_type="application/json")
+
+
+@query_router.get("/coins/screens", dependencies=[Depends(verify_token)])
+async def list_screens():
+    """Сохраненные скрины (config.SAVED_SCREENS) и число монет в каждом."""
+    log_prefix = "[API /coins/screens GET]"
+
+    views = await get_filtered_views(log_prefix=f"{log_prefix} [Views]")
+    if not views:
+        raise HTTPException(status_code=404, detail="No data available in cache.")
+
+    return {
+        "screens": [
+            {"name": name, "expression": config.SAVED_SCREENS[name], "count": int(mask.sum())}
+            for name, mask in views["screens"].items()
+        ]
+    }
+
+
+@query_router.get("/coins/similar", dependencies=[Depends(verify_token)])
+async def similar_coins(
+    symbol: Optional[str] = Query(None, description="full_symbol или symbol монеты-образца"),
+    vector: Optional[str] = Query(None, description="Вектор метрик: 'hurst_4h:0.62,mci_4h:0.3'"),
+    k: int = Query(10, ge=1, le=config.SIMILARITY_MAX_K)
+):
+    """
+    k монет, наиболее похожих по метрикам структуры (config.SIMILARITY_FEATURES)
+    на монету или заданный вектор.
+    """
+    log_prefix = "[API /coins/similar GET]"
+    if bool(symbol) == bool(vector):
+        raise HTTPException(status_code=400, detail="Pass exactly one of 'symbol' or 'vector'.")
+
+    views = await get_filtered_views(log_prefix=f"{log_prefix} [Views]")
+    if not views:
+        raise HTTPException(status_code=404, detail="No data available in cache.")
+    similarity = views["similarity"]
+
+    if symbol:
+        neighbours = similarity.similar_to(symbol, k)
+        if neighbours is None:
+            raise HTTPException(status_code=404, detail=f"Symbol '{symbol}' not found in cache.")
+    else:
+        try:
+            values = {}
+            for item in vector.split(','):
+                name, _, value = item.partition(':')
+                values[name.strip()] = float(value)
+            neighbours = similarity.nearest(similarity.vector_from_values(values), k)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid vector: {e}")
+
+    log.info(f"{log_prefix} ✅ {symbol or vector}: {len(neighbours)} похожих монет.")
+    return Response(
+        content=dumps_json({"features": similarity.features, "count": len(neighbours), "data": neighbours}),
+        media_type="application/json"
+    )
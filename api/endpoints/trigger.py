@@ -2,16 +2,19 @@
 
 import logging
 import asyncio
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query
 
 # --- (ИСПРАВЛЕНИЕ РЕФАКТОРИНГА) ---
 # (БЫЛО) from services import mongo_service
 # (СТАЛО) Импортируем НАПРЯМУЮ
 import analysis
+import config
 from services.mongo_service import (
     create_mongo_log_entry,
     update_mongo_log_status
 )
+from services.checkpoint_service import find_interrupted_run_id
 # --- (КОНЕЦ ИСПРАВЛЕНИЯ) ---
 
 # (УДАЛЕНЫ) Импорты PostgreSQL
@@ -24,11 +27,16 @@ from ..security import verify_token
 log = logging.getLogger(__name__)
 trigger_router = APIRouter()
 
+# Запуски, выполняющиеся в ЭТОМ процессе (их нельзя "возобновлять")
+_active_run_ids = set()
+
 # --- (V3) Вспомогательная функция для запуска анализа ---
 
 async def run_analysis_in_background(
     log_id: str,  # (ИЗМЕНЕНИЕ) log_id теперь str (Mongo _id)
-    log_prefix: str
+    log_prefix: str,
+    resume: bool = False,
+    deadline_seconds: Optional[int] = None
 ):
     """
     (V3) Обертка для фонового запуска analysis_logic.
@@ -36,13 +44,16 @@ async def run_analysis_in_background(
     """
     log.info(f"{log_prefix} (BG) Фоновая задача запущена.")
     coins_saved = 0 
+    _active_run_ids.add(log_id)
     
     try:
         # --- (V3) ГЛАВНЫЙ ВЫЗОВ ---
         # (ИЗМЕНЕНИЕ) 'analysis_logic' теперь ожидает 'log_id'
         coins_saved, details = await analysis.analysis_logic(
             run_id=log_id, 
-            log_prefix=log_prefix
+            log_prefix=log_prefix,
+            resume=resume,
+            deadline_seconds=deadline_seconds
         )
         
         log.info(f"{log_prefix} (BG) Фоновая задача завершена. Монет сохранено: {coins_saved}")
@@ -66,18 +77,56 @@ async def run_analysis_in_background(
             )
         except Exception as db_e:
             log.error(f"{log_prefix} (BG) Не удалось даже обновить лог об ошибке: {db_e}", exc_info=True)
+    finally:
+        _active_run_ids.discard(log_id)
 
 # --- (V3) API Эндпоинт (Триггер) ---
 
 @trigger_router.post("/trigger/run-analysis", dependencies=[Depends(verify_token)])
-async def trigger_analysis(background_tasks: BackgroundTasks):
+async def trigger_analysis(
+    background_tasks: BackgroundTasks,
+    resume: bool = Query(False, description="Возобновить последний прерванный запуск (если есть)"),
+    resume_run_id: Optional[str] = Query(None, description="Возобновить конкретный прерванный запуск"),
+    deadline_seconds: Optional[int] = Query(
+        None, ge=60, description="Дедлайн запуска (сек): сохраняется то, что успело завершиться"
+    )
+):
     """
     (V3) Запускает полный анализ (асинхронно, в фоне).
+    resume / resume_run_id: продолжает прерванный запуск из контрольных точек
+    (тот же run_id); если прерванного запуска нет — обычный запуск.
+    deadline_seconds: дедлайн запуска (по умолчанию config.RUN_DEADLINE_SECONDS).
     """
+    deadline_seconds = deadline_seconds or config.RUN_DEADLINE_SECONDS
     log_prefix = f"[Run ID: ???] "
     log_id = None # (ИЗМЕНЕНИЕ) Определяем log_id здесь
     
     try:
+        # --- Возобновление прерванного запуска ---
+        if resume or resume_run_id:
+            log_id = resume_run_id or await find_interrupted_run_id(log_prefix)
+            
+            if log_id and log_id in _active_run_ids:
+                raise HTTPException(status_code=409, detail=f"Запуск {log_id} еще выполняется.")
+            
+            if log_id:
+                log_prefix = f"[Run ID: {log_id}] "
+                log.info(f"{log_prefix} Возобновление прерванного запуска из контрольных точек...")
+                await update_mongo_log_status(
+                    log_id_str=log_id,
+                    status="Запуск",
+                    details="Возобновлен из контрольных точек"
+                )
+                background_tasks.add_task(run_analysis_in_background, log_id, log_prefix, True, deadline_seconds)
+                return {
+                    "message": "Анализ возобновлен в фоновом режиме.",
+                    "run_id": log_id,
+                    "resumed": True,
+                    "deadline_seconds": deadline_seconds
+                }
+            
+            log.info(f"{log_prefix} Прерванных запусков нет. Обычный запуск...")
+        
         log.info(f"{log_prefix} (V3) /trigger вызван. Попытка создать запись в логе MongoDB...")
         
         # (ИЗМЕНЕНИЕ) Используем create_mongo_log_entry
@@ -91,13 +140,16 @@ async def trigger_analysis(background_tasks: BackgroundTasks):
         log.info(f"{log_prefix} Запись в логе создана. Запуск analysis_logic в фоне...")
 
         # Добавляем задачу в фон
-        background_tasks.add_task(run_analysis_in_background, log_id, log_prefix)
+        background_tasks.add_task(run_analysis_in_background, log_id, log_prefix, False, deadline_seconds)
         
         return {
             "message": "Анализ запущен в фоновом режиме.",
-            "run_id": log_id # Возвращаем Mongo _id (str)
+            "run_id": log_id, # Возвращаем Mongo _id (str)
+            "deadline_seconds": deadline_seconds
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"{log_prefix} (V3) КРИТИЧЕСКАЯ ОШИБКА в /trigger: {e}", exc_info=True)
         detail_msg = f"Ошибка при запуске: {e}"
@@ -108,4 +160,4 @@ async def trigger_analysis(background_tasks: BackgroundTasks):
                 status="Ошибка",
                 details=detail_msg
             )
-        raise HTTPException(status_code=500, detail=detail_msg)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=detail_msg)
@@ -16,22 +16,31 @@ from .endpoints import (
     logs_router,
     trigger_router,
     data_quality_router,
-    formatted_symbols_router
+    formatted_symbols_router,
+    markets_router,
+    query_router
 )
 
 # --- (ИСПРАВЛЕНИЕ РЕФАКТОРИНГА) ---
 # Импортируем сервисные функции НАПРЯМУЮ
 from services.mongo_service import (
     close_mongo_client,
-    load_blacklist_from_mongo_async
+    close_async_mongo_client
 )
+from services.blacklist_cache import get_blacklist, watch_blacklist_changes
 from services.data_cache_service import get_cached_coins_data
+from services.exchange_registry import close_all_exchanges
+from services.market_cache import load_snapshots
+import config
 # --- (КОНЕЦ ИСПРАВЛЕНИЯ) ---
 
 # --- Настройка ---
 log = logging.getLogger(__name__)
 app = FastAPI(title="Crypto Analysis API")
 
+# Фоновая подписка на изменения черного списка (change stream)
+_blacklist_watch_task = None
+
 # --- Middleware ---
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +58,8 @@ app.include_router(data_quality_router, tags=["Data Quality"])
 app.include_router(trigger_router, tags=["Trigger"])
 app.include_router(coins_router, tags=["Coins"])
 app.include_router(formatted_symbols_router, tags=["Coins (Formatted)"])
+app.include_router(markets_router, tags=["Markets"])
+app.include_router(query_router, tags=["Coins (Query)"])
 
 
 # --- События Startup / Shutdown ---
@@ -60,12 +71,18 @@ async def startup():
     """
     log.info("...Событие Startup...")
     
-    # 1. Загрузка черного списка (асинхронно)
-    await load_blacklist_from_mongo_async(log_prefix="[Startup]")
+    global _blacklist_watch_task
+    
+    # 1. Загрузка черного списка в кэш + подписка на его изменения
+    await get_blacklist(force_reload=True, log_prefix="[Startup]")
+    _blacklist_watch_task = asyncio.create_task(watch_blacklist_changes())
     
     # 2. "Прогрев" кэша
     await get_cached_coins_data(force_reload=True, log_prefix="[Startup]")
     
+    # 3. Снимки рынков с диска (ответы о символах без обращения к бирже)
+    await load_snapshots(config.EXCHANGES_TO_LOAD, log_prefix="[Startup]")
+    
     log.info("...Событие Startup завершено...")
 
 @app.on_event("shutdown")
@@ -74,7 +91,11 @@ async def shutdown():
     Выполняется при остановке приложения.
     """
     log.info("...Событие Shutdown...")
+    if _blacklist_watch_task:
+        _blacklist_watch_task.cancel()
     close_mongo_client(log_prefix="[Shutdown]")
+    await close_async_mongo_client(log_prefix="[Shutdown]")
+    await close_all_exchanges(log_prefix="[Shutdown]")
     log.info("...Событие Shutdown завершено...")
 
 
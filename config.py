@@ -31,12 +31,146 @@ MIN_CANDLES_FOR_HURST = 100
 MIN_CANDLES_FOR_ENTROPY = 50
 MIN_VOLUME_24H_USD = 3_000_000
 
+# --- Maturity Pre-screen (Этап 2, по дате листинга) ---
+# Буфер (дни) вокруг MIN_CANDLES_FOR_MATURITY: внутри буфера — проверка по свечам
+MATURITY_PRESCREEN_MARGIN_DAYS = 5
+# Кэш "известных зрелых" монет (full_symbol) из прошлых запусков
+MATURITY_CACHE_PATH = os.getenv('MATURITY_CACHE_PATH', '.cache/known_mature.json')
+
 # --- CCXT Configuration ---
 CANDLE_LIMIT_DEFAULT = 1000
 RETRY_ATTEMPTS = 5
 RETRY_WAIT_MIN = 3
 RETRY_WAIT_MAX = 30
 
+# --- Market Metadata Cache ---
+# Время жизни кэша рынков (память + снимок на диске), секунды
+MARKET_CACHE_TTL_SECONDS = 6 * 60 * 60
+# Папка для снимков рынков ({exchange_id}.json)
+MARKET_CACHE_DIR = os.getenv('MARKET_CACHE_DIR', '.cache/markets')
+
+# --- Exchange Registry (долгоживущие экземпляры CCXT) ---
+# Экземпляр пересоздается, если он старше этого значения (секунды)
+EXCHANGE_MAX_AGE_SECONDS = 6 * 60 * 60
+# Таймаут health-check ('fetch_time') перед запуском анализа (секунды)
+EXCHANGE_HEALTHCHECK_TIMEOUT = 10
+
+# --- Exchange Controller (AIMD + Circuit Breaker) ---
+# Верхняя граница лимита конкурентности: MAX_CONCURRENT_PER_EXCHANGE (ниже)
+# Скользящее окно исходов запросов и порог размыкания цепи
+CIRCUIT_WINDOW_SIZE = 20
+CIRCUIT_MIN_CALLS = 10
+CIRCUIT_FAILURE_RATE = 0.5
+# Пауза (сек) при разомкнутой цепи до пробного запроса
+CIRCUIT_COOLDOWN_SECONDS = 30
+# Мультипликативное снижение лимита (не чаще раза в интервал, сек)
+AIMD_DECREASE_FACTOR = 0.5
+AIMD_DECREASE_INTERVAL_SECONDS = 2.0
+# Ответ дольше этого (сек) считается признаком перегрузки
+EXCHANGE_SLOW_CALL_SECONDS = 20.0
+
+# --- Run Checkpoints (возобновление прерванного анализа) ---
+CHECKPOINTS_ENABLED = os.getenv('CHECKPOINTS_ENABLED', 'true').lower() == 'true'
+# Контрольные точки прерванных запусков удаляются TTL-индексом через N часов
+CHECKPOINT_TTL_HOURS = 48
+
+# --- Run Deadline (ограничение длительности запуска) ---
+# Дедлайн по умолчанию (сек) для /trigger/run-analysis; пусто -> без дедлайна
+RUN_DEADLINE_SECONDS = int(os.getenv('RUN_DEADLINE_SECONDS', '0')) or None
+# Резерв (сек) до дедлайна на ранги и сохранение: новые пачки не планируются
+RUN_DEADLINE_SAVE_RESERVE_SECONDS = 60
+
+# --- Analysis Priority (порядок монет на Этапах 2-3) ---
+# Вес объема (перцентиль в текущем списке), прошлой категории (1-6)
+# и "устаревания" сохраненных метрик (возраст / горизонт)
+PRIORITY_WEIGHTS = {'volume': 0.6, 'category': 0.2, 'staleness': 0.2}
+PRIORITY_STALENESS_HORIZON_HOURS = 24
+
+# --- Differential Runs (частота пересчета по таймфреймам) ---
+# Запуск загружает и пересчитывает только "просроченные" ТФ; метрики
+# остальных ТФ берутся из сохраненного документа монеты.
+DIFFERENTIAL_RUNS_ENABLED = os.getenv('DIFFERENTIAL_RUNS_ENABLED', 'true').lower() == 'true'
+# Период пересчета каждого ТФ (часы)
+TIMEFRAME_REFRESH_HOURS = {
+    '1h': 1,
+    '2h': 2,
+    '4h': 4,
+    '12h': 12,
+    '1d': 24
+}
+# Допуск (мин): ТФ считается "просроченным" чуть раньше срока, чтобы
+# ежечасный триггер с дрожанием расписания не пропускал пересчет
+TIMEFRAME_REFRESH_TOLERANCE_MINUTES = 5
+
+# --- Staged Writes (поэтапная запись результатов в MongoDB) ---
+# Этап 3 пишет готовые пачки в промежуточную коллекцию запуска, Этап 4
+# атомарно подменяет ею 'coin-sifter'. false -> одна запись в конце запуска.
+STAGED_WRITES_ENABLED = os.getenv('STAGED_WRITES_ENABLED', 'true').lower() == 'true'
+# Режим сохранения монет (Этап 4):
+# 'swap' — новая версия коллекции атомарно подменяет 'coin-sifter';
+# 'diff' — в 'coin-sifter' пишутся только измененные поля (UpdateOne $set,
+#          float с допуском), выбывшие монеты удаляются. Экономит объем записи
+#          на общем тарифе Atlas, но без атомарной подмены и отката.
+COINS_SAVE_MODE = os.getenv('COINS_SAVE_MODE', 'swap').lower()
+
+# --- Metrics History (история метрик монет) ---
+# Метрики каждого запуска дописываются в time-series коллекцию MongoDB
+HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'true').lower() == 'true'
+# Точки старше N дней удаляются автоматически
+HISTORY_RETENTION_DAYS = 365
+
+# --- Blacklist Cache (черный список в памяти процесса) ---
+# Перечитывать коллекцию 'blacklist' не чаще, чем раз в N секунд
+# (изменения через API и change stream инвалидируют кэш сразу)
+BLACKLIST_CACHE_TTL_SECONDS = 5 * 60
+
+# --- API Filtering ---
+# Монеты с btc_corr_1d_w30 ниже порога (или без нее) не попадают в
+# /coins/filtered, /coins/filtered/csv и /coins/formatted-symbols
+FILTER_MIN_BTC_CORR = 0.4
+
+# --- Response Compression ---
+# Тела представлений сжимаются один раз на версию кэша (gzip и brotli).
+# Уровни выше обычных: сжатие не на запрос.
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_GZIP_LEVEL = 9
+COMPRESSION_BROTLI_QUALITY = 9
+
+# --- CSV Export ---
+# True: CSV рендерится один раз на версию кэша (ETag/304/сжатие).
+# False: /coins/filtered/csv всегда отдается потоком (память не растет с числом монет/колонок)
+CSV_PRERENDER_ENABLED = os.getenv('CSV_PRERENDER_ENABLED', 'true').lower() == 'true'
+# Строк в одной порции потоковой выгрузки
+CSV_STREAM_CHUNK_ROWS = 200
+
+# --- Query API (/coins/query) ---
+# Максимум монет на одной странице
+QUERY_MAX_LIMIT = 1000
+
+# --- Screener (выражения над колонками DATABASE_SCHEMA) ---
+# Именованные скрины: маски считаются один раз на версию кэша,
+# запрос с "screen": "<имя>" не разбирает и не вычисляет выражение
+SAVED_SCREENS = {
+    "correlated": "btc_corr_1d_w30 >= 0.4",
+    "trending_4h": "hurst_4h > 0.55 and adx_above_25_pct_90d_4h > 40 and category >= 4",
+    "mean_reverting_4h": "hurst_4h < 0.45 and mr_quality_4h_w20 > trend_quality_4h_w20",
+}
+
+# --- Similarity Search (/coins/similar) ---
+# Признаки "структуры" монеты для поиска похожих (нормируются z-score)
+SIMILARITY_FEATURES = [
+    f"{metric}_{tf}"
+    for tf in ('4h', '1d')
+    for metric in ('hurst', 'fractal_dimension', 'mci')
+] + ['jagginess_4h_w20', 'jagginess_1d_w20', 'btc_corr_1d_w30']
+SIMILARITY_MAX_K = 100
+
+# --- Precision Configuration ---
+# Тип хранения OHLCV и промежуточных массивов: 'float64' (по умолчанию) или 'float32'.
+# 'float32' вдвое уменьшает рабочий набор (5 ТФ × ~1000 свечей × 5 колонок на монету).
+# Лог-доходности и регрессии в metrics/ всегда считаются в float64.
+OHLCV_PRECISION = os.getenv('OHLCV_PRECISION', 'float64')
+
 # --- Worker Configuration ---
 MAX_CONCURRENT_PER_EXCHANGE = 10
 NUM_WORKERS = 10
@@ -62,20 +62,24 @@ TIMEFRAMES = ['1h', '2h', '4h', '12h', '1d']
 # === ОСНОВНАЯ ЛОГИКА ОРКЕСТРАТОРА ===
 # ============================================================================
 
-def calculate_all_metrics(ohlcv_data, btc_data_1d):
+def calculate_all_metrics(ohlcv_data, btc_data_1d, timeframes=None):
     """
     Calculate all metrics for all timeframes.
+
+    timeframes: считать только эти ТФ (дифференциальный запуск);
+    None -> все TIMEFRAMES. BTC-корреляции считаются вместе с '1d'.
     """
     metrics = {}
+    timeframes_to_calc = [tf for tf in TIMEFRAMES if timeframes is None or tf in timeframes]
     
     # 1. Структурные метрики (Hurst, R-Squared, и т.д.)
     try:
-        metrics.update(calculate_hurst_metrics(ohlcv_data, TIMEFRAMES))
+        metrics.update(calculate_hurst_metrics(ohlcv_data, timeframes_to_calc))
     except Exception as e:
         log.warning(f"Error calculating Hurst metrics: {e}")
     
     # 2. Расчеты по таймфреймам
-    for tf in TIMEFRAMES:
+    for tf in timeframes_to_calc:
         df_tf = ohlcv_data.get(tf, pd.DataFrame())
         
         if df_tf.empty:
@@ -137,7 +141,7 @@ def calculate_all_metrics(ohlcv_data, btc_data_1d):
     # 5. BTC correlation metrics (1d only) (из market.py)
     try:
         df_1d_close = ohlcv_data.get('1d', pd.DataFrame()).get('close', pd.Series(dtype=float))
-        if not df_1d_close.empty and not btc_data_1d.empty:
+        if '1d' in timeframes_to_calc and not df_1d_close.empty and not btc_data_1d.empty:
             metrics['btc_corr_1d_w30'] = calculate_btc_correlation(
                 df_1d_close, btc_data_1d['close'], window=30
             )
@@ -151,6 +155,20 @@ def calculate_all_metrics(ohlcv_data, btc_data_1d):
     final_metrics = {}
     for key, value in metrics.items():
         if value is not None and np.isfinite(value) and not isinstance(value, (np.ndarray, pd.Series)):
-            final_metrics[key] = value
+            # float() -> np.float32 (режим OHLCV_PRECISION='float32') не сериализуется в BSON
+            final_metrics[key] = float(value)
     
-    return final_metrics
\ No newline at end of file
+    return final_metrics
+
+
+def metric_timeframe(key):
+    """
+    ТФ метрики по ее ключу ('trend_quality_4h_w20' -> '4h',
+    'btc_corr_stability_...' -> '1d'); None, если ключ не метрика ТФ.
+    """
+    if key.startswith('btc_corr'):
+        return '1d'
+    for part in key.split('_'):
+        if part in TIMEFRAMES:
+            return part
+    return None
\ No newline at end of file
@@ -20,8 +20,9 @@ def _align_and_get_returns(asset_close, btc_close, min_length):
     if len(common_index) < min_length:
         return None, None, 0
     
-    asset_close = asset_close.loc[common_index]
-    btc_close = btc_close.loc[common_index]
+    # Log-returns are always computed in float64 (OHLCV may be stored as float32)
+    asset_close = asset_close.loc[common_index].astype(np.float64)
+    btc_close = btc_close.loc[common_index].astype(np.float64)
     
     # Calculate log returns
     asset_returns = np.log(asset_close / asset_close.shift(1)).dropna()
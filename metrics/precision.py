@@ -0,0 +1,101 @@
+# metrics/precision.py
+"""
+Отчет о дрейфе метрик в режиме float32 (config.OHLCV_PRECISION).
+
+Считает все метрики дважды — на float64 и на float32 копии одних и тех же
+OHLCV-данных — и показывает, насколько каждая метрика "уплывает".
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from typing import Dict, Any, List
+
+from .calculator import calculate_all_metrics
+
+log = logging.getLogger(__name__)
+
+
+def _cast_ohlcv_map(ohlcv_data, dtype):
+    """Returns a copy of {tf: DataFrame} with all columns cast to dtype."""
+    return {tf: df.astype(dtype) for tf, df in ohlcv_data.items() if df is not None}
+
+
+def calculate_precision_drift(ohlcv_data, btc_data_1d) -> Dict[str, Dict[str, float]]:
+    """
+    Calculate per-metric drift of float32 vs float64 for ONE coin.
+
+    Returns:
+        {metric: {'float64': v64, 'float32': v32, 'abs_diff': |d|, 'rel_diff': |d| / |v64|}}
+        Metrics missing in either mode are skipped.
+    """
+    btc_64 = btc_data_1d.astype(np.float64) if btc_data_1d is not None else pd.DataFrame()
+    btc_32 = btc_data_1d.astype(np.float32) if btc_data_1d is not None else pd.DataFrame()
+
+    metrics_64 = calculate_all_metrics(_cast_ohlcv_map(ohlcv_data, np.float64), btc_64)
+    metrics_32 = calculate_all_metrics(_cast_ohlcv_map(ohlcv_data, np.float32), btc_32)
+
+    report = {}
+    for key, v64 in metrics_64.items():
+        v32 = metrics_32.get(key)
+        if v32 is None:
+            continue
+        abs_diff = abs(v32 - v64)
+        rel_diff = abs_diff / abs(v64) if v64 != 0 else (0.0 if abs_diff == 0 else np.inf)
+        report[key] = {
+            'float64': float(v64),
+            'float32': float(v32),
+            'abs_diff': float(abs_diff),
+            'rel_diff': float(rel_diff)
+        }
+    return report
+
+
+def summarize_precision_drift(reports: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate per-coin drift reports into per-metric statistics.
+
+    Returns:
+        {metric: {'coins': n, 'max_abs_diff', 'mean_abs_diff', 'max_rel_diff', 'mean_rel_diff'}}
+    """
+    abs_diffs = defaultdict(list)
+    rel_diffs = defaultdict(list)
+
+    for report in reports:
+        for key, row in report.items():
+            abs_diffs[key].append(row['abs_diff'])
+            if np.isfinite(row['rel_diff']):
+                rel_diffs[key].append(row['rel_diff'])
+
+    summary = {}
+    for key in sorted(abs_diffs):
+        rels = rel_diffs.get(key) or [np.nan]
+        summary[key] = {
+            'coins': len(abs_diffs[key]),
+            'max_abs_diff': float(np.max(abs_diffs[key])),
+            'mean_abs_diff': float(np.mean(abs_diffs[key])),
+            'max_rel_diff': float(np.max(rels)),
+            'mean_rel_diff': float(np.mean(rels))
+        }
+    return summary
+
+
+def log_precision_drift_summary(summary: Dict[str, Dict[str, Any]], log_prefix=""):
+    """Логирует сводку дрейфа (худшие метрики сверху)."""
+    if not summary:
+        log.info(f"{log_prefix} [Precision] 📊 Отчет пуст (нет метрик для сравнения).")
+        return
+
+    log.info(f"{log_prefix} [Precision] 📊 ДРЕЙФ float32 vs float64 ({len(summary)} метрик):")
+    ordered = sorted(
+        summary.items(),
+        key=lambda x: x[1]['max_rel_diff'] if np.isfinite(x[1]['max_rel_diff']) else -1,
+        reverse=True
+    )
+    for key, row in ordered:
+        log.info(
+            f"{log_prefix} [Precision] ├─ {key}: "
+            f"max_rel={row['max_rel_diff']:.2e} | mean_rel={row['mean_rel_diff']:.2e} | "
+            f"max_abs={row['max_abs_diff']:.2e} | монет: {row['coins']}"
+        )
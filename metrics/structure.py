@@ -5,7 +5,7 @@ import pandas as pd
 import numpy as np
 from hurst import compute_Hc
 from scipy.stats import linregress, entropy
-from .utils import get_movement_efficiency, get_fractal_dimension, get_swing_r_squared
+from .utils import get_movement_efficiency, get_fractal_dimension, get_swing_r_squared, as_float64
 
 log = logging.getLogger(__name__)
 
@@ -32,7 +32,7 @@ def _calculate_hurst_for_tf(series, min_candles, log_label="Hurst"):
 
     try:
         # CHANGE: Use kind='change' to analyze returns
-        H, c, data = compute_Hc(series, kind='change', simplified=True)
+        H, c, data = compute_Hc(as_float64(series), kind='change', simplified=True)
 
         # CLIPPING: Limit H to range [0.01, 0.99] to remove invalid values > 1
         H_clipped = _clip_to_valid_range(H, lower_bound=0.01, upper_bound=0.99)
@@ -54,7 +54,7 @@ def calculate_entropy(series, window=None, min_candles=MIN_CANDLES_FOR_ENTROPY):
             log.debug(f"[Entropy] Skipped: insufficient data (need {min_candles}, got {len(series)})")
             return np.nan
 
-        returns = series.pct_change().dropna()
+        returns = as_float64(series).pct_change().dropna()
         if len(returns) < min_candles:
             return np.nan
 
@@ -100,6 +100,7 @@ def calculate_mr_quality(close_prices, window=20):
 
     try:
         # Detrend the series using a simple moving average
+        close_prices = as_float64(close_prices)
         sma = close_prices.rolling(window=window).mean()
         detrended = close_prices - sma
         detrended = detrended.dropna()
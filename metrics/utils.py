@@ -10,6 +10,17 @@ from scipy.signal import argrelextrema
 log = logging.getLogger(__name__)
 
 
+def as_float64(values):
+    """
+    Upcast a Series/array to float64 before numerically sensitive steps
+    (log-returns, regressions). OHLCV may be stored as float32
+    (config.OHLCV_PRECISION); float64 input is returned unchanged.
+    """
+    if values is None or getattr(values, 'dtype', None) == np.float64:
+        return values
+    return values.astype(np.float64)
+
+
 def get_movement_efficiency(close_prices, window=100):
     """
     Calculate movement efficiency ratio.
@@ -69,6 +80,7 @@ def get_swing_r_squared(ohlc_df, window=5):
     Calculate R² for swing quality.
     """
     try:
+        ohlc_df = ohlc_df[['high', 'low']].astype(np.float64)
         highs_idx = argrelextrema(ohlc_df['high'].values, np.greater, order=window)[0]
         lows_idx = argrelextrema(ohlc_df['low'].values, np.less, order=window)[0]
         
@@ -135,6 +147,7 @@ def calculate_skewness_kurtosis(close_prices, window=50):
         if len(close_prices) < window + 1:
             return {'skewness': np.nan, 'kurtosis': np.nan}
         
+        close_prices = as_float64(close_prices)
         log_returns = np.log(close_prices / close_prices.shift(1)).dropna()
         
         if len(log_returns) < window:
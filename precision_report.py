@@ -0,0 +1,72 @@
+# precision_report.py
+"""
+Отчет о дрейфе метрик float32 vs float64 на реальных данных.
+
+Загружает BTC (1d) и N монет с первой биржи из config.EXCHANGES_TO_LOAD,
+считает метрики в обоих режимах и печатает сводку по каждой метрике.
+
+Запуск: python precision_report.py [N_COINS]
+"""
+
+import sys
+import asyncio
+import logging
+
+import config
+from services import data_fetcher
+from services.exchange_api import fetch_markets
+from services.exchange_utils import initialize_exchange
+from metrics.precision import (
+    calculate_precision_drift,
+    summarize_precision_drift,
+    log_precision_drift_summary
+)
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)-8s | %(message)s')
+log = logging.getLogger(__name__)
+
+DEFAULT_COINS = 10
+
+
+async def main(n_coins):
+    log_prefix = "[PrecisionReport]"
+    exchange_id = config.EXCHANGES_TO_LOAD[0]
+
+    # Загружаем "эталон" в float64, float32-копии создаются в calculate_precision_drift
+    config.OHLCV_PRECISION = 'float64'
+
+    exchange = await initialize_exchange(exchange_id, log_prefix)
+    if not exchange:
+        return
+
+    try:
+        btc_map = await data_fetcher.fetch_all_ohlcv_data(
+            exchange, config.BTC_SYMBOL, {'1d': config.TIMEFRAMES_TO_LOAD['1d']}, log_prefix
+        )
+        btc_1d = btc_map.get('1d')
+        if btc_1d is None:
+            log.error(f"{log_prefix} ❌ Не удалось загрузить BTC (1d).")
+            return
+
+        markets = await fetch_markets(exchange, config.QUOTE_CURRENCIES, log_prefix)
+        symbols = [s for s in markets if s != config.BTC_SYMBOL][:n_coins]
+
+        reports = []
+        for symbol in symbols:
+            ohlcv_map = await data_fetcher.fetch_all_ohlcv_data(
+                exchange, symbol, config.TIMEFRAMES_TO_LOAD, f"{log_prefix} [{symbol}]"
+            )
+            if not ohlcv_map:
+                continue
+            reports.append(calculate_precision_drift(ohlcv_map, btc_1d))
+
+        log.info(f"{log_prefix} Сравнено монет: {len(reports)}")
+        log_precision_drift_summary(summarize_precision_drift(reports), log_prefix)
+
+    finally:
+        await exchange.close()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COINS
+    asyncio.run(main(n))
@@ -0,0 +1,102 @@
+# services/blacklist_cache.py
+
+"""
+Кэш черного списка в памяти процесса.
+
+Горячие эндпоинты (/coins/filtered, /coins/filtered/csv,
+/coins/formatted-symbols) фильтруют монеты по кэшированному frozenset
+вместо чтения коллекции 'blacklist' на каждый запрос.
+
+Кэш обновляется:
+- по TTL (config.BLACKLIST_CACHE_TTL_SECONDS);
+- по change stream коллекции 'blacklist' (если MongoDB его поддерживает);
+- явной инвалидацией (эндпоинты изменения черного списка).
+
+'version' увеличивается при каждом ИЗМЕНЕНИИ содержимого: производные
+кэши (например, отфильтрованные списки монет) могут сверяться с ней.
+"""
+
+import logging
+import time
+import asyncio
+from typing import FrozenSet
+
+import config
+from . import mongo_service
+
+log = logging.getLogger(__name__)
+
+# --- Состояние кэша ---
+_blacklist: FrozenSet[str] = frozenset()
+_version: int = 0
+_loaded_at: float = 0.0
+_cache_lock = asyncio.Lock()
+
+
+def get_blacklist_version() -> int:
+    """Версия содержимого черного списка (растет при изменениях)."""
+    return _version
+
+
+def invalidate_blacklist(log_prefix: str = "[BlacklistCache]") -> None:
+    """Помечает кэш устаревшим: следующий запрос перечитает MongoDB."""
+    global _loaded_at
+    _loaded_at = 0.0
+    log.info(f"{log_prefix} 🔄 Кэш черного списка инвалидирован.")
+
+
+async def get_blacklist(
+    force_reload: bool = False,
+    log_prefix: str = "[BlacklistCache]"
+) -> FrozenSet[str]:
+    """
+    Черный список (базовые символы) из кэша; при истечении TTL,
+    инвалидации или force_reload — перечитывается из MongoDB.
+    """
+    global _blacklist, _version, _loaded_at
+
+    if not force_reload and _loaded_at and time.monotonic() - _loaded_at < config.BLACKLIST_CACHE_TTL_SECONDS:
+        return _blacklist
+
+    async with _cache_lock:
+        # Повторная проверка: кэш мог обновиться, пока мы ждали lock
+        if not force_reload and _loaded_at and time.monotonic() - _loaded_at < config.BLACKLIST_CACHE_TTL_SECONDS:
+            return _blacklist
+
+        try:
+            fresh = frozenset(await mongo_service.fetch_blacklist_symbols(log_prefix))
+        except Exception as e:
+            # Сбой MongoDB не должен "снимать" черный список: отдаем прошлый,
+            # повторная попытка — после TTL
+            log.error(f"{log_prefix} ❌ Не удалось обновить черный список (оставлен прошлый): {e}")
+            _loaded_at = time.monotonic()
+            return _blacklist
+
+        if fresh != _blacklist:
+            _blacklist = fresh
+            _version += 1
+            log.info(f"{log_prefix} ✅ Черный список обновлен: {len(fresh)} символов (версия {_version}).")
+        _loaded_at = time.monotonic()
+
+    return _blacklist
+
+
+async def watch_blacklist_changes(log_prefix: str = "[BlacklistCache.Watch]") -> None:
+    """
+    Фоновая задача: инвалидирует кэш по change stream коллекции 'blacklist'.
+    Без поддержки change streams (standalone MongoDB) кэш живет по TTL.
+    """
+    try:
+        client = mongo_service.get_async_mongo_client(log_prefix)
+        collection = client[mongo_service.DB_NAME][mongo_service.BLACKLIST_COLLECTION]
+        async with await collection.watch() as stream:
+            log.info(f"{log_prefix} 👀 Подписка на изменения черного списка активна.")
+            async for _ in stream:
+                invalidate_blacklist(log_prefix)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.warning(
+            f"{log_prefix} ⚠️ Change stream недоступен ({e}). "
+            f"Черный список обновляется по TTL ({config.BLACKLIST_CACHE_TTL_SECONDS}с)."
+        )
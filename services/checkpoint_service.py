@@ -0,0 +1,227 @@
+# services/checkpoint_service.py
+"""
+Контрольные точки (checkpoints) запуска анализа в MongoDB.
+
+Каждый этап сохраняет свои результаты под 'run_id':
+- 'stage1': список монет (universe) и пропуски Этапа 1 (один документ);
+- 'stage2': "зрелые" монеты + свечи 1d (документ на монету);
+- 'stage3': результаты метрик (документ на монету, по мере готовности пачек).
+
+Если процесс перезапустился посреди анализа (Render free tier), новый
+триггер с 'resume' продолжает прерванный запуск: завершенные этапы
+загружаются из контрольных точек, а на Этапе 3 пропускаются готовые монеты.
+После успешного завершения контрольные точки удаляются (иначе их убирает TTL).
+"""
+
+import logging
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from pymongo import ASCENDING, ReplaceOne
+
+import config
+from .mongo_service import get_mongo_client, DB_NAME, CHECKPOINTS_COLLECTION
+from .data_fetcher import get_ohlcv_dtype
+
+log = logging.getLogger(__name__)
+
+STAGE_1 = 'stage1'
+STAGE_2 = 'stage2'
+STAGE_3 = 'stage3'
+
+_indexes_ready = False
+
+
+# ============================================================================
+# === Сериализация ===
+# ============================================================================
+
+def _df_to_doc(df: Optional[pd.DataFrame]) -> Optional[Dict[str, Any]]:
+    """DataFrame OHLCV -> компактный документ (индекс в мс + строки значений)."""
+    if df is None:
+        return None
+    return {
+        'index': [int(ts.value // 1_000_000) for ts in df.index],
+        'columns': list(df.columns),
+        'values': df.to_numpy(dtype='float64').tolist()
+    }
+
+
+def _doc_to_df(doc: Optional[Dict[str, Any]]) -> Optional[pd.DataFrame]:
+    """Обратное преобразование (тот же вид, что у data_fetcher)."""
+    if not doc:
+        return None
+    df = pd.DataFrame(doc['values'], columns=doc['columns'])
+    df.index = pd.to_datetime(doc['index'], unit='ms')
+    df.index.name = 'timestamp'
+    return df.astype(get_ohlcv_dtype())
+
+
+def _skipped_to_doc(skipped) -> Dict[str, List[str]]:
+    return {reason: sorted(symbols) for reason, symbols in skipped.items()}
+
+
+# ============================================================================
+# === Sync операции (MongoDB) ===
+# ============================================================================
+
+def _get_collection(log_prefix=""):
+    global _indexes_ready
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.Checkpoint]")
+    if client is None:
+        return None
+    collection = client[DB_NAME][CHECKPOINTS_COLLECTION]
+    if not _indexes_ready:
+        collection.create_index([('run_id', ASCENDING), ('stage', ASCENDING), ('symbol', ASCENDING)], unique=True)
+        collection.create_index('created_at', expireAfterSeconds=config.CHECKPOINT_TTL_HOURS * 60 * 60)
+        _indexes_ready = True
+    return collection
+
+
+def _save_docs_sync(run_id: str, stage: str, docs: List[Dict[str, Any]], log_prefix="") -> int:
+    """(Sync) Upsert документов этапа (ключ: run_id + stage + symbol)."""
+    collection = _get_collection(log_prefix)
+    if collection is None or not docs:
+        return 0
+    now = datetime.now(timezone.utc)
+    ops = []
+    for doc in docs:
+        doc = {**doc, 'run_id': run_id, 'stage': stage, 'created_at': now}
+        ops.append(ReplaceOne(
+            {'run_id': run_id, 'stage': stage, 'symbol': doc['symbol']}, doc, upsert=True
+        ))
+    result = collection.bulk_write(ops, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+def _load_docs_sync(run_id: str, stage: str, log_prefix="") -> List[Dict[str, Any]]:
+    collection = _get_collection(log_prefix)
+    if collection is None:
+        return []
+    return list(collection.find({'run_id': run_id, 'stage': stage}, {'_id': 0}))
+
+
+def _clear_sync(run_id: str, log_prefix="") -> int:
+    collection = _get_collection(log_prefix)
+    if collection is None:
+        return 0
+    return collection.delete_many({'run_id': run_id}).deleted_count
+
+
+def _find_interrupted_run_id_sync(log_prefix="") -> Optional[str]:
+    """
+    (Sync) Последний запуск, у которого есть контрольные точки
+    (успешные запуски их удаляют).
+    """
+    collection = _get_collection(log_prefix)
+    if collection is None:
+        return None
+    doc = collection.find_one({'stage': STAGE_1}, {'run_id': 1}, sort=[('created_at', -1)])
+    return doc['run_id'] if doc else None
+
+
+# ============================================================================
+# === Публичный API ===
+# ============================================================================
+
+class RunCheckpoint:
+    """
+    Контрольные точки ОДНОГО запуска ('run_id').
+    Ошибки записи/чтения только логируются: анализ не должен падать
+    из-за контрольных точек.
+    """
+
+    def __init__(self, run_id: str, log_prefix: str = ""):
+        self.run_id = str(run_id)
+        self.log_prefix = f"{log_prefix}[Checkpoint]"
+        self.enabled = bool(config.CHECKPOINTS_ENABLED) and bool(run_id)
+
+    async def _save(self, stage: str, docs: List[Dict[str, Any]]) -> int:
+        if not self.enabled or not docs:
+            return 0
+        try:
+            return await asyncio.to_thread(_save_docs_sync, self.run_id, stage, docs, self.log_prefix)
+        except Exception as e:
+            log.warning(f"{self.log_prefix} ⚠️ Не удалось сохранить {stage}: {e}")
+            return 0
+
+    async def _load(self, stage: str) -> List[Dict[str, Any]]:
+        if not self.enabled:
+            return []
+        try:
+            return await asyncio.to_thread(_load_docs_sync, self.run_id, stage, self.log_prefix)
+        except Exception as e:
+            log.warning(f"{self.log_prefix} ⚠️ Не удалось загрузить {stage}: {e}")
+            return []
+
+    # --- Этап 1 ---
+
+    async def save_stage1(self, all_coins_data: List[dict], skipped) -> None:
+        saved = await self._save(STAGE_1, [{
+            'symbol': '*',
+            'coins': all_coins_data,
+            'skipped': _skipped_to_doc(skipped)
+        }])
+        if saved:
+            log.info(f"{self.log_prefix} 💾 Этап 1: сохранено {len(all_coins_data)} монет.")
+
+    async def load_stage1(self) -> Optional[Tuple[List[dict], Dict[str, List[str]]]]:
+        docs = await self._load(STAGE_1)
+        if not docs:
+            return None
+        return docs[0]['coins'], docs[0].get('skipped', {})
+
+    # --- Этап 2 ---
+
+    async def save_stage2(self, mature_coins_map: Dict[str, tuple], skipped) -> None:
+        docs = [
+            {'symbol': symbol, 'coin_data': coin_data, 'ohlcv_1d': _df_to_doc(df_1d)}
+            for symbol, (coin_data, df_1d) in mature_coins_map.items()
+        ]
+        # Маркер завершения этапа (в т.ч. если зрелых монет 0)
+        docs.append({'symbol': '*', 'skipped': _skipped_to_doc(skipped)})
+        saved = await self._save(STAGE_2, docs)
+        if saved:
+            log.info(f"{self.log_prefix} 💾 Этап 2: сохранено {len(mature_coins_map)} 'зрелых' монет.")
+
+    async def load_stage2(self) -> Optional[Tuple[Dict[str, tuple], Dict[str, List[str]]]]:
+        docs = await self._load(STAGE_2)
+        marker = next((d for d in docs if d['symbol'] == '*'), None)
+        if marker is None:
+            return None
+        mature_coins_map = {
+            d['symbol']: (d['coin_data'], _doc_to_df(d.get('ohlcv_1d')))
+            for d in docs if d['symbol'] != '*'
+        }
+        return mature_coins_map, marker.get('skipped', {})
+
+    # --- Этап 3 ---
+
+    async def save_stage3_results(self, results: List[dict]) -> None:
+        docs = [{'symbol': r['symbol'], 'result': r} for r in results]
+        await self._save(STAGE_3, docs)
+
+    async def load_stage3_results(self) -> List[dict]:
+        return [d['result'] for d in await self._load(STAGE_3)]
+
+    # --- Очистка ---
+
+    async def clear(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            deleted = await asyncio.to_thread(_clear_sync, self.run_id, self.log_prefix)
+            log.info(f"{self.log_prefix} 🧹 Контрольные точки удалены ({deleted}).")
+        except Exception as e:
+            log.warning(f"{self.log_prefix} ⚠️ Не удалось удалить контрольные точки: {e}")
+
+
+async def find_interrupted_run_id(log_prefix: str = "") -> Optional[str]:
+    """(Async) run_id последнего прерванного запуска с контрольными точками."""
+    try:
+        return await asyncio.to_thread(_find_interrupted_run_id_sync, log_prefix)
+    except Exception as e:
+        log.warning(f"{log_prefix} [Checkpoint] ⚠️ Не удалось найти прерванный запуск: {e}")
+        return None
@@ -0,0 +1,207 @@
+# services/columnar_index.py
+
+"""
+Колоночный индекс снимка монет (строится один раз на версию кэша).
+
+Числовые колонки DATABASE_SCHEMA хранятся как NumPy-массивы float64
+(нет значения -> NaN), поэтому фильтры выполняются векторно, а не
+циклом Python по словарям. Для сортировки по колонке один раз строится
+перестановка (argsort) — дальше страница = срез перестановки по маске.
+"""
+
+import base64
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+log = logging.getLogger(__name__)
+
+NUMERIC_SQL_TYPES = ("DOUBLE", "REAL", "FLOAT", "NUMERIC", "SMALLINT", "INT", "BIGINT")
+
+
+def is_numeric_column(column: str) -> bool:
+    sql_type = config.DATABASE_SCHEMA.get(column, "")
+    return sql_type.upper().startswith(NUMERIC_SQL_TYPES)
+
+
+def _cell_to_float(value: Any) -> float:
+    """Значение документа -> float колонки (не число -> NaN)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def _to_float(value: Any) -> float:
+    """Значение фильтра -> float. ValueError — не число и не числовая строка."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    raise ValueError(f"Filter value must be a number: {value!r}")
+
+
+class ColumnarIndex:
+    """
+    Снимок монет в колоночном виде + кэш отсортированных перестановок.
+    """
+
+    def __init__(self, coins: List[Dict[str, Any]]):
+        self.coins = coins
+        self.size = len(coins)
+        self.full_symbols = [coin.get('full_symbol') for coin in coins]
+        self._rows = {symbol: i for i, symbol in enumerate(self.full_symbols) if symbol}
+        self.columns: Dict[str, np.ndarray] = {
+            column: np.fromiter((_cell_to_float(coin.get(column)) for coin in coins), dtype=np.float64, count=self.size)
+            for column in config.DATABASE_SCHEMA
+            if is_numeric_column(column)
+        }
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+
+    # --- Колонки ---
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            raise ValueError(f"Unknown numeric column: '{name}'")
+        return self.columns[name]
+
+    def row_of(self, full_symbol: str) -> Optional[int]:
+        return self._rows.get(full_symbol)
+
+    def sorted_order(self, column: str, descending: bool = False) -> np.ndarray:
+        """
+        Перестановка строк по колонке (NaN — в конце, при равенстве —
+        порядок снимка). Считается один раз на колонку и направление.
+        """
+        key = (column, descending)
+        if key not in self._orders:
+            values = self.column(column)
+            self._orders[key] = np.argsort(-values if descending else values, kind="stable")
+        return self._orders[key]
+
+    # --- Запрос ---
+
+    def mask(self, filters: Optional[Dict[str, Any]]) -> np.ndarray:
+        """
+        Маска строк по фильтрам (та же форма, что в
+        database.utils.build_query_with_filters):
+        {"min": a, "max": b} — диапазон, [x, y] — IN, x — равенство.
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            values = self.column(column)
+            if isinstance(value, dict):
+                unknown = set(value) - {"min", "max"}
+                if unknown:
+                    raise ValueError(f"Unknown range keys for '{column}': {sorted(unknown)}")
+                if value.get("min") is not None:
+                    mask &= values >= _to_float(value["min"])
+                if value.get("max") is not None:
+                    mask &= values <= _to_float(value["max"])
+            elif isinstance(value, list):
+                mask &= np.isin(values, np.array([_to_float(item) for item in value], dtype=np.float64))
+            else:
+                mask &= values == _to_float(value)
+        return mask
+
+    def ordered_rows(self, mask: np.ndarray, sort: Sequence[Tuple[str, bool]]) -> np.ndarray:
+        """Номера строк, прошедших маску, в порядке сортировки."""
+        if not sort:
+            return np.flatnonzero(mask)
+        if len(sort) == 1:
+            order = self.sorted_order(*sort[0])
+            return order[mask[order]]
+        # Несколько ключей: lexsort только по отобранным строкам
+        rows = np.flatnonzero(mask)
+        keys = [
+            -self.column(column)[rows] if descending else self.column(column)[rows]
+            for column, descending in reversed(sort)
+        ]
+        return rows[np.lexsort(keys)]
+
+
+# ============================================================================
+# === Курсоры пагинации ===
+# ============================================================================
+
+def encode_cursor(offset: int, last_full_symbol: Optional[str]) -> str:
+    payload = json.dumps({"o": offset, "s": last_full_symbol}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, Optional[str]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset, last_full_symbol = int(payload["o"]), payload.get("s")
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if offset < 0 or not (last_full_symbol is None or isinstance(last_full_symbol, str)):
+        raise ValueError("Invalid cursor")
+    return offset, last_full_symbol
+
+
+def parse_sort(sort: Optional[Sequence[str]]) -> List[Tuple[str, bool]]:
+    """['-hurst_4h', 'category'] -> [('hurst_4h', True), ('category', False)]."""
+    return [(key[1:], True) if key.startswith("-") else (key.lstrip("+"), False) for key in (sort or []) if key]
+
+
+def run_query(
+    index: ColumnarIndex,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: Optional[Sequence[str]] = None,
+    fields: Optional[Sequence[str]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    base_mask: Optional[np.ndarray] = None
+) -> Dict[str, Any]:
+    """
+    Страница результата: {'total', 'count', 'next_cursor', 'data'}.
+    base_mask — дополнительное условие (например, маска скринера).
+    Курсор хранит смещение и full_symbol последней строки: если снимок
+    обновился между страницами, выдача продолжается после этой монеты.
+    """
+    unknown = [field for field in (fields or []) if field not in config.DATABASE_SCHEMA]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if not 1 <= limit <= config.QUERY_MAX_LIMIT:
+        raise ValueError(f"limit must be in 1..{config.QUERY_MAX_LIMIT}")
+
+    sort_keys = parse_sort(sort)
+    mask = index.mask(filters)
+    if base_mask is not None:
+        mask &= base_mask
+    rows = index.ordered_rows(mask, sort_keys)
+
+    start = 0
+    if cursor:
+        offset, last_symbol = decode_cursor(cursor)
+        start = offset
+        if last_symbol is not None:
+            last_row = index.row_of(last_symbol)
+            positions = np.flatnonzero(rows == last_row) if last_row is not None else []
+            if len(positions):
+                start = int(positions[0]) + 1
+
+    page = rows[start:start + limit]
+    end = start + len(page)
+    next_cursor = encode_cursor(end, index.full_symbols[page[-1]]) if len(page) and end < len(rows) else None
+
+    if fields:
+        data = [{field: index.coins[row].get(field) for field in fields} for row in page]
+    else:
+        data = [index.coins[row] for row in page]
+
+    return {
+        "total": int(len(rows)),
+        "count": len(data),
+        "next_cursor": next_cursor,
+        "data": data
+    }
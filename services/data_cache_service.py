@@ -1,9 +1,22 @@
 # services/data_cache_service.py
 
+import io
+import csv
+import gzip
+import hashlib
 import logging
 import time
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import brotli
+import orjson
+
+import config
+from .blacklist_cache import get_blacklist, get_blacklist_version
+from .columnar_index import ColumnarIndex
+from .screener import build_saved_screens
+from .similarity import SimilarityIndex
 
 # (ИЗМЕНЕНИЕ) Импортируем функцию из mongo_service, а не database
 from .mongo_service import get_all_coins_from_mongo_async
@@ -16,6 +29,12 @@ log = logging.getLogger(__name__)
 _cache: List[Dict[str, Any]] = []
 _last_load_time: float = 0.0
 _cache_lock = asyncio.Lock()
+# Версия кэша: растет при каждой успешной загрузке из MongoDB
+_cache_version: int = 0
+
+# --- Производные представления (строятся один раз на версию кэша) ---
+_views: Optional[Dict[str, Any]] = None
+_views_lock = asyncio.Lock()
 
 # (TTL) Время жизни кэша в секундах (15 минут)
 DEFAULT_CACHE_TTL = 15 * 60
@@ -33,7 +52,7 @@ async def get_cached_coins_data(
     2. Если да (или force_reload=True), асинхронно загружает данные из MongoDB.
     3. Возвращает данные из кэша.
     """
-    global _cache, _last_load_time
+    global _cache, _last_load_time, _cache_version
     
     now = time.time()
     is_cache_expired = (now - _last_load_time) > ttl_seconds
@@ -64,6 +83,7 @@ async def get_cached_coins_data(
                 if data:
                     _cache = data
                     _last_load_time = time.time()
+                    _cache_version += 1
                     log.info(f"{log_prefix} ✅ Кэш успешно обновлен. Загружено {len(_cache)} монет из MongoDB.")
                 elif not _cache:
                     # Если загрузка не удалась, но в кэше пусто
@@ -80,4 +100,235 @@ async def get_cached_coins_data(
         else:
             log.debug(f"{log_prefix} Данные взяты из кэша (свежий).")
 
-    return _cache
\ No newline at end of file
+    return _cache
+
+
+# ============================================================================
+# === Производные представления (фильтрованные списки) ===
+# ============================================================================
+
+def extract_base_symbol(full_symbol: str) -> str:
+    """
+    Извлекает базовый символ из полного формата (e.g., 'SOL/USDT:USDT' -> 'SOL').
+    Это обеспечивает единую логику сравнения с Черным списком.
+    """
+    if not full_symbol:
+        return ""
+    # Базовый символ - это часть до первого слэша (/)
+    ccxt_symbol = full_symbol.split(':')[0] 
+    return ccxt_symbol.split('/')[0]
+
+
+def format_tv_symbol(full_tv_symbol: str) -> str:
+    ccxt_symbol = full_tv_symbol.split(':')[0] # "BTC/USDT"
+    tv_symbol = ccxt_symbol.replace('/', '') # "BTCUSDT"
+    if tv_symbol.endswith('.P'):
+        tv_symbol = tv_symbol[:-2]
+    return tv_symbol
+
+
+def format_tv_exchange(exchange_id: str) -> str:
+    if 'binance' in exchange_id:
+        return 'BINANCE'
+    elif 'bybit' in exchange_id:
+        return 'BYBIT'
+    return exchange_id.upper()
+
+
+def _filter_coins(coins: List[Dict[str, Any]], blacklist) -> tuple:
+    """
+    Фильтрация для API:
+    1. Blacklist (Черный список)
+    2. BTC Correlation < config.FILTER_MIN_BTC_CORR (Слабая корреляция с битком)
+    Возвращает (прошедшие оба фильтра, прошедшие только blacklist, stats).
+    """
+    allowed_coins = []
+    filtered_coins = []
+    stats = {
+        "blacklist": 0,
+        "low_correlation": 0
+    }
+
+    for coin in coins:
+        # --- ПРОВЕРКА 1: Blacklist ---
+        base_symbol = extract_base_symbol(coin.get('symbol', ''))
+        if base_symbol in blacklist:
+            stats["blacklist"] += 1
+            continue
+        allowed_coins.append(coin)
+
+        # --- ПРОВЕРКА 2: BTC Correlation ---
+        # (Метрика из calculator.py: 'btc_corr_1d_w30')
+        # Если корреляции нет (None) или она ниже порога -> пропускаем
+        btc_corr = coin.get('btc_corr_1d_w30')
+        if btc_corr is None or btc_corr < config.FILTER_MIN_BTC_CORR:
+            stats["low_correlation"] += 1
+            continue
+
+        filtered_coins.append(coin)
+
+    return filtered_coins, allowed_coins, stats
+
+
+def csv_columns(coins: List[Dict[str, Any]]) -> List[str]:
+    """Колонки CSV: поля DATABASE_SCHEMA (в ее порядке), встречающиеся у монет."""
+    present = set()
+    for coin in coins:
+        present.update(coin.keys())
+    return [col for col in config.DATABASE_SCHEMA.keys() if col in present]
+
+
+def _csv_value(value: Any) -> Any:
+    # Как pandas.to_csv: None/NaN -> пустая ячейка
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return value
+
+
+def iter_csv_chunks(
+    coins: List[Dict[str, Any]],
+    columns: List[str],
+    chunk_rows: int = None
+):
+    """
+    Генератор CSV по строкам: заголовок + порции по chunk_rows монет (bytes).
+    В памяти одновременно только одна порция, а не весь файл.
+    """
+    chunk_rows = chunk_rows or config.CSV_STREAM_CHUNK_ROWS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+
+    for start in range(0, len(coins), chunk_rows):
+        for coin in coins[start:start + chunk_rows]:
+            writer.writerow([_csv_value(coin.get(col)) for col in columns])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Пустой список -> только заголовок
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def dumps_json(content: Any) -> bytes:
+    """Сериализация ответа в JSON (orjson)."""
+    return orjson.dumps(content, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _compress_body(body: bytes, etag: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Сжатые варианты тела: {'br'|'gzip': {'body', 'etag'}}.
+    У каждого варианта свой ETag (другое представление того же содержимого).
+    """
+    if len(body) < config.COMPRESSION_MIN_BYTES:
+        return {}
+    encoded = {
+        # mtime=0 -> одинаковые байты (и ETag) во всех воркерах
+        "gzip": gzip.compress(body, compresslevel=config.COMPRESSION_GZIP_LEVEL, mtime=0),
+        "br": brotli.compress(body, quality=config.COMPRESSION_BROTLI_QUALITY),
+    }
+    return {
+        encoding: {"body": data, "etag": f'{etag[:-1]}-{encoding}"'}
+        for encoding, data in encoded.items()
+    }
+
+
+def prepare_body(body: bytes, media_type: str, compress: bool = True) -> Dict[str, Any]:
+    """
+    Готовое тело ответа + сильный ETag (хэш содержимого: одинаков во всех
+    воркерах) + сжатые варианты ('encoded'; compress=False для уже
+    сжатых форматов).
+    """
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    return {
+        "body": body,
+        "media_type": media_type,
+        "etag": etag,
+        "encoded": _compress_body(body, etag) if compress else {}
+    }
+
+
+def build_filtered_views(coins: List[Dict[str, Any]], blacklist, log_prefix: str = "[DataCache.Views]") -> Dict[str, Any]:
+    """
+    Строит все представления для API за один проход:
+    - 'coins': отфильтрованные монеты;
+    - 'formatted': символы в формате TradingView;
+    - 'csv_columns': колонки CSV (для потоковой выгрузки);
+    - 'index': колоночный индекс всех монет вне черного списка
+      (запросы /coins/query: фильтр корреляции задает клиент);
+    - 'screens': маски именованных скринов (config.SAVED_SCREENS) по 'index';
+    - 'similarity': KD-дерево признаков структуры по 'index' (/coins/similar);
+    - 'bodies': готовые тела ответов ('filtered', 'formatted', 'csv')
+      с ETag; 'csv' = None, если после фильтрации пусто или
+      config.CSV_PRERENDER_ENABLED выключен.
+    """
+    filtered_coins, allowed_coins, stats = _filter_coins(coins, blacklist)
+
+    formatted = [
+        {
+            "symbol": format_tv_symbol(coin['symbol']),
+            "exchanges": [format_tv_exchange(ex) for ex in coin.get('exchanges', [])],
+            "category": coin.get("category")
+        }
+        for coin in filtered_coins if coin.get('symbol')
+    ]
+
+    log.info(f"{log_prefix} Filtering result: {len(coins)} -> {len(filtered_coins)} coins.")
+    if stats["blacklist"] > 0:
+        log.warning(f"{log_prefix} 🚫 Отсеяно по Черному списку: {stats['blacklist']}")
+    if stats["low_correlation"] > 0:
+        log.warning(f"{log_prefix} 📉 Отсеяно по Correlation (<{config.FILTER_MIN_BTC_CORR}): {stats['low_correlation']}")
+
+    columns = csv_columns(filtered_coins)
+    csv_body = None
+    index = ColumnarIndex(allowed_coins)
+    if filtered_coins and config.CSV_PRERENDER_ENABLED:
+        csv_body = prepare_body(b"".join(iter_csv_chunks(filtered_coins, columns)), "text/csv")
+    return {
+        "total": len(coins),
+        "stats": stats,
+        "coins": filtered_coins,
+        "formatted": formatted,
+        "csv_columns": columns,
+        "index": index,
+        "screens": build_saved_screens(index, log_prefix),
+        "similarity": SimilarityIndex(index),
+        "bodies": {
+            "filtered": prepare_body(
+                dumps_json({"count": len(filtered_coins), "data": filtered_coins}), "application/json"
+            ),
+            "formatted": prepare_body(
+                dumps_json({"count": len(formatted), "symbols": formatted}), "application/json"
+            ),
+            "csv": csv_body
+        }
+    }
+
+
+async def get_filtered_views(log_prefix: str = "[DataCache.Views]") -> Optional[Dict[str, Any]]:
+    """
+    Представления для эндпоинтов чтения. Перестраиваются только при смене
+    версии кэша монет или версии черного списка; иначе запрос получает
+    готовый объект. None -> кэш пуст.
+    """
+    global _views
+
+    coins = await get_cached_coins_data(force_reload=False, log_prefix=f"{log_prefix} [Cache]")
+    blacklist = await get_blacklist(log_prefix=f"{log_prefix} [Blacklist]")
+    if not coins:
+        return None
+
+    key = (_cache_version, get_blacklist_version())
+    if _views is not None and _views["key"] == key:
+        return _views
+
+    async with _views_lock:
+        # Повторная проверка: представления мог построить другой запрос
+        if _views is None or _views["key"] != key:
+            # Построение (CSV/сериализация/сжатие) - вне event loop
+            views = await asyncio.to_thread(build_filtered_views, coins, blacklist, log_prefix)
+            views["key"] = key
+            _views = views
+            log.info(f"{log_prefix} ✅ Представления построены (кэш v{key[0]}, blacklist v{key[1]}).")
+    return _views
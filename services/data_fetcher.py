@@ -3,24 +3,51 @@
 import logging
 import asyncio
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 
 import config
 
-from .exchange_api import fetch_ohlcv, fetch_markets, fetch_tickers
-from .exchange_utils import initialize_exchange
+from .exchange_api import fetch_ohlcv, fetch_tickers
+from .market_cache import get_filtered_markets
+from .exchange_registry import get_exchange, discard_exchange
 
 log = logging.getLogger(__name__)
 
 
+# ============================================================================
+# === get_ohlcv_dtype (Режим точности) ===
+# ============================================================================
+
+_OHLCV_DTYPES = {
+    'float64': np.float64,
+    'float32': np.float32,
+}
+
+def get_ohlcv_dtype():
+    """
+    Возвращает numpy-тип для хранения OHLCV (config.OHLCV_PRECISION).
+    Неизвестное значение -> float64 (безопасный режим).
+    """
+    precision = str(getattr(config, 'OHLCV_PRECISION', 'float64')).lower()
+    dtype = _OHLCV_DTYPES.get(precision)
+    if dtype is None:
+        log.warning(f"[Precision] Неизвестный OHLCV_PRECISION='{precision}'. Используется float64.")
+        return np.float64
+    return dtype
+
+
 # ============================================================================
 # === _fetch_ohlcv_single_tf ===
 # ============================================================================
 
-async def _fetch_ohlcv_single_tf(exchange, symbol, timeframe, since, log_prefix):
+async def _fetch_ohlcv_single_tf(exchange, symbol, timeframe, since, log_prefix, run_cache=None):
     """
     Загружает и обрабатывает один таймфрейм.
+
+    Успешный ТФ сразу кладется в 'run_cache' (если передан): при отмене
+    загрузки монеты (таймаут) уже готовые ТФ не теряются.
     """
     data = await fetch_ohlcv(exchange, symbol, timeframe, since, config.CANDLE_LIMIT_DEFAULT, f"{log_prefix} {timeframe}")
     
@@ -29,8 +56,10 @@ async def _fetch_ohlcv_single_tf(exchange, symbol, timeframe, since, log_prefix)
             df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
             df.set_index('timestamp', inplace=True)
-            df = df.astype(float)
+            df = df.astype(get_ohlcv_dtype())
             
+            if run_cache is not None:
+                run_cache.put(exchange.id, symbol, timeframe, df)
             return timeframe, df
         except Exception as e:
             log.error(f"{log_prefix} {symbol} {timeframe}: Ошибка при конвертации в DataFrame: {e}")
@@ -40,30 +69,80 @@ async def _fetch_ohlcv_single_tf(exchange, symbol, timeframe, since, log_prefix)
         return timeframe, None
 
 
+# ============================================================================
+# === OhlcvRunCache (Кэш ТФ в рамках запуска) ===
+# ============================================================================
+
+class OhlcvRunCache:
+    """
+    Кэш успешно загруженных ТФ в рамках ОДНОГО запуска анализа.
+
+    Ключ: (exchange_id, symbol, timeframe). Повторная попытка по монете
+    загружает только недостающие ТФ, а не все заново.
+    """
+
+    def __init__(self):
+        self._frames = {}
+        self.hits = 0
+        self.stored = 0
+
+    def get(self, exchange_id, symbol, timeframe):
+        df = self._frames.get((exchange_id, symbol, timeframe))
+        if df is not None:
+            self.hits += 1
+        return df
+
+    def put(self, exchange_id, symbol, timeframe, df):
+        self._frames[(exchange_id, symbol, timeframe)] = df
+        self.stored += 1
+
+    def drop_symbol(self, exchange_id, symbol):
+        """Освобождает память монеты (анализ монеты завершен)."""
+        for key in [k for k in self._frames if k[0] == exchange_id and k[1] == symbol]:
+            del self._frames[key]
+
+    def __len__(self):
+        return len(self._frames)
+
+
 # ============================================================================
 # === fetch_all_ohlcv_data ===
 # ============================================================================
 
-async def fetch_all_ohlcv_data(exchange, symbol, tf_config, log_prefix=""):
+async def fetch_all_ohlcv_data(exchange, symbol, tf_config, log_prefix="", run_cache=None):
     """
     Загружает OHLCV данные для всех таймфреймов ПАРАЛЛЕЛЬНО.
+
+    Если передан 'run_cache' (OhlcvRunCache), ТФ из кэша не загружаются
+    повторно, а успешно загруженные ТФ сохраняются в него по мере готовности,
+    даже при частичной неудаче или отмене (для следующей попытки).
     """
     ohlcv_data = {}
     
+    if run_cache is not None:
+        for tf in tf_config:
+            df = run_cache.get(exchange.id, symbol, tf)
+            if df is not None:
+                ohlcv_data[tf] = df
+    
+    tf_to_fetch = {tf: days for tf, days in tf_config.items() if tf not in ohlcv_data}
+    if ohlcv_data:
+        log.debug(f"{log_prefix} {symbol}: {len(ohlcv_data)} ТФ из кэша запуска, загружаем {list(tf_to_fetch)}.")
+    
     since_timestamps = {}
-    for tf, days in tf_config.items():
+    for tf, days in tf_to_fetch.items():
         since_timestamps[tf] = exchange.parse8601((datetime.utcnow() - timedelta(days=days)).isoformat())
 
     tasks = []
-    for timeframe, days_to_load in tf_config.items():
+    for timeframe, days_to_load in tf_to_fetch.items():
         since = since_timestamps[timeframe]
         tasks.append(
-            _fetch_ohlcv_single_tf(exchange, symbol, timeframe, since, log_prefix)
+            _fetch_ohlcv_single_tf(exchange, symbol, timeframe, since, log_prefix, run_cache)
         )
         
     results = await asyncio.gather(*tasks, return_exceptions=True)
     
-    loaded_tf_count = 0
+    loaded_tf_count = len(ohlcv_data)
     for result in results:
         if isinstance(result, Exception):
             log.error(f"{log_prefix} {symbol}: Необработанная ошибка при загрузке ТФ: {result}", exc_info=True)
@@ -142,38 +221,32 @@ def _extract_base_symbol(ccxt_symbol: str) -> str:
 
 
 # ============================================================================
-# === fetch_all_coins_data (Оптимизировано для 300 монет) ===
+# === init_exchanges_and_markets ===
 # ============================================================================
 
-async def fetch_all_coins_data(exchange_ids, quote_currencies, blacklist=None, log_prefix=""):
+async def init_exchanges_and_markets(exchange_ids, quote_currencies, log_prefix=""):
     """
-    Загружает данные о всех монетах с бирж (Этап 1).
-    Оптимизировано для ~300 монет с разблокировкой каждые 100 итераций.
+    Берет биржи из реестра и их рынки из кэша (Этап 1, а также
+    возобновление запуска из контрольной точки).
+    Возвращает (active_exchanges, markets_map) только для рабочих бирж.
     """
-    if blacklist is None:
-        blacklist = set()
-    
-    log.info(f"{log_prefix} (Этап 1) Запуск с бирж: {exchange_ids}, Валюты: {quote_currencies}")
-    
-    all_coins_data = {}
     active_exchanges = {}
     markets_map = {}
-    skipped_coins = defaultdict(set)
-    
-    # --- Инициализация и загрузка рынков ---
     
     async def init_exchange_and_markets(ex_id):
         log_prefix_ex = f"{log_prefix} [{ex_id}]"
         try:
-            exchange = await initialize_exchange(ex_id, log_prefix_ex)
+            # Экземпляр берется из реестра (теплые соединения и рынки)
+            exchange = await get_exchange(ex_id, log_prefix_ex)
             if not exchange:
                 return ex_id, None, None
                 
-            markets = await fetch_markets(exchange, quote_currencies, log_prefix_ex)
+            # Рынки из кэша (память / снимок на диске / биржа при истечении TTL)
+            markets = await get_filtered_markets(exchange, quote_currencies, log_prefix_ex)
             if not markets:
                 log.error(f"{log_prefix_ex} ❌ Не удалось загрузить рынки. Пропуск биржи.") 
-                if hasattr(exchange, 'close'):
-                    await exchange.close()
+                # Выбрасываем экземпляр из реестра: следующий запуск создаст новый
+                await discard_exchange(ex_id, log_prefix_ex)
                 return ex_id, None, None
                 
             return ex_id, exchange, markets
@@ -190,8 +263,30 @@ async def fetch_all_coins_data(exchange_ids, quote_currencies, blacklist=None, l
         if exchange and markets:
             active_exchanges[ex_id] = exchange
             markets_map[ex_id] = markets
-        else:
-            pass 
+    
+    return active_exchanges, markets_map
+
+
+# ============================================================================
+# === fetch_all_coins_data (Оптимизировано для 300 монет) ===
+# ============================================================================
+
+async def fetch_all_coins_data(exchange_ids, quote_currencies, blacklist=None, log_prefix=""):
+    """
+    Загружает данные о всех монетах с бирж (Этап 1).
+    Оптимизировано для ~300 монет с разблокировкой каждые 100 итераций.
+    """
+    if blacklist is None:
+        blacklist = set()
+    
+    log.info(f"{log_prefix} (Этап 1) Запуск с бирж: {exchange_ids}, Валюты: {quote_currencies}")
+    
+    all_coins_data = {}
+    skipped_coins = defaultdict(set)
+    
+    # --- Инициализация и загрузка рынков ---
+    
+    active_exchanges, markets_map = await init_exchanges_and_markets(exchange_ids, quote_currencies, log_prefix)
 
     if not active_exchanges:
         log.error(f"{log_prefix} (Этап 1) ❌ Не удалось инициализировать НИ ОДНОЙ биржи. Остановка.")
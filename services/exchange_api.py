@@ -14,6 +14,27 @@ log = logging.getLogger(__name__)
 # 1. fetch_markets
 # ============================================================================
 
+def filter_markets(markets: Dict[str, Any], quote_currencies: List[str]) -> Dict[str, Any]:
+    """
+    Оставляет только активные фьючерсные (future/swap) рынки с нужной валютой котировки.
+    """
+    filtered_markets = {}
+    for symbol, market in markets.items():
+        if market.get('active') and market.get('type') in ['future', 'swap'] and market.get('quote') in quote_currencies:
+            filtered_markets[symbol] = market
+    return filtered_markets
+
+
+@retry_on_network_error()
+async def load_markets_raw(exchange: ccxt.Exchange, reload: bool, log_prefix: str) -> Dict[str, Any]:
+    """
+    Загружает ВСЕ рынки биржи (без фильтрации).
+    reload=True заставляет ccxt перезапросить рынки, даже если они уже загружены.
+    """
+    log.info(f"{log_prefix} 🔄 Загрузка рынков для {exchange.id} (reload={reload})...")
+    return await exchange.load_markets(reload=reload)
+
+
 @retry_on_network_error()
 async def fetch_markets(exchange: ccxt.Exchange, quote_currencies: List[str], log_prefix: str) -> Dict[str, Any]:
     """
@@ -23,10 +44,7 @@ async def fetch_markets(exchange: ccxt.Exchange, quote_currencies: List[str], lo
         log.info(f"{log_prefix} 🔄 Загрузка рынков для {exchange.id} (Quote: {', '.join(quote_currencies)})...")
         markets = await exchange.load_markets()
         
-        filtered_markets = {}
-        for symbol, market in markets.items():
-            if market['active'] and market['type'] in ['future', 'swap'] and market['quote'] in quote_currencies:
-                filtered_markets[symbol] = market
+        filtered_markets = filter_markets(markets, quote_currencies)
         
         log.info(f"{log_prefix} ✅ Найдено {len(filtered_markets)} активных фьючерсных рынков.")
         return filtered_markets
@@ -0,0 +1,247 @@
+# services/exchange_controller.py
+"""
+Контроллер нагрузки на биржу (один на exchange_id на процесс).
+
+1. Адаптивная конкурентность (AIMD): лимит одновременных запросов растет
+   аддитивно (+1 за "окно" успешных ответов) и падает мультипликативно
+   при ошибках сети / rate limit / медленных ответах.
+2. Circuit breaker: если в скользящем окне доля ошибок выше порога,
+   "цепь" размыкается на config.CIRCUIT_COOLDOWN_SECONDS — новые запросы
+   ЖДУТ, а не "долбят" деградировавшую биржу. Затем один пробный запрос
+   (half-open): успех замыкает цепь, ошибка снова размыкает.
+
+Контроллер используется декоратором 'retry_on_network_error' (каждый
+запрос) и планировщиками Этапов 2 и 3 (размер пачки, выбор биржи).
+"""
+
+import logging
+import asyncio
+import time
+from collections import defaultdict, deque
+from typing import Dict, Any, Optional
+
+import config
+
+log = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class ExchangeController:
+    """
+    AIMD-лимит конкурентности + circuit breaker для одной биржи.
+    Все методы, кроме 'acquire' / 'wait_until_available', синхронные
+    (один event loop -> блокировки не нужны).
+    """
+
+    def __init__(self, exchange_id: str, max_concurrency: Optional[int] = None):
+        self.exchange_id = exchange_id
+        self.max_concurrency = max(1, int(max_concurrency or config.MAX_CONCURRENT_PER_EXCHANGE))
+        self.min_concurrency = 1
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+
+        self.state = STATE_CLOSED
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=config.CIRCUIT_WINDOW_SIZE)
+        self._last_decrease = 0.0
+        self._changed = asyncio.Event()
+
+        self.latency_ewma: Optional[float] = None
+        self.stats = defaultdict(int)
+
+    # ------------------------------------------------------------------
+    # Состояние
+    # ------------------------------------------------------------------
+
+    @property
+    def concurrency(self) -> int:
+        """Текущий лимит одновременных запросов (целое)."""
+        return max(self.min_concurrency, int(self.limit))
+
+    def _cooldown_left(self, now: float) -> float:
+        return max(0.0, self.opened_at + config.CIRCUIT_COOLDOWN_SECONDS - now)
+
+    def _refresh_state(self, now: float):
+        if self.state == STATE_OPEN and self._cooldown_left(now) <= 0:
+            self.state = STATE_HALF_OPEN
+            log.info(f"[Controller] 🟡 {self.exchange_id}: пробный запрос (half-open).")
+
+    def is_open(self) -> bool:
+        """True, если цепь разомкнута (биржу лучше не трогать)."""
+        self._refresh_state(time.monotonic())
+        return self.state == STATE_OPEN
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # ------------------------------------------------------------------
+    # Допуск запросов
+    # ------------------------------------------------------------------
+
+    def _admission_wait(self, now: float) -> Optional[float]:
+        """
+        0.0 -> запрос можно запускать; >0 -> ждать не дольше (сек);
+        None -> ждать освобождения слота.
+        """
+        self._refresh_state(now)
+        if self.state == STATE_OPEN:
+            return self._cooldown_left(now)
+        if self.state == STATE_HALF_OPEN:
+            return 0.0 if self.in_flight == 0 else None
+        return 0.0 if self.in_flight < self.concurrency else None
+
+    async def acquire(self):
+        """Ждет свободный слот (и замкнутую / пробную цепь)."""
+        waited = False
+        while True:
+            wait = self._admission_wait(time.monotonic())
+            if wait == 0.0:
+                self.in_flight += 1
+                if waited:
+                    self.stats['waited'] += 1
+                return
+            waited = True
+            event = self._changed
+            try:
+                await asyncio.wait_for(event.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, success: Optional[bool], latency: Optional[float] = None):
+        """
+        Освобождает слот и учитывает исход запроса.
+        success=None -> нейтральный исход (отмена, ошибка запроса, не биржи).
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if success is True:
+            self.record_success(latency)
+        elif success is False:
+            self.record_failure()
+        self._notify()
+
+    async def wait_until_available(self, log_prefix: str = "") -> float:
+        """
+        Для планировщиков: если цепь разомкнута, ждет окончания паузы.
+        Возвращает время ожидания (сек).
+        """
+        if not self.is_open():
+            return 0.0
+        wait = self._cooldown_left(time.monotonic())
+        log.warning(f"{log_prefix} [Controller] ⏸️ {self.exchange_id}: цепь разомкнута, пауза {wait:.1f}с...")
+        await asyncio.sleep(wait)
+        return wait
+
+    def scale_batch_size(self, base_batch_size: int) -> int:
+        """Размер пачки монет пропорционально текущему лимиту конкурентности."""
+        ratio = self.concurrency / self.max_concurrency
+        return max(1, int(round(base_batch_size * ratio)))
+
+    # ------------------------------------------------------------------
+    # Учет исходов (AIMD + circuit breaker)
+    # ------------------------------------------------------------------
+
+    def record_success(self, latency: Optional[float] = None):
+        self.stats['success'] += 1
+        self._outcomes.append(True)
+
+        if latency is not None:
+            alpha = 0.2
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                alpha * latency + (1 - alpha) * self.latency_ewma
+            )
+
+        if self.state == STATE_HALF_OPEN:
+            self.state = STATE_CLOSED
+            self._outcomes.clear()
+            log.info(f"[Controller] 🟢 {self.exchange_id}: цепь замкнута (биржа восстановилась).")
+
+        if latency is not None and latency > config.EXCHANGE_SLOW_CALL_SECONDS:
+            # Медленный ответ = признак перегрузки
+            self.stats['slow'] += 1
+            self._decrease(time.monotonic())
+        else:
+            # Аддитивный рост: ~+1 за "окно" из 'limit' успешных ответов
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+    def record_failure(self):
+        self.stats['failure'] += 1
+        self._outcomes.append(False)
+        now = time.monotonic()
+        self._decrease(now)
+
+        if self.state == STATE_HALF_OPEN:
+            self._open(now)
+            return
+
+        failures = self._outcomes.count(False)
+        if (
+            self.state == STATE_CLOSED
+            and len(self._outcomes) >= config.CIRCUIT_MIN_CALLS
+            and failures / len(self._outcomes) >= config.CIRCUIT_FAILURE_RATE
+        ):
+            self._open(now)
+
+    def _decrease(self, now: float):
+        # Не чаще раза в интервал: пачка одновременных ошибок = один сигнал
+        if now - self._last_decrease < config.AIMD_DECREASE_INTERVAL_SECONDS:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit * config.AIMD_DECREASE_FACTOR)
+        self.stats['decreases'] += 1
+
+    def _open(self, now: float):
+        self.state = STATE_OPEN
+        self.opened_at = now
+        self.stats['opened'] += 1
+        log.warning(
+            f"[Controller] 🔴 {self.exchange_id}: цепь разомкнута на {config.CIRCUIT_COOLDOWN_SECONDS}с "
+            f"(ошибок в окне: {self._outcomes.count(False)}/{len(self._outcomes)}). Лимит: {self.concurrency}."
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'concurrency': self.concurrency,
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self.in_flight,
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            **dict(self.stats)
+        }
+
+
+# --- Контроллеры (singleton на процесс) ---
+_controllers: Dict[str, ExchangeController] = {}
+
+
+def get_controller(exchange_id: str) -> ExchangeController:
+    """Возвращает (создает при первом обращении) контроллер биржи."""
+    controller = _controllers.get(exchange_id)
+    if controller is None:
+        controller = ExchangeController(exchange_id)
+        _controllers[exchange_id] = controller
+    return controller
+
+
+def reset_controllers():
+    """Сбрасывает контроллеры (начало нового запуска: прошлые лимиты устарели)."""
+    _controllers.clear()
+
+
+def get_controller_stats() -> Dict[str, Dict[str, Any]]:
+    return {ex_id: c.get_stats() for ex_id, c in _controllers.items()}
+
+
+def log_controller_summary(log_prefix: str = ""):
+    """Логирует итоговую статистику контроллеров."""
+    for ex_id, s in get_controller_stats().items():
+        log.info(
+            f"{log_prefix} [Controller] 📊 {ex_id}: {s['state']} | "
+            f"Лимит: {s['concurrency']}/{s['max_concurrency']} | "
+            f"✅ {s.get('success', 0)} | ❌ {s.get('failure', 0)} | "
+            f"🐢 {s.get('slow', 0)} | Размыканий: {s.get('opened', 0)} | "
+            f"Латентность (EWMA): {s['latency_ewma']}с"
+        )
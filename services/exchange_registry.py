@@ -0,0 +1,161 @@
+# services/exchange_registry.py
+"""
+Долгоживущий реестр бирж CCXT (один экземпляр на exchange_id на процесс API).
+
+Экземпляры переживают этапы и последовательные запуски анализа:
+пулы соединений (TLS) остаются "теплыми", а рынки, загруженные через
+'load_markets()', кэшируются внутри самого экземпляра ccxt.
+
+Экземпляр пересоздается (recycle), если:
+1. Не прошел health-check ('fetch_time') перед запуском.
+2. Прожил дольше config.EXCHANGE_MAX_AGE_SECONDS.
+3. Его явно выбросили через 'discard_exchange' (например, не загрузились рынки).
+"""
+
+import logging
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
+
+import config
+from .exchange_utils import initialize_exchange
+
+log = logging.getLogger(__name__)
+
+# --- Реестр (singleton на процесс) ---
+_exchanges: Dict[str, Any] = {}
+_created_at: Dict[str, float] = {}
+_registry_lock = asyncio.Lock()
+
+
+async def _close_exchange_quietly(exchange, exchange_id, log_prefix=""):
+    """Безопасное закрытие экземпляра (ошибки только логируются)."""
+    if exchange is None or not hasattr(exchange, 'close'):
+        return
+    try:
+        await exchange.close()
+        log.debug(f"{log_prefix} [Registry] Соединение с {exchange_id} закрыто.")
+    except Exception as e:
+        log.warning(f"{log_prefix} [Registry] Ошибка при закрытии {exchange_id}: {e}")
+
+
+def _is_expired(exchange_id, now=None) -> bool:
+    max_age = getattr(config, 'EXCHANGE_MAX_AGE_SECONDS', None)
+    if not max_age:
+        return False
+    now = now if now is not None else time.time()
+    return (now - _created_at.get(exchange_id, now)) > max_age
+
+
+async def get_exchange(exchange_id: str, log_prefix: str = "") -> Optional[Any]:
+    """
+    Возвращает "теплый" экземпляр биржи из реестра.
+    Создает его при первом обращении (или если он устарел).
+    """
+    async with _registry_lock:
+        exchange = _exchanges.get(exchange_id)
+
+        if exchange is not None and _is_expired(exchange_id):
+            log.info(f"{log_prefix} [Registry] ♻️ {exchange_id} устарел (> {config.EXCHANGE_MAX_AGE_SECONDS}с). Пересоздание...")
+            _exchanges.pop(exchange_id, None)
+            _created_at.pop(exchange_id, None)
+            await _close_exchange_quietly(exchange, exchange_id, log_prefix)
+            exchange = None
+
+        if exchange is None:
+            exchange = await initialize_exchange(exchange_id, log_prefix)
+            if exchange is None:
+                return None
+            _exchanges[exchange_id] = exchange
+            _created_at[exchange_id] = time.time()
+            log.info(f"{log_prefix} [Registry] ✅ {exchange_id} добавлен в реестр.")
+        else:
+            log.debug(f"{log_prefix} [Registry] {exchange_id} взят из реестра (теплый).")
+
+        return exchange
+
+
+async def discard_exchange(exchange_id: str, log_prefix: str = "") -> None:
+    """Удаляет экземпляр из реестра и закрывает его. Следующий 'get_exchange' создаст новый."""
+    async with _registry_lock:
+        exchange = _exchanges.pop(exchange_id, None)
+        _created_at.pop(exchange_id, None)
+    if exchange is not None:
+        log.info(f"{log_prefix} [Registry] 🗑️ {exchange_id} удален из реестра.")
+        await _close_exchange_quietly(exchange, exchange_id, log_prefix)
+
+
+async def recycle_exchange(exchange_id: str, log_prefix: str = "") -> Optional[Any]:
+    """Пересоздает экземпляр биржи (закрывает старый, создает новый)."""
+    await discard_exchange(exchange_id, log_prefix)
+    return await get_exchange(exchange_id, log_prefix)
+
+
+async def check_exchange_health(exchange_id: str, log_prefix: str = "") -> bool:
+    """
+    Health-check экземпляра из реестра: легкий запрос 'fetch_time'.
+    Возвращает False, если экземпляра нет или запрос упал/завис.
+    """
+    exchange = _exchanges.get(exchange_id)
+    if exchange is None:
+        return False
+
+    timeout = getattr(config, 'EXCHANGE_HEALTHCHECK_TIMEOUT', 10)
+    try:
+        await asyncio.wait_for(exchange.fetch_time(), timeout=timeout)
+        return True
+    except Exception as e:
+        log.warning(f"{log_prefix} [Registry] ⚠️ Health-check {exchange_id} провален: {type(e).__name__}: {e}")
+        return False
+
+
+async def ensure_healthy_exchanges(exchange_ids: List[str], log_prefix: str = "") -> Dict[str, Any]:
+    """
+    Вызывается перед запуском анализа.
+    Уже существующие экземпляры проверяются health-check'ом и
+    пересоздаются при провале. Отсутствующие — создаются.
+    """
+    healthy = {}
+    for ex_id in exchange_ids:
+        if ex_id in _exchanges and not _is_expired(ex_id):
+            if await check_exchange_health(ex_id, log_prefix):
+                healthy[ex_id] = _exchanges[ex_id]
+                continue
+            exchange = await recycle_exchange(ex_id, log_prefix)
+        else:
+            exchange = await get_exchange(ex_id, log_prefix)
+
+        if exchange is not None:
+            healthy[ex_id] = exchange
+
+    return healthy
+
+
+async def close_all_exchanges(log_prefix: str = "") -> None:
+    """Закрывает ВСЕ экземпляры реестра (вызывается на shutdown API)."""
+    async with _registry_lock:
+        items = list(_exchanges.items())
+        _exchanges.clear()
+        _created_at.clear()
+
+    if not items:
+        return
+
+    log.info(f"{log_prefix} [Registry] Закрытие {len(items)} соединений с биржами...")
+    await asyncio.gather(
+        *[_close_exchange_quietly(ex, ex_id, log_prefix) for ex_id, ex in items],
+        return_exceptions=True
+    )
+    log.info(f"{log_prefix} [Registry] ✅ Все соединения с биржами закрыты.")
+
+
+def get_registry_stats() -> Dict[str, Dict[str, Any]]:
+    """Возвращает статистику реестра (возраст экземпляров, загружены ли рынки)."""
+    now = time.time()
+    return {
+        ex_id: {
+            'age_seconds': round(now - _created_at.get(ex_id, now), 1),
+            'markets_loaded': bool(getattr(ex, 'markets', None))
+        }
+        for ex_id, ex in _exchanges.items()
+    }
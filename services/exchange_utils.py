@@ -9,6 +9,8 @@ import time
 from collections import defaultdict
 import config
 
+from .exchange_controller import get_controller
+
 # --- Настройка ---
 log = logging.getLogger(__name__)
 
@@ -167,6 +169,7 @@ def retry_on_network_error(max_attempts_func=None):
             
             exchange = args[0] if args else None
             exchange_id = exchange.id if (exchange and hasattr(exchange, 'id')) else 'unknown'
+            controller = get_controller(exchange_id) if exchange_id != 'unknown' else None
 
             while attempts < max_attempts:
                 try:
@@ -180,7 +183,23 @@ def retry_on_network_error(max_attempts_func=None):
                         if weight > 0:
                             await rate_limiter.check_and_wait(exchange_id, weight)
                     
-                    return await func(*args, **kwargs)
+                    if not controller:
+                        return await func(*args, **kwargs)
+                    
+                    # Слот контроллера (AIMD + circuit breaker)
+                    await controller.acquire()
+                    started = time.monotonic()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except ccxt.NetworkError:
+                        # (включая RequestTimeout, RateLimitExceeded, ExchangeNotAvailable)
+                        controller.release(False)
+                        raise
+                    except BaseException:
+                        controller.release(None)
+                        raise
+                    controller.release(True, time.monotonic() - started)
+                    return result
                 
                 except ccxt.ExchangeNotAvailable as e:
                     log.error(
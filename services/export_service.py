@@ -0,0 +1,166 @@
+# services/export_service.py
+
+"""
+Колоночная выгрузка снимков монет (Apache Arrow IPC / Parquet).
+
+Типы колонок выводятся из config.DATABASE_SCHEMA (DOUBLE -> float64,
+SMALLINT -> int16, TEXT[] -> list<string>, ...): клиенты (pandas, polars,
+pyarrow) читают типизированные колонки без разбора текста CSV.
+
+Текущий снимок = отфильтрованное представление кэша
+(data_cache_service.get_filtered_views). Готовые файлы хранятся до
+смены версии представления; исторические снимки ('previous', 'at')
+строятся по запросу.
+"""
+
+import io
+import logging
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+from .data_cache_service import get_filtered_views, csv_columns, prepare_body
+from .mongo_service import get_previous_coins_from_mongo_async
+from .history_service import get_history_snapshot
+
+log = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Готовые файлы текущего снимка: {(format, columns): prepared_body}
+_exports: Dict[tuple, Dict[str, Any]] = {}
+_exports_key: Optional[tuple] = None
+_exports_lock = asyncio.Lock()
+# Сколько разных проекций колонок держать на одну версию кэша
+MAX_CACHED_EXPORTS = 16
+
+
+def _arrow_type(sql_type: str):
+    """Тип Arrow для типа колонки из DATABASE_SCHEMA."""
+    sql_type = sql_type.upper()
+    if sql_type.startswith("TEXT[]"):
+        return pa.list_(pa.string())
+    if sql_type.startswith(("DOUBLE", "REAL", "FLOAT", "NUMERIC")):
+        return pa.float64()
+    if sql_type.startswith("SMALLINT"):
+        return pa.int16()
+    if sql_type.startswith("BIGINT"):
+        return pa.int64()
+    if sql_type.startswith("INT"):
+        return pa.int32()
+    if sql_type.startswith("BOOL"):
+        return pa.bool_()
+    if sql_type.startswith("TIMESTAMP"):
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+def arrow_schema(columns: Sequence[str]):
+    """Схема Arrow для колонок (порядок и типы из DATABASE_SCHEMA)."""
+    return pa.schema([pa.field(col, _arrow_type(config.DATABASE_SCHEMA[col])) for col in columns])
+
+
+def _column_values(coins: List[Dict[str, Any]], column: str, arrow_type) -> list:
+    values = [coin.get(column) for coin in coins]
+    if pa.types.is_integer(arrow_type):
+        # Ранги могут прийти как float (3.0) -> приводим, NaN/None -> null
+        return [int(v) if v is not None and v == v else None for v in values]
+    return values
+
+
+def build_table(coins: List[Dict[str, Any]], columns: Sequence[str]):
+    """Таблица Arrow: одна типизированная колонка на поле схемы."""
+    schema = arrow_schema(columns)
+    arrays = [
+        # from_pandas=True: NaN в float-колонках -> null
+        pa.array(_column_values(coins, field.name, field.type), type=field.type, from_pandas=True)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def serialize_table(table, fmt: str) -> bytes:
+    """Arrow IPC (file) или Parquet (zstd)."""
+    sink = io.BytesIO()
+    if fmt == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
+
+
+def resolve_columns(coins: List[Dict[str, Any]], requested: Optional[List[str]]) -> List[str]:
+    """Колонки выгрузки: все доступные или проекция (в порядке DATABASE_SCHEMA)."""
+    if not requested:
+        return csv_columns(coins)
+    unknown = [col for col in requested if col not in config.DATABASE_SCHEMA]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    requested_set = set(requested)
+    return [col for col in config.DATABASE_SCHEMA.keys() if col in requested_set]
+
+
+def _export_body(coins: List[Dict[str, Any]], fmt: str, columns: List[str]) -> Dict[str, Any]:
+    body = serialize_table(build_table(coins, columns), fmt)
+    # Parquet уже сжат (zstd), Arrow IPC - нет
+    return prepare_body(body, EXPORT_FORMATS[fmt], compress=(fmt == "arrow"))
+
+
+async def get_export(
+    fmt: str = "arrow",
+    columns: Optional[List[str]] = None,
+    snapshot: str = "current",
+    at: Optional[datetime] = None,
+    log_prefix: str = "[Export]"
+) -> Optional[Dict[str, Any]]:
+    """
+    Готовое тело выгрузки (см. data_cache_service.prepare_body).
+    snapshot: 'current' (кэш), 'previous' (версия до последней замены)
+    или, если задан 'at', — снимок истории метрик на этот момент.
+    None -> снимок пуст / недоступен.
+    """
+    global _exports, _exports_key
+
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: '{fmt}'")
+
+    if at is not None:
+        coins = await get_history_snapshot(at, log_prefix)
+    elif snapshot == "previous":
+        coins = await get_previous_coins_from_mongo_async(log_prefix)
+    elif snapshot == "current":
+        views = await get_filtered_views(log_prefix=f"{log_prefix} [Views]")
+        if not views:
+            return None
+        coins = views["coins"]
+
+        cols = resolve_columns(coins, columns)
+        cache_key = (fmt, tuple(cols))
+        if _exports_key == views["key"] and cache_key in _exports:
+            return _exports[cache_key]
+
+        async with _exports_lock:
+            # Повторная проверка: файл мог построить другой запрос
+            if _exports_key != views["key"]:
+                _exports, _exports_key = {}, views["key"]
+            if cache_key not in _exports:
+                if len(_exports) >= MAX_CACHED_EXPORTS:
+                    _exports.pop(next(iter(_exports)))
+                _exports[cache_key] = await asyncio.to_thread(_export_body, coins, fmt, cols)
+                log.info(f"{log_prefix} ✅ Выгрузка {fmt}: {len(coins)} монет × {len(cols)} колонок.")
+            return _exports[cache_key]
+    else:
+        raise ValueError(f"Unknown snapshot: '{snapshot}'")
+
+    if not coins:
+        return None
+    cols = resolve_columns(coins, columns)
+    return await asyncio.to_thread(_export_body, coins, fmt, cols)
@@ -0,0 +1,184 @@
+# services/history_service.py
+"""
+История метрик монет (time-series коллекция MongoDB).
+
+'coin-sifter' хранит только последний снимок. После каждого запуска
+метрики свежих монет дописываются в 'coin_metrics_history':
+- timeField 'ts' (время запуска), metaField 'meta' ({'full_symbol'});
+- MongoDB сам группирует точки одной монеты в бакеты (granularity 'hours')
+  и сжимает их поколоночно -> хранилище остается компактным;
+- старые точки удаляются через config.HISTORY_RETENTION_DAYS.
+"""
+
+import logging
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, DESCENDING
+
+import config
+from metrics.calculator import metric_timeframe
+from .mongo_service import get_mongo_client, get_async_mongo_client, DB_NAME
+
+log = logging.getLogger(__name__)
+
+HISTORY_COLLECTION = "coin_metrics_history"
+
+# Поля снимка (не метрики ТФ), которые тоже пишутся в историю
+SNAPSHOT_FIELDS = ('usdPrice', 'volume_24h_usd', 'change24h', 'category')
+
+_collection_ready = False
+
+
+def _as_utc(dt: datetime) -> datetime:
+    """Наивные datetime (из MongoDB) считаются UTC."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _fresh_timeframes(coin: Dict[str, Any]) -> Set[str]:
+    """
+    ТФ, пересчитанные в этом запуске. Все они имеют одну (самую позднюю)
+    отметку 'analyzed_at_tf'; ТФ, перенесенные из прошлого документа
+    (merge_with_previous), старше.
+    """
+    stamps = {
+        tf: _as_utc(at) for tf, at in (coin.get('analyzed_at_tf') or {}).items()
+        if isinstance(at, datetime)
+    }
+    if not stamps:
+        return set()
+    latest = max(stamps.values())
+    return {tf for tf, at in stamps.items() if at == latest}
+
+
+def _history_point(coin: Dict[str, Any], ts: datetime, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Точка истории: числовые метрики ТФ, пересчитанных в этом запуске, + поля снимка."""
+    point = {'ts': ts, 'meta': {'full_symbol': coin['full_symbol']}}
+    if run_id:
+        point['run_id'] = str(run_id)
+    fresh_tfs = _fresh_timeframes(coin)
+    for key, value in coin.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if key in SNAPSHOT_FIELDS or metric_timeframe(key) in fresh_tfs:
+                point[key] = value
+    return point
+
+
+# ============================================================================
+# === Sync операции (MongoDB) ===
+# ============================================================================
+
+def _get_collection(log_prefix=""):
+    global _collection_ready
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.History]")
+    if client is None:
+        return None
+    db = client[DB_NAME]
+    if not _collection_ready:
+        if HISTORY_COLLECTION not in db.list_collection_names():
+            db.create_collection(
+                HISTORY_COLLECTION,
+                timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'hours'},
+                expireAfterSeconds=config.HISTORY_RETENTION_DAYS * 24 * 60 * 60
+            )
+            log.info(f"{log_prefix} ✅ Создана time-series коллекция '{HISTORY_COLLECTION}'.")
+        db[HISTORY_COLLECTION].create_index([('meta.full_symbol', ASCENDING), ('ts', ASCENDING)])
+        _collection_ready = True
+    return db[HISTORY_COLLECTION]
+
+
+def _append_run_metrics_sync(coins: List[Dict[str, Any]], ts: datetime, run_id: Optional[str] = None, log_prefix="") -> int:
+    """(Sync) Дописывает точки истории свежих (is_stale != True) монет."""
+    collection = _get_collection(log_prefix)
+    if collection is None:
+        return 0
+    points = [
+        _history_point(coin, ts, run_id) for coin in coins
+        if coin.get('full_symbol') and not coin.get('is_stale')
+    ]
+    if not points:
+        return 0
+    collection.insert_many(points, ordered=False)
+    return len(points)
+
+
+def _history_query(full_symbol: str, metrics: Optional[List[str]], start: Optional[datetime], end: Optional[datetime]):
+    """Фильтр и проекция запроса истории монеты."""
+    query: Dict[str, Any] = {'meta.full_symbol': full_symbol}
+    ts_range = {}
+    if start:
+        ts_range['$gte'] = start
+    if end:
+        ts_range['$lte'] = end
+    if ts_range:
+        query['ts'] = ts_range
+
+    if metrics:
+        projection = {'_id': 0, 'ts': 1, **{metric: 1 for metric in metrics}}
+    else:
+        projection = {'_id': 0, 'meta': 0, 'run_id': 0}
+    return query, projection
+
+
+# ============================================================================
+# === Публичный API ===
+# ============================================================================
+
+async def append_run_metrics(coins: List[Dict[str, Any]], run_id: Optional[str] = None, log_prefix: str = "") -> int:
+    """
+    (Async) Дописывает метрики запуска в историю.
+    Ошибки только логируются: история не должна ломать сохранение.
+    """
+    if not config.HISTORY_ENABLED:
+        return 0
+    try:
+        ts = datetime.now(timezone.utc)
+        written = await asyncio.to_thread(_append_run_metrics_sync, coins, ts, run_id, log_prefix)
+        log.info(f"{log_prefix} [History] 📈 В историю записано {written} точек.")
+        return written
+    except Exception as e:
+        log.warning(f"{log_prefix} [History] ⚠️ Не удалось записать историю метрик: {e}")
+        return 0
+
+
+async def get_metric_history(
+    full_symbol: str,
+    metrics: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 1000,
+    log_prefix: str = ""
+) -> List[Dict[str, Any]]:
+    """(Async) История монеты за период (по возрастанию времени)."""
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.History]")
+    if client is None:
+        return []
+    query, projection = _history_query(full_symbol, metrics, start, end)
+    cursor = client[DB_NAME][HISTORY_COLLECTION].find(query, projection).sort('ts', ASCENDING).limit(limit)
+    return [doc async for doc in cursor]
+
+
+async def get_history_snapshot(at: datetime, log_prefix: str = "") -> List[Dict[str, Any]]:
+    """
+    (Async) Снимок монет последнего запуска не позже 'at' (по точкам истории).
+    Все точки одного запуска записаны с одним 'ts'.
+    """
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.History]")
+    if client is None:
+        return []
+    collection = client[DB_NAME][HISTORY_COLLECTION]
+
+    latest = [doc async for doc in collection.find({'ts': {'$lte': at}}, {'ts': 1}).sort('ts', DESCENDING).limit(1)]
+    if not latest:
+        return []
+    run_ts = latest[0]['ts']
+
+    snapshot = []
+    async for doc in collection.find({'ts': run_ts}, {'_id': 0, 'run_id': 0}):
+        meta = doc.pop('meta', {}) or {}
+        doc['full_symbol'] = meta.get('full_symbol')
+        doc['analyzed_at'] = doc.pop('ts')
+        snapshot.append(doc)
+    log.info(f"{log_prefix} [History] ✅ Снимок на {run_ts}: {len(snapshot)} монет.")
+    return snapshot
@@ -0,0 +1,250 @@
+# services/market_cache.py
+"""
+Кэш метаданных рынков (память + снимок на диске) с TTL.
+
+1. Полный список рынков каждой биржи хранится в памяти и в снимке
+   '{MARKET_CACHE_DIR}/{exchange_id}.json'.
+2. Для каждой пары (exchange_id, набор quote-валют) заранее строится
+   отфильтрованный индекс (активные future/swap рынки).
+3. Обновление "условное": после перезагрузки рынков индекс перестраивается,
+   только если изменился отпечаток (символы / active / type / quote).
+
+Этап 1 получает рынки сразу из кэша, а API может отвечать на вопросы
+о символах, не обращаясь к бирже.
+"""
+
+import logging
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, List, Tuple, Optional
+
+import config
+from .exchange_api import load_markets_raw, filter_markets
+
+log = logging.getLogger(__name__)
+
+# --- Кэш (singleton на процесс) ---
+_raw_markets: Dict[str, Dict[str, Any]] = {}
+_fingerprints: Dict[str, str] = {}
+_loaded_at: Dict[str, float] = {}
+_filtered_index: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+_cache_lock = asyncio.Lock()
+
+
+# ============================================================================
+# === Вспомогательные функции ===
+# ============================================================================
+
+def _index_key(exchange_id: str, quote_currencies: List[str]) -> Tuple[str, Tuple[str, ...]]:
+    return exchange_id, tuple(sorted(set(quote_currencies)))
+
+
+def _fingerprint(markets: Dict[str, Any]) -> str:
+    """Отпечаток полей, влияющих на фильтр (символ, active, type, quote)."""
+    h = hashlib.sha1()
+    for symbol in sorted(markets):
+        m = markets[symbol]
+        h.update(f"{symbol}|{m.get('active')}|{m.get('type')}|{m.get('quote')};".encode())
+    return h.hexdigest()
+
+
+def _is_fresh(loaded_at: Optional[float], now: Optional[float] = None) -> bool:
+    if not loaded_at:
+        return False
+    now = now if now is not None else time.time()
+    return (now - loaded_at) <= config.MARKET_CACHE_TTL_SECONDS
+
+
+def _snapshot_path(exchange_id: str) -> str:
+    return os.path.join(config.MARKET_CACHE_DIR, f"{exchange_id}.json")
+
+
+def _save_snapshot_sync(exchange_id: str, markets: Dict[str, Any], loaded_at: float, fingerprint: str):
+    """(Sync) Атомарно записывает снимок рынков на диск."""
+    os.makedirs(config.MARKET_CACHE_DIR, exist_ok=True)
+    path = _snapshot_path(exchange_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(
+            {'loaded_at': loaded_at, 'fingerprint': fingerprint, 'markets': markets},
+            f, default=str
+        )
+    os.replace(tmp_path, path)
+
+
+def _load_snapshot_sync(exchange_id: str) -> Optional[Dict[str, Any]]:
+    """(Sync) Читает снимок рынков с диска (None, если его нет или он битый)."""
+    path = _snapshot_path(exchange_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if not isinstance(snapshot.get('markets'), dict):
+            return None
+        return snapshot
+    except Exception as e:
+        log.warning(f"[MarketCache] ⚠️ Не удалось прочитать снимок {path}: {e}")
+        return None
+
+
+def _store_in_memory(exchange_id: str, markets: Dict[str, Any], loaded_at: float, fingerprint: str) -> bool:
+    """
+    Кладет рынки в память. Возвращает True, если отпечаток изменился
+    (тогда индексы этой биржи сбрасываются и строятся заново по требованию).
+    """
+    changed = _fingerprints.get(exchange_id) != fingerprint
+    _raw_markets[exchange_id] = markets
+    _loaded_at[exchange_id] = loaded_at
+    _fingerprints[exchange_id] = fingerprint
+    if changed:
+        for key in [k for k in _filtered_index if k[0] == exchange_id]:
+            del _filtered_index[key]
+    return changed
+
+
+def _get_index(exchange_id: str, quote_currencies: List[str]) -> Dict[str, Any]:
+    """Возвращает (и при необходимости строит) отфильтрованный индекс."""
+    key = _index_key(exchange_id, quote_currencies)
+    index = _filtered_index.get(key)
+    if index is None:
+        index = filter_markets(_raw_markets.get(exchange_id, {}), list(key[1]))
+        _filtered_index[key] = index
+    return index
+
+
+def _prime_exchange(exchange, markets: Dict[str, Any], log_prefix=""):
+    """
+    Передает рынки из кэша в экземпляр ccxt, чтобы он не вызывал
+    'load_markets()' сам (например, внутри 'fetch_ohlcv').
+    """
+    if getattr(exchange, 'markets', None):
+        return
+    try:
+        exchange.set_markets(markets)
+    except Exception as e:
+        log.warning(f"{log_prefix} [MarketCache] ⚠️ Не удалось передать рынки в {exchange.id}: {e}")
+
+
+# ============================================================================
+# === Публичный API ===
+# ============================================================================
+
+async def get_filtered_markets(
+    exchange,
+    quote_currencies: List[str],
+    log_prefix: str = "",
+    force_refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Возвращает отфильтрованные рынки биржи (как 'fetch_markets'), используя кэш.
+
+    Порядок: память (свежая) -> снимок на диске (свежий) -> загрузка с биржи.
+    Если загрузка с биржи провалилась, используются устаревшие данные (если есть).
+    """
+    exchange_id = exchange.id
+
+    async with _cache_lock:
+        now = time.time()
+
+        # 1. Память
+        if not force_refresh and _is_fresh(_loaded_at.get(exchange_id), now):
+            _prime_exchange(exchange, _raw_markets[exchange_id], log_prefix)
+            index = _get_index(exchange_id, quote_currencies)
+            log.info(f"{log_prefix} [MarketCache] ✅ {exchange_id}: {len(index)} рынков из памяти.")
+            return index
+
+        # 2. Снимок на диске
+        if not force_refresh and exchange_id not in _raw_markets:
+            snapshot = await asyncio.to_thread(_load_snapshot_sync, exchange_id)
+            if snapshot and _is_fresh(snapshot.get('loaded_at'), now):
+                _store_in_memory(
+                    exchange_id, snapshot['markets'], snapshot['loaded_at'],
+                    snapshot.get('fingerprint') or _fingerprint(snapshot['markets'])
+                )
+                _prime_exchange(exchange, snapshot['markets'], log_prefix)
+                index = _get_index(exchange_id, quote_currencies)
+                log.info(f"{log_prefix} [MarketCache] ✅ {exchange_id}: {len(index)} рынков из снимка на диске.")
+                return index
+
+        # 3. Загрузка с биржи
+        reload = bool(getattr(exchange, 'markets', None))
+        markets = await load_markets_raw(exchange, reload, log_prefix)
+
+        if not markets:
+            if exchange_id in _raw_markets:
+                log.warning(f"{log_prefix} [MarketCache] ⚠️ {exchange_id}: обновление не удалось. Используются устаревшие рынки.")
+                _prime_exchange(exchange, _raw_markets[exchange_id], log_prefix)
+                return _get_index(exchange_id, quote_currencies)
+            log.error(f"{log_prefix} [MarketCache] ❌ {exchange_id}: рынки не загружены, кэша нет.")
+            return {}
+
+        fingerprint = _fingerprint(markets)
+        changed = _store_in_memory(exchange_id, markets, now, fingerprint)
+        index = _get_index(exchange_id, quote_currencies)
+
+        try:
+            await asyncio.to_thread(_save_snapshot_sync, exchange_id, markets, now, fingerprint)
+        except Exception as e:
+            log.warning(f"{log_prefix} [MarketCache] ⚠️ Не удалось сохранить снимок {exchange_id}: {e}")
+
+        log.info(
+            f"{log_prefix} [MarketCache] ✅ {exchange_id}: {len(index)} активных фьючерсных рынков "
+            f"(загружено с биржи, {'индекс перестроен' if changed else 'без изменений'})."
+        )
+        return index
+
+
+async def load_snapshots(exchange_ids: List[str], log_prefix: str = "") -> int:
+    """
+    Загружает снимки с диска в память (вызывается на startup API),
+    чтобы API мог отвечать о символах до первого запуска анализа.
+    Возвращает количество загруженных бирж.
+    """
+    loaded = 0
+    async with _cache_lock:
+        for ex_id in exchange_ids:
+            if ex_id in _raw_markets:
+                continue
+            snapshot = await asyncio.to_thread(_load_snapshot_sync, ex_id)
+            if not snapshot:
+                continue
+            _store_in_memory(
+                ex_id, snapshot['markets'], snapshot.get('loaded_at') or 0.0,
+                snapshot.get('fingerprint') or _fingerprint(snapshot['markets'])
+            )
+            loaded += 1
+    if loaded:
+        log.info(f"{log_prefix} [MarketCache] ✅ Загружено снимков рынков: {loaded}.")
+    return loaded
+
+
+def get_cached_symbols(
+    exchange_id: str,
+    quote_currencies: Optional[List[str]] = None
+) -> Optional[List[str]]:
+    """
+    Возвращает отсортированный список символов из кэша БЕЗ обращения к бирже.
+    None, если рынков этой биржи в кэше нет.
+    """
+    if exchange_id not in _raw_markets:
+        return None
+    quote_currencies = quote_currencies or config.QUOTE_CURRENCIES
+    return sorted(_get_index(exchange_id, quote_currencies).keys())
+
+
+def get_market_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Возвращает статистику кэша (возраст, размер, свежесть) по биржам."""
+    now = time.time()
+    return {
+        ex_id: {
+            'markets_total': len(markets),
+            'age_seconds': round(now - _loaded_at.get(ex_id, now), 1),
+            'is_fresh': _is_fresh(_loaded_at.get(ex_id), now),
+            'fingerprint': _fingerprints.get(ex_id)
+        }
+        for ex_id, markets in _raw_markets.items()
+    }
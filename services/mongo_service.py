@@ -2,10 +2,11 @@
 
 import logging
 import asyncio
+import math
 import os
-from pymongo import MongoClient, UpdateOne
+from pymongo import MongoClient, AsyncMongoClient, UpdateOne, ReplaceOne, InsertOne, DeleteMany
 from pymongo.results import InsertManyResult, DeleteResult
-from bson import ObjectId
+from bson import ObjectId, encode as bson_encode
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Set, Optional
 
@@ -17,6 +18,17 @@ DB_NAME = "general"
 COINS_COLLECTION = "coin-sifter"
 BLACKLIST_COLLECTION = "blacklist"
 LOGS_COLLECTION = "script_run_logs"
+CHECKPOINTS_COLLECTION = "analysis_checkpoints"
+# Статус записи лога, пока запуск выполняется
+RUN_STATUS_ACTIVE = "Запуск"
+# Промежуточные коллекции запусков: '<COINS_COLLECTION>__staging_<run_id>'
+STAGING_COLLECTION_PREFIX = f"{COINS_COLLECTION}__staging_"
+# Предыдущая версия 'coin-sifter' (для отката)
+PREVIOUS_COINS_COLLECTION = f"{COINS_COLLECTION}__previous"
+
+# Режим diff: float-поля с относительной разницей меньше допуска не перезаписываются
+DIFF_FLOAT_REL_TOL = 1e-6
+DIFF_FLOAT_ABS_TOL = 1e-12
 
 # --- (НОВАЯ КОНСТАНТА) ---
 # Автоматически удалять логи из 'script_run_logs' старше X дней
@@ -27,6 +39,16 @@ LOGS_TTL_DAYS = 60
 # --- Пул соединений MongoDB ---
 _mongo_client: Optional[MongoClient] = None
 
+# --- Async-пул (запросы API: черный список, монеты, логи) ---
+# Нативный async-драйвер: запросы не занимают потоки пула asyncio.to_thread
+ASYNC_MAX_POOL_SIZE = 50
+ASYNC_MIN_POOL_SIZE = 5
+_async_mongo_client: Optional[AsyncMongoClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_indexes_ready = False
+# Задачи закрытия клиентов прежних event loop (ссылка, чтобы задачу не собрал GC)
+_async_close_tasks: Set[asyncio.Task] = set()
+
 def get_mongo_client(log_prefix=""):
     """
     Создает и возвращает ЕДИНЫЙ клиент MongoDB с пулом соединений.
@@ -88,33 +110,112 @@ def close_mongo_client(log_prefix=""):
         except Exception as e:
             log.error(f"{log_prefix} [Mongo.Close] ❌ Ошибка при закрытии клиента MongoDB: {e}", exc_info=True)
 
+async def _close_async_client_quietly(client, log_prefix=""):
+    try:
+        await client.close()
+    except Exception as e:
+        log.debug(f"{log_prefix} [Mongo.AsyncClose] Клиент прежнего event loop закрыт с ошибкой: {e}")
+
+def _discard_async_client(client, client_loop, log_prefix=""):
+    """
+    Закрывает async-клиент прежнего event loop: в его loop, если тот еще
+    работает (другой поток), иначе — фоновой задачей в текущем loop.
+    """
+    log.info(f"{log_prefix} [Mongo.AsyncClose] Event loop сменился, закрытие прежнего async-клиента...")
+    try:
+        if client_loop is not None and client_loop.is_running() and not client_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(_close_async_client_quietly(client, log_prefix), client_loop)
+        else:
+            task = asyncio.get_running_loop().create_task(_close_async_client_quietly(client, log_prefix))
+            _async_close_tasks.add(task)
+            task.add_done_callback(_async_close_tasks.discard)
+    except Exception as e:
+        log.warning(f"{log_prefix} [Mongo.AsyncClose] ⚠️ Не удалось закрыть прежний async-клиент: {e}")
+
+def get_async_mongo_client(log_prefix=""):
+    """
+    Возвращает ЕДИНЫЙ async-клиент MongoDB (AsyncMongoClient) с пулом соединений.
+    Клиент привязан к event loop, поэтому при смене loop прежний клиент
+    закрывается, а новый создается заново.
+    """
+    global _async_mongo_client, _async_client_loop, _async_indexes_ready
+
+    loop = asyncio.get_running_loop()
+    if _async_mongo_client is None or _async_client_loop is not loop:
+        if _async_mongo_client is not None:
+            _discard_async_client(_async_mongo_client, _async_client_loop, log_prefix)
+            _async_mongo_client = None
+            _async_client_loop = None
+        log.info(f"{log_prefix} [Mongo.AsyncInit] Создание async-клиента MongoDB...")
+        db_url = os.getenv('MONGO_DB_URL')
+        if not db_url:
+            log.error(f"{log_prefix} [Mongo.AsyncInit] ❌ MONGO_DB_URL не установлен.")
+            raise ValueError("MONGO_DB_URL must be set")
+
+        _async_mongo_client = AsyncMongoClient(
+            db_url,
+            maxPoolSize=ASYNC_MAX_POOL_SIZE,
+            minPoolSize=ASYNC_MIN_POOL_SIZE,
+            connectTimeoutMS=10000,
+            serverSelectionTimeoutMS=15000
+        )
+        _async_client_loop = loop
+        _async_indexes_ready = False
+
+    return _async_mongo_client
+
+async def close_async_mongo_client(log_prefix=""):
+    """
+    Закрывает async-клиент MongoDB (если он был открыт).
+    """
+    global _async_mongo_client, _async_client_loop
+    if _async_mongo_client is not None:
+        log.info(f"{log_prefix} [Mongo.AsyncClose] Закрытие async-клиента MongoDB...")
+        try:
+            await _async_mongo_client.close()
+            log.info(f"{log_prefix} [Mongo.AsyncClose] ✅ Async-клиент MongoDB закрыт.")
+        except Exception as e:
+            log.error(f"{log_prefix} [Mongo.AsyncClose] ❌ Ошибка при закрытии async-клиента: {e}", exc_info=True)
+        finally:
+            _async_mongo_client = None
+            _async_client_loop = None
+
+async def _ensure_async_indexes(db, log_prefix=""):
+    """TTL индекс логов (один раз на клиент)."""
+    global _async_indexes_ready
+    if _async_indexes_ready:
+        return
+    await db[LOGS_COLLECTION].create_index("start_time", expireAfterSeconds=LOGS_TTL_DAYS * 24 * 60 * 60)
+    _async_indexes_ready = True
+
 # ============================================================================
 # BLACKLIST OPERATIONS
 # ============================================================================
 
-def _load_blacklist_from_mongo_sync(log_prefix="") -> Set[str]:
+async def fetch_blacklist_symbols(log_prefix="") -> Set[str]:
     """
-    (Sync) Загружает черный список из MongoDB.
+    (Async) Символы черного списка из MongoDB. Ошибки НЕ перехватываются
+    (кэш черного списка при ошибке сохраняет прошлое содержимое).
     """
-    client = get_mongo_client(f"{log_prefix} [DB.Mongo.Blacklist]")
-    if client is None: return set()
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.Blacklist]")
+    collection = client[DB_NAME][BLACKLIST_COLLECTION]
     
+    # Загружаем все документы, извлекаем поле 'symbol'
+    return {
+        doc['symbol'] 
+        async for doc in collection.find({}, {'symbol': 1, '_id': 0})
+        if doc and 'symbol' in doc and doc['symbol']
+    }
+
+async def load_blacklist_from_mongo_async(log_prefix="") -> Set[str]:
+    """
+    (Async) Загружает черный список из MongoDB.
+    """
     log.info(f"{log_prefix} Загрузка Blacklist из MongoDB ('{BLACKLIST_COLLECTION}')...")
     
     try:
-        db = client[DB_NAME]
-        collection = db[BLACKLIST_COLLECTION]
-        
-        # Загружаем все документы, извлекаем поле 'symbol'
-        blacklist_docs = collection.find({}, {'symbol': 1, '_id': 0})
-        
-        # Используем set comprehension для эффективности
-        blacklist_set = {
-            doc['symbol'] 
-            for doc in blacklist_docs 
-            if doc and 'symbol' in doc and doc['symbol']
-        }
-        
+        # Ошибка подключения -> пустой черный список (фильтрация не должна падать)
+        blacklist_set = await fetch_blacklist_symbols(log_prefix)
         log.info(f"{log_prefix} ✅ Blacklist загружен. Найдено {len(blacklist_set)} уникальных символов.")
         return blacklist_set
         
@@ -122,12 +223,25 @@ def _load_blacklist_from_mongo_sync(log_prefix="") -> Set[str]:
         log.error(f"{log_prefix} ❌ Ошибка при загрузке Blacklist из Mongo: {e}", exc_info=True)
         return set()
 
-async def load_blacklist_from_mongo_async(log_prefix="") -> Set[str]:
+async def add_to_blacklist(symbol: str, log_prefix="") -> bool:
     """
-    (Async) Асинхронная обертка для _load_blacklist_from_mongo_sync.
+    (Async) Добавляет базовый символ в черный список. True, если символ новый.
     """
-    return await asyncio.to_thread(_load_blacklist_from_mongo_sync, log_prefix)
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.BlacklistAdd]")
+    result = await client[DB_NAME][BLACKLIST_COLLECTION].update_one(
+        {'symbol': symbol}, {'$setOnInsert': {'symbol': symbol}}, upsert=True
+    )
+    log.info(f"{log_prefix} ✅ '{symbol}' в черном списке (новый: {result.upserted_id is not None}).")
+    return result.upserted_id is not None
 
+async def remove_from_blacklist(symbol: str, log_prefix="") -> bool:
+    """
+    (Async) Удаляет символ из черного списка. True, если символ был в списке.
+    """
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.BlacklistRemove]")
+    result = await client[DB_NAME][BLACKLIST_COLLECTION].delete_many({'symbol': symbol})
+    log.info(f"{log_prefix} ✅ '{symbol}' удален из черного списка ({result.deleted_count}).")
+    return result.deleted_count > 0
 
 # ============================================================================
 # COIN OPERATIONS (V3)
@@ -136,6 +250,9 @@ async def load_blacklist_from_mongo_async(log_prefix="") -> Set[str]:
 def _save_coins_to_mongo_v3_sync(data_to_save: List[Dict[str, Any]], log_prefix: str = "") -> int:
     """
     (Sync) Сохраняет данные (V3) в MongoDB, используя 'full_symbol' как ключ.
+    Данные пишутся в версионную промежуточную коллекцию, проверяются и
+    атомарно подменяют 'coin-sifter' (читатели никогда не видят пустую
+    или частичную коллекцию).
     """
     client = get_mongo_client(f"{log_prefix} [DB.Mongo.SaveV3]")
     if client is None or not data_to_save:
@@ -143,30 +260,34 @@ def _save_coins_to_mongo_v3_sync(data_to_save: List[Dict[str, Any]], log_prefix:
             log.warning(f"{log_prefix} Нет данных для сохранения.")
         return 0
 
-    log.info(f"{log_prefix} Подготовка {len(data_to_save)} монет для 'bulk_write'...")
+    log.info(f"{log_prefix} Подготовка {len(data_to_save)} монет для записи...")
     
+    version_name = staging_collection_name(f"save_{datetime.now(timezone.utc):%Y%m%d%H%M%S%f}")
     try:
         db = client[DB_NAME]
-        collection = db[COINS_COLLECTION]
+        collection = db[version_name]
         
-        # 1. Очищаем ВСЮ коллекцию перед записью
-        log.info(f"{log_prefix} Очистка коллекции '{COINS_COLLECTION}' перед записью...")
-        clear_result = collection.delete_many({})
-        log.info(f"{log_prefix} ✅ Коллекция очищена. Удалено {clear_result.deleted_count} старых документов.")
-
-        # 2. Выполняем 'insert_many' (быстрее, чем bulk update, если мы все равно чистим)
+        # 1. Пишем ВСЮ версию в промежуточную коллекцию (рабочая не трогается)
         # (Удаляем '_id' на всякий случай, если он остался от предыдущих операций)
         for item in data_to_save:
             item.pop('_id', None) 
             
         result: InsertManyResult = collection.insert_many(data_to_save, ordered=False)
-        saved_count = len(result.inserted_ids)
-        
-        log.info(f"{log_prefix} ✅ 'insert_many' завершен. Вставлено {saved_count} новых документов.")
+        collection.create_index("full_symbol", unique=True)
+        log.info(f"{log_prefix} ✅ 'insert_many' завершен. Вставлено {len(result.inserted_ids)} документов в '{version_name}'.")
+
+        # 2. Проверка и атомарная подмена
+        saved_count = _promote_staging_collection_sync(version_name, log_prefix, expected_count=len(data_to_save))
+        if not saved_count:
+            db.drop_collection(version_name)
         return saved_count
         
     except Exception as e:
-        log.error(f"{log_prefix} ❌ Ошибка во время bulk_write (V3) в Mongo: {e}", exc_info=True)
+        log.error(f"{log_prefix} ❌ Ошибка во время записи (V3) в Mongo: {e}", exc_info=True)
+        try:
+            client[DB_NAME].drop_collection(version_name)
+        except Exception:
+            pass
         return 0
 
 async def save_coins_to_mongo_v3(data_to_save: List[Dict[str, Any]], log_prefix: str = "") -> int:
@@ -176,27 +297,353 @@ async def save_coins_to_mongo_v3(data_to_save: List[Dict[str, Any]], log_prefix:
     return await asyncio.to_thread(_save_coins_to_mongo_v3_sync, data_to_save, log_prefix)
 
 
-def _get_all_coins_from_mongo_sync(log_prefix: str = "") -> List[Dict[str, Any]]:
+def _normalize_datetime(value: datetime) -> datetime:
+    """
+    datetime -> aware UTC с точностью BSON (мс). Mongo возвращает наивные
+    datetime (UTC), а новые значения ('analyzed_at_tf') — aware.
+    """
+    value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def _values_equal(new_value: Any, old_value: Any, rel_tol: float = DIFF_FLOAT_REL_TOL) -> bool:
+    """Сравнение значений поля (float — с допуском, NaN == NaN, datetime — в UTC, dict — рекурсивно)."""
+    if isinstance(new_value, datetime) and isinstance(old_value, datetime):
+        return _normalize_datetime(new_value) == _normalize_datetime(old_value)
+    if isinstance(new_value, dict) and isinstance(old_value, dict):
+        return new_value.keys() == old_value.keys() and all(
+            _values_equal(value, old_value[key], rel_tol) for key, value in new_value.items()
+        )
+    if isinstance(new_value, float) and isinstance(old_value, (int, float)) and not isinstance(old_value, bool):
+        if math.isnan(new_value) or math.isnan(old_value):
+            return math.isnan(new_value) and math.isnan(old_value)
+        return math.isclose(new_value, old_value, rel_tol=rel_tol, abs_tol=DIFF_FLOAT_ABS_TOL)
+    return new_value == old_value
+
+def _diff_coin_doc(new_doc: Dict[str, Any], old_doc: Dict[str, Any], rel_tol: float = DIFF_FLOAT_REL_TOL):
+    """
+    Изменения документа монеты: ($set-поля, $unset-поля).
+    """
+    to_set = {
+        key: value for key, value in new_doc.items()
+        if key != '_id' and (key not in old_doc or not _values_equal(value, old_doc[key], rel_tol))
+    }
+    to_unset = {key: "" for key in old_doc if key != '_id' and key not in new_doc}
+    return to_set, to_unset
+
+def _upsert_coins_diff_sync(data_to_save: List[Dict[str, Any]], log_prefix: str = ""):
+    """
+    (Sync) Режим diff: сравнивает новые результаты с текущим 'coin-sifter'
+    и пишет только изменения — UpdateOne($set/$unset) для измененных полей,
+    InsertOne для новых монет, DeleteMany для выбывших.
+    Возвращает (кол-во монет, отчет об объеме записи).
+    """
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.SaveDiff]")
+    if client is None or not data_to_save:
+        if not data_to_save:
+            log.warning(f"{log_prefix} Нет данных для сохранения.")
+        return 0, {}
+
+    try:
+        collection = client[DB_NAME][COINS_COLLECTION]
+        current = {doc['full_symbol']: doc for doc in collection.find({}) if doc.get('full_symbol')}
+
+        operations = []
+        report = {
+            'mode': 'diff', 'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0,
+            'fields_written': 0, 'fields_total': 0, 'bytes_written': 0, 'bytes_full': 0
+        }
+        new_symbols = set()
+
+        for doc in data_to_save:
+            doc.pop('_id', None)
+            full_symbol = doc['full_symbol']
+            new_symbols.add(full_symbol)
+            report['fields_total'] += len(doc)
+            report['bytes_full'] += len(bson_encode(doc))
+
+            old_doc = current.get(full_symbol)
+            if old_doc is None:
+                operations.append(InsertOne(doc))
+                report['inserted'] += 1
+                report['fields_written'] += len(doc)
+                report['bytes_written'] += len(bson_encode(doc))
+                continue
+
+            to_set, to_unset = _diff_coin_doc(doc, old_doc)
+            if not to_set and not to_unset:
+                report['unchanged'] += 1
+                continue
+
+            update = {}
+            if to_set:
+                update['$set'] = to_set
+            if to_unset:
+                update['$unset'] = to_unset
+            operations.append(UpdateOne({'full_symbol': full_symbol}, update))
+            report['updated'] += 1
+            report['fields_written'] += len(to_set) + len(to_unset)
+            report['bytes_written'] += len(bson_encode(update))
+
+        dropped = [symbol for symbol in current if symbol not in new_symbols]
+        if dropped:
+            operations.append(DeleteMany({'full_symbol': {'$in': dropped}}))
+            report['deleted'] = len(dropped)
+
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+        report['saved_pct'] = (
+            round((1 - report['bytes_written'] / report['bytes_full']) * 100, 1)
+            if report['bytes_full'] else 0.0
+        )
+        log.info(
+            f"{log_prefix} ✅ Diff-запись: +{report['inserted']} / ~{report['updated']} / "
+            f"={report['unchanged']} / -{report['deleted']} монет. "
+            f"Полей: {report['fields_written']}/{report['fields_total']}, "
+            f"байт: {report['bytes_written']}/{report['bytes_full']} (сэкономлено {report['saved_pct']}%)."
+        )
+        return len(new_symbols), report
+
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка во время diff-записи в Mongo: {e}", exc_info=True)
+        return 0, {}
+
+async def upsert_coins_diff(data_to_save: List[Dict[str, Any]], log_prefix: str = ""):
+    """
+    (Async) Асинхронная обертка для _upsert_coins_diff_sync.
+    """
+    return await asyncio.to_thread(_upsert_coins_diff_sync, data_to_save, log_prefix)
+
+# ============================================================================
+# STAGING OPERATIONS (поэтапная запись результатов запуска)
+# ============================================================================
+
+def staging_collection_name(run_id: str) -> str:
+    """Имя промежуточной коллекции запуска."""
+    return f"{STAGING_COLLECTION_PREFIX}{run_id}"
+
+def _prepare_staging_collection_sync(collection_name: str, log_prefix: str = "") -> bool:
+    """
+    (Sync) Гарантирует уникальный индекс 'full_symbol' в промежуточной коллекции
+    (upsert по ключу -> повторная запись пачки после рестарта не создает дублей).
+    """
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.StagingPrepare]")
+    if client is None: return False
+
+    try:
+        client[DB_NAME][collection_name].create_index("full_symbol", unique=True)
+        log.info(f"{log_prefix} ✅ Промежуточная коллекция '{collection_name}' готова.")
+        return True
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка подготовки коллекции '{collection_name}': {e}", exc_info=True)
+        return False
+
+async def prepare_staging_collection(collection_name: str, log_prefix: str = "") -> bool:
+    """
+    (Async) Асинхронная обертка для _prepare_staging_collection_sync.
+    """
+    return await asyncio.to_thread(_prepare_staging_collection_sync, collection_name, log_prefix)
+
+def _write_coins_chunk_sync(collection_name: str, docs: List[Dict[str, Any]], log_prefix: str = "") -> int:
+    """
+    (Sync) Записывает пачку монет (upsert по 'full_symbol') в коллекцию.
+    Возвращает кол-во записанных документов.
+    """
+    if not docs:
+        return 0
+
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.WriteChunk]")
+    if client is None: return 0
+
+    try:
+        operations = [
+            ReplaceOne(
+                {'full_symbol': doc['full_symbol']},
+                {k: v for k, v in doc.items() if k != '_id'},
+                upsert=True
+            )
+            for doc in docs
+        ]
+        result = client[DB_NAME][collection_name].bulk_write(operations, ordered=False)
+        written = result.upserted_count + result.matched_count
+        log.debug(f"{log_prefix} ✅ Пачка записана в '{collection_name}': {written} монет.")
+        return written
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка записи пачки в '{collection_name}': {e}", exc_info=True)
+        return 0
+
+async def write_coins_chunk(collection_name: str, docs: List[Dict[str, Any]], log_prefix: str = "") -> int:
+    """
+    (Async) Асинхронная обертка для _write_coins_chunk_sync.
+    """
+    return await asyncio.to_thread(_write_coins_chunk_sync, collection_name, docs, log_prefix)
+
+def _set_coins_fields_sync(collection_name: str, fields_by_symbol: Dict[str, Dict[str, Any]], log_prefix: str = "") -> int:
+    """
+    (Sync) Дописывает поля ($set) в документы монет: {full_symbol: {поле: значение}}.
+    """
+    if not fields_by_symbol:
+        return 0
+
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.SetFields]")
+    if client is None: return 0
+
+    try:
+        operations = [
+            UpdateOne({'full_symbol': full_symbol}, {'$set': fields})
+            for full_symbol, fields in fields_by_symbol.items()
+        ]
+        result = client[DB_NAME][collection_name].bulk_write(operations, ordered=False)
+        return result.matched_count
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка обновления полей в '{collection_name}': {e}", exc_info=True)
+        return 0
+
+async def set_coins_fields(collection_name: str, fields_by_symbol: Dict[str, Dict[str, Any]], log_prefix: str = "") -> int:
+    """
+    (Async) Асинхронная обертка для _set_coins_fields_sync.
+    """
+    return await asyncio.to_thread(_set_coins_fields_sync, collection_name, fields_by_symbol, log_prefix)
+
+def _validate_staging_collection(db, collection_name: str, expected_count: Optional[int] = None, log_prefix: str = "") -> int:
+    """
+    Проверяет промежуточную коллекцию перед подменой.
+    Возвращает кол-во монет (0 = коллекция не прошла проверку).
+    """
+    collection = db[collection_name]
+    count = collection.count_documents({})
+    if count == 0:
+        log.warning(f"{log_prefix} ⚠️ Коллекция '{collection_name}' пуста.")
+        return 0
+    if expected_count is not None and count != expected_count:
+        log.warning(f"{log_prefix} ⚠️ В '{collection_name}' {count} монет, ожидалось {expected_count}.")
+        return 0
+    if collection.count_documents({'full_symbol': {'$in': [None, '']}}):
+        log.warning(f"{log_prefix} ⚠️ В '{collection_name}' есть документы без 'full_symbol'.")
+        return 0
+    return count
+
+def _drop_orphaned_staging_collections(db, existing: List[str], keep: str, log_prefix: str = "") -> None:
+    """
+    Удаляет промежуточные коллекции брошенных запусков. Коллекции активных
+    запусков (лог в статусе 'Запуск') и прерванных запусков с контрольными
+    точками (их продолжит 'resume') не трогаются.
+    """
+    try:
+        live_run_ids = {
+            str(doc['_id']) for doc in db[LOGS_COLLECTION].find({'status': RUN_STATUS_ACTIVE}, {'_id': 1})
+        }
+        live_run_ids.update(str(run_id) for run_id in db[CHECKPOINTS_COLLECTION].distinct('run_id'))
+    except Exception as e:
+        log.warning(f"{log_prefix} ⚠️ Не удалось получить активные запуски, очистка пропущена: {e}")
+        return
+
+    live = {staging_collection_name(run_id) for run_id in live_run_ids}
+    for name in existing:
+        if name.startswith(STAGING_COLLECTION_PREFIX) and name != keep and name not in live:
+            db.drop_collection(name)
+            log.info(f"{log_prefix} 🧹 Удалена брошенная коллекция '{name}'.")
+
+def _promote_staging_collection_sync(collection_name: str, log_prefix: str = "", expected_count: Optional[int] = None) -> int:
+    """
+    (Sync) Атомарно заменяет 'coin-sifter' промежуточной коллекцией
+    (renameCollection с dropTarget=True): читатели видят либо старый,
+    либо новый полный набор монет. Текущая версия предварительно
+    копируется в '<COINS_COLLECTION>__previous' (мгновенный откат).
+    Возвращает кол-во монет (0 = не заменено).
+    """
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.Promote]")
+    if client is None: return 0
+
+    try:
+        db = client[DB_NAME]
+        count = _validate_staging_collection(db, collection_name, expected_count, log_prefix)
+        if count == 0:
+            log.warning(f"{log_prefix} ⚠️ Замена '{COINS_COLLECTION}' на '{collection_name}' отменена.")
+            return 0
+
+        existing = db.list_collection_names()
+        if COINS_COLLECTION in existing:
+            db[COINS_COLLECTION].aggregate([{'$out': PREVIOUS_COINS_COLLECTION}])
+
+        db[collection_name].rename(COINS_COLLECTION, dropTarget=True)
+        log.info(f"{log_prefix} ✅ '{collection_name}' -> '{COINS_COLLECTION}' ({count} монет).")
+
+        _drop_orphaned_staging_collections(db, existing, collection_name, log_prefix)
+        return count
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка замены '{COINS_COLLECTION}' на '{collection_name}': {e}", exc_info=True)
+        return 0
+
+async def promote_staging_collection(collection_name: str, log_prefix: str = "", expected_count: Optional[int] = None) -> int:
+    """
+    (Async) Асинхронная обертка для _promote_staging_collection_sync.
+    """
+    return await asyncio.to_thread(_promote_staging_collection_sync, collection_name, log_prefix, expected_count)
+
+def _rollback_coins_collection_sync(log_prefix: str = "") -> int:
+    """
+    (Sync) Возвращает предыдущую версию 'coin-sifter' (атомарный rename
+    '<COINS_COLLECTION>__previous' -> 'coin-sifter'). Возвращает кол-во монет
+    (0 = предыдущей версии нет).
+    """
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.Rollback]")
+    if client is None: return 0
+
+    try:
+        db = client[DB_NAME]
+        count = _validate_staging_collection(db, PREVIOUS_COINS_COLLECTION, log_prefix=log_prefix)
+        if count == 0:
+            log.warning(f"{log_prefix} ⚠️ Предыдущей версии '{COINS_COLLECTION}' нет, откат невозможен.")
+            return 0
+
+        db[PREVIOUS_COINS_COLLECTION].rename(COINS_COLLECTION, dropTarget=True)
+        log.info(f"{log_prefix} ✅ Откат выполнен: '{COINS_COLLECTION}' = предыдущая версия ({count} монет).")
+        return count
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка отката '{COINS_COLLECTION}': {e}", exc_info=True)
+        return 0
+
+async def rollback_coins_collection(log_prefix: str = "") -> int:
+    """
+    (Async) Асинхронная обертка для _rollback_coins_collection_sync.
+    """
+    return await asyncio.to_thread(_rollback_coins_collection_sync, log_prefix)
+
+def _drop_collection_sync(collection_name: str, log_prefix: str = "") -> None:
     """
-    (Sync) Загружает ВСЕ монеты из коллекции 'coin-sifter'.
+    (Sync) Удаляет коллекцию (например, промежуточную коллекцию неудачного запуска).
     """
-    client = get_mongo_client(f"{log_prefix} [DB.Mongo.FetchAll]")
+    client = get_mongo_client(f"{log_prefix} [DB.Mongo.Drop]")
+    if client is None: return
+
+    try:
+        client[DB_NAME].drop_collection(collection_name)
+        log.info(f"{log_prefix} 🧹 Коллекция '{collection_name}' удалена.")
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка удаления коллекции '{collection_name}': {e}", exc_info=True)
+
+async def drop_collection(collection_name: str, log_prefix: str = "") -> None:
+    """
+    (Async) Асинхронная обертка для _drop_collection_sync.
+    """
+    await asyncio.to_thread(_drop_collection_sync, collection_name, log_prefix)
+
+
+async def get_all_coins_from_mongo_async(log_prefix: str = "") -> List[Dict[str, Any]]:
+    """
+    (Async) Загружает ВСЕ монеты из коллекции 'coin-sifter'.
+    """
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.FetchAll]")
     if client is None: return []
 
     log.info(f"{log_prefix} Загрузка ВСЕХ монет из MongoDB ('{COINS_COLLECTION}')...")
     
     try:
-        db = client[DB_NAME]
-        collection = db[COINS_COLLECTION]
+        collection = client[DB_NAME][COINS_COLLECTION]
         
-        # Загружаем все документы
-        coins_cursor = collection.find()
-        
-        # Конвертируем _id в str (для JSON-сериализации) и убираем его
-        coins_list = []
-        for doc in coins_cursor:
-            doc.pop('_id', None) # Убираем _id из словаря
-            coins_list.append(doc)
+        # Убираем _id (не сериализуется в JSON)
+        coins_list = [doc async for doc in collection.find({}, {'_id': 0})]
             
         log.info(f"{log_prefix} ✅ Успешно загружено {len(coins_list)} монет из MongoDB.")
         return coins_list
@@ -205,26 +652,58 @@ def _get_all_coins_from_mongo_sync(log_prefix: str = "") -> List[Dict[str, Any]]
         log.error(f"{log_prefix} ❌ Ошибка при загрузке монет из Mongo: {e}", exc_info=True)
         return []
 
-async def get_all_coins_from_mongo_async(log_prefix: str = "") -> List[Dict[str, Any]]:
+async def get_previous_coins_from_mongo_async(log_prefix: str = "") -> List[Dict[str, Any]]:
+    """
+    (Async) Монеты предыдущей версии (резервная копия перед последней заменой).
+    """
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.FetchPrevious]")
+    if client is None: return []
+
+    try:
+        collection = client[DB_NAME][PREVIOUS_COINS_COLLECTION]
+        coins_list = [doc async for doc in collection.find({}, {'_id': 0})]
+        log.info(f"{log_prefix} ✅ Загружено {len(coins_list)} монет предыдущей версии.")
+        return coins_list
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка при загрузке предыдущей версии монет: {e}", exc_info=True)
+        return []
+
+async def get_coins_meta_from_mongo_async(log_prefix: str = "") -> Dict[str, Dict[str, Any]]:
     """
-    (Async) Асинхронная обертка для _get_all_coins_from_mongo_sync.
+    (Async) Легкая выборка метаданных сохраненных монет (без метрик):
+    {full_symbol: {'category', 'analyzed_at', 'volume_24h_usd'}}.
     """
-    return await asyncio.to_thread(_get_all_coins_from_mongo_sync, log_prefix)
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.FetchMeta]")
+    if client is None: return {}
+
+    try:
+        collection = client[DB_NAME][COINS_COLLECTION]
+        cursor = collection.find(
+            {},
+            {'_id': 0, 'full_symbol': 1, 'category': 1, 'analyzed_at': 1, 'volume_24h_usd': 1}
+        )
+        meta = {doc['full_symbol']: doc async for doc in cursor if doc.get('full_symbol')}
+        log.info(f"{log_prefix} ✅ Загружены метаданные {len(meta)} сохраненных монет.")
+        return meta
+
+    except Exception as e:
+        log.error(f"{log_prefix} ❌ Ошибка при загрузке метаданных монет из Mongo: {e}", exc_info=True)
+        return {}
 
 # ============================================================================
 # LOG OPERATIONS
 # ============================================================================
 
-def _create_mongo_log_entry_sync(status: str, details: str = "") -> Optional[str]:
+async def create_mongo_log_entry(status: str, details: str = "") -> Optional[str]:
     """
-    (Sync) Создает новую запись лога в 'script_run_logs' и возвращает ее _id (как str).
+    (Async) Создает новую запись лога в 'script_run_logs' и возвращает ее _id (как str).
     """
-    client = get_mongo_client("[DB.Mongo.CreateLog]")
+    client = get_async_mongo_client("[DB.Mongo.CreateLog]")
     if client is None: return None
 
     try:
         db = client[DB_NAME]
-        collection = db[LOGS_COLLECTION]
+        await _ensure_async_indexes(db, "[DB.Mongo.CreateLog]")
         
         log_entry = {
             "start_time": datetime.now(timezone.utc),
@@ -234,7 +713,7 @@ def _create_mongo_log_entry_sync(status: str, details: str = "") -> Optional[str
             "coins_saved": 0
         }
         
-        result = collection.insert_one(log_entry)
+        result = await db[LOGS_COLLECTION].insert_one(log_entry)
         log_id_str = str(result.inserted_id)
         
         log.info(f"[DB.Mongo.CreateLog] ✅ Создана запись в логе. Run ID: {log_id_str}")
@@ -244,35 +723,26 @@ def _create_mongo_log_entry_sync(status: str, details: str = "") -> Optional[str
         log.error(f"❌ Error creating log entry in Mongo: {e}")
         return None
 
-async def create_mongo_log_entry(status: str, details: str = "") -> Optional[str]:
-    """
-    (Async) Асинхронная обертка для _create_mongo_log_entry_sync.
-    """
-    return await asyncio.to_thread(_create_mongo_log_entry_sync, status, details)
-
 
-def _update_mongo_log_status_sync(log_id_str: str, status: str, details: str = "", coins_saved: int = None):
+async def update_mongo_log_status(log_id_str: str, status: str, details: str = "", coins_saved: int = None):
     """
-    (Sync) Обновляет существующую запись лога в 'script_run_logs'.
+    (Async) Обновляет существующую запись лога в 'script_run_logs'.
     """
     if not log_id_str:
         log.warning("[DB.Mongo.UpdateLog] Пропущен вызов (log_id_str is None).")
         return
 
-    client = get_mongo_client(f"[DB.Mongo.UpdateLog ID: {log_id_str}]")
+    client = get_async_mongo_client(f"[DB.Mongo.UpdateLog ID: {log_id_str}]")
     if client is None: return
 
+    # Конвертируем str обратно в ObjectId
     try:
-        db = client[DB_NAME]
-        collection = db[LOGS_COLLECTION]
-        
-        # Конвертируем str обратно в ObjectId
-        try:
-            obj_id = ObjectId(log_id_str)
-        except Exception:
-            log.error(f"❌ Неверный формат log_id: '{log_id_str}'. Невозможно обновить лог.")
-            return
+        obj_id = ObjectId(log_id_str)
+    except Exception:
+        log.error(f"❌ Неверный формат log_id: '{log_id_str}'. Невозможно обновить лог.")
+        return
 
+    try:
         update_fields = {
             "status": status,
             "details": details,
@@ -282,7 +752,7 @@ def _update_mongo_log_status_sync(log_id_str: str, status: str, details: str = "
         if coins_saved is not None:
             update_fields["coins_saved"] = coins_saved
             
-        collection.update_one(
+        await client[DB_NAME][LOGS_COLLECTION].update_one(
             {"_id": obj_id},
             {"$set": update_fields}
         )
@@ -292,31 +762,45 @@ def _update_mongo_log_status_sync(log_id_str: str, status: str, details: str = "
     except Exception as e:
         log.error(f"❌ Error updating log {log_id_str} in Mongo: {e}")
 
-async def update_mongo_log_status(log_id_str: str, status: str, details: str = "", coins_saved: int = None):
+
+async def update_mongo_log_fields(log_id_str: str, fields: Dict[str, Any]):
     """
-    (Async) Асинхронная обертка для _update_mongo_log_status_sync.
+    (Async) Дописывает произвольные поля в запись лога (например, 'coverage').
     """
-    await asyncio.to_thread(_update_mongo_log_status_sync, log_id_str, status, details, coins_saved)
+    if not log_id_str or not fields:
+        return
 
+    client = get_async_mongo_client(f"[DB.Mongo.UpdateLogFields ID: {log_id_str}]")
+    if client is None: return
 
-def _get_mongo_logs_sync(limit: int = 50) -> List[Dict[str, Any]]:
+    try:
+        obj_id = ObjectId(log_id_str)
+    except Exception:
+        log.error(f"❌ Неверный формат log_id: '{log_id_str}'. Невозможно обновить лог.")
+        return
+
+    try:
+        await client[DB_NAME][LOGS_COLLECTION].update_one({"_id": obj_id}, {"$set": fields})
+        log.info(f"✅ Лог {log_id_str} дополнен полями: {list(fields)}")
+    except Exception as e:
+        log.error(f"❌ Error updating log fields {log_id_str} in Mongo: {e}")
+
+
+async def get_mongo_logs(limit: int = 50) -> List[Dict[str, Any]]:
     """
-    (Sync) Загружает последние N логов из 'script_run_logs'.
+    (Async) Загружает последние N логов из 'script_run_logs'.
     """
-    client = get_mongo_client("[DB.Mongo.FetchLogs]")
+    client = get_async_mongo_client("[DB.Mongo.FetchLogs]")
     if client is None: return []
 
     try:
-        db = client[DB_NAME]
-        collection = db[LOGS_COLLECTION]
-        
-        logs_cursor = collection.find(
+        logs_cursor = client[DB_NAME][LOGS_COLLECTION].find(
             {}, 
-            {'_id': 1, 'start_time': 1, 'end_time': 1, 'status': 1, 'details': 1, 'coins_saved': 1}
+            {'_id': 1, 'start_time': 1, 'end_time': 1, 'status': 1, 'details': 1, 'coins_saved': 1, 'coverage': 1, 'write_report': 1}
         ).sort("start_time", -1).limit(limit)
         
         logs = []
-        for doc in logs_cursor:
+        async for doc in logs_cursor:
             doc['id'] = str(doc.pop('_id')) # Конвертируем _id в 'id' (str)
             logs.append(doc)
             
@@ -327,30 +811,21 @@ def _get_mongo_logs_sync(limit: int = 50) -> List[Dict[str, Any]]:
         log.error(f"❌ Ошибка при загрузке логов из Mongo: {e}", exc_info=True)
         return []
 
-async def get_mongo_logs(limit: int = 50) -> List[Dict[str, Any]]:
-    """
-    (Async) Асинхронная обертка для _get_mongo_logs_sync.
-    """
-    return await asyncio.to_thread(_get_mongo_logs_sync, limit)
-
 
 # --- (НОВЫЙ БЛОК) Ручная очистка логов ---
 
-def _clear_all_mongo_logs_sync(log_prefix: str = "") -> int:
+async def clear_all_mongo_logs(log_prefix: str = "") -> int:
     """
-    (Sync) Полностью очищает коллекцию 'script_run_logs'.
+    (Async) Полностью очищает коллекцию 'script_run_logs'.
     """
-    client = get_mongo_client(f"{log_prefix} [DB.Mongo.ClearLogs]")
+    client = get_async_mongo_client(f"{log_prefix} [DB.Mongo.ClearLogs]")
     if client is None: return 0
 
     log.warning(f"{log_prefix} ⚠️ Запрос на ПОЛНУЮ ОЧИСТКУ коллекции '{LOGS_COLLECTION}'...")
     
     try:
-        db = client[DB_NAME]
-        collection = db[LOGS_COLLECTION]
-        
         # Полная очистка
-        result: DeleteResult = collection.delete_many({})
+        result: DeleteResult = await client[DB_NAME][LOGS_COLLECTION].delete_many({})
         deleted_count = result.deleted_count
         
         log.info(f"{log_prefix} ✅ Коллекция '{LOGS_COLLECTION}' очищена. Удалено документов: {deleted_count}")
@@ -360,10 +835,4 @@ def _clear_all_mongo_logs_sync(log_prefix: str = "") -> int:
         log.error(f"{log_prefix} ❌ Ошибка при очистке логов из Mongo: {e}", exc_info=True)
         return 0
 
-async def clear_all_mongo_logs(log_prefix: str = "") -> int:
-    """
-    (Async) Асинхронная обертка для _clear_all_mongo_logs_sync.
-    """
-    return await asyncio.to_thread(_clear_all_mongo_logs_sync, log_prefix)
-
-# --- (КОНЕЦ НОВОГО БЛОКА) ---
\ No newline at end of file
+# --- (КОНЕЦ НОВОГО БЛОКА) ---
@@ -0,0 +1,154 @@
+# services/screener.py
+
+"""
+Выражения скринера над колонками DATABASE_SCHEMA.
+
+    "hurst_4h > 0.55 and adx_above_25_pct_90d_4h > 40 and category >= 4"
+
+Текст разбирается модулем ast и проверяется по белому списку узлов
+(сравнения, and/or/not, + - * /, числа, имена числовых колонок) — код
+не исполняется. Результат компиляции — функция index -> булева маска
+NumPy, кэшируется по тексту выражения. NaN (нет метрики) в сравнении
+дает False; 'not' тоже не выбирает строки, где метрики условия нет.
+Константные подвыражения вычисляются при компиляции (деление на 0 ->
+ValueError).
+
+Именованные скрины (config.SAVED_SCREENS) считаются один раз на версию
+кэша (data_cache_service.build_filtered_views).
+"""
+
+import ast
+import logging
+import operator
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import config
+from .columnar_index import ColumnarIndex, is_numeric_column
+
+log = logging.getLogger(__name__)
+
+MAX_EXPRESSION_LENGTH = 1000
+
+_COMPARE_OPS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+_ARITHMETIC_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+
+def _referenced_columns(node: ast.AST) -> List[str]:
+    """Имена колонок, на которые ссылается узел."""
+    return sorted({child.id for child in ast.walk(node) if isinstance(child, ast.Name)})
+
+
+def _compile_value(node: ast.AST) -> Callable:
+    """Числовой узел -> функция index -> массив/число."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda index: value
+    if isinstance(node, ast.Name):
+        if not is_numeric_column(node.id):
+            raise ValueError(f"Unknown numeric column: '{node.id}'")
+        name = node.id
+        return lambda index: index.column(name)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _compile_value(node.operand)
+        return lambda index: -operand(index)
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC_OPS:
+        op = _ARITHMETIC_OPS[type(node.op)]
+        left, right = _compile_value(node.left), _compile_value(node.right)
+        if not _referenced_columns(node):
+            # Константа: считаем один раз (1/0 -> ошибка выражения, а не 500)
+            try:
+                value = float(op(left(None), right(None)))
+            except ZeroDivisionError:
+                raise ValueError(f"Division by zero: '{ast.unparse(node)}'")
+            return lambda index: value
+
+        def arithmetic(index):
+            # Деление на 0 -> inf/NaN (сравнение просто не пройдет)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return op(left(index), right(index))
+        return arithmetic
+    raise ValueError(f"Unsupported expression: '{ast.unparse(node)}'")
+
+
+def _compile_condition(node: ast.AST) -> Callable:
+    """Логический узел -> функция index -> булева маска."""
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_condition(value) for value in node.values]
+        reduce = np.logical_and.reduce if isinstance(node.op, ast.And) else np.logical_or.reduce
+        return lambda index: reduce([part(index) for part in parts])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile_condition(node.operand)
+        columns = _referenced_columns(node.operand)
+
+        def negate(index):
+            # 'not' не выбирает строки без метрики (как и сравнение с NaN)
+            mask = ~operand(index)
+            for name in columns:
+                mask &= ~np.isnan(index.column(name))
+            return mask
+        return negate
+    if isinstance(node, ast.Compare):
+        # Цепочка 0.5 < hurst_4h < 0.8 -> (0.5 < hurst_4h) & (hurst_4h < 0.8)
+        if any(type(op) not in _COMPARE_OPS for op in node.ops):
+            raise ValueError(f"Unsupported comparison: '{ast.unparse(node)}'")
+        values = [_compile_value(node.left)] + [_compile_value(c) for c in node.comparators]
+        ops = [_COMPARE_OPS[type(op)] for op in node.ops]
+
+        def compare(index):
+            operands = [value(index) for value in values]
+            mask = np.ones(index.size, dtype=bool)
+            for op, left, right in zip(ops, operands, operands[1:]):
+                mask &= op(left, right)
+            return mask
+        return compare
+    raise ValueError(f"Expression must be a condition: '{ast.unparse(node)}'")
+
+
+@lru_cache(maxsize=256)
+def compile_screen(expression: str) -> Callable[[ColumnarIndex], np.ndarray]:
+    """
+    Компилирует выражение (один раз на текст). ValueError — если
+    выражение не разбирается или выходит за белый список.
+    """
+    if not expression or len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression must be 1..{MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    return _compile_condition(tree.body)
+
+
+def screen_mask(index: ColumnarIndex, expression: str) -> np.ndarray:
+    """Булева маска строк индекса, удовлетворяющих выражению."""
+    return compile_screen(expression)(index)
+
+
+def build_saved_screens(index: ColumnarIndex, log_prefix: str = "[Screener]") -> Dict[str, np.ndarray]:
+    """
+    Маски именованных скринов (config.SAVED_SCREENS) для снимка.
+    Ошибочное выражение в конфиге пропускается (с ошибкой в логе).
+    """
+    screens = {}
+    for name, expression in config.SAVED_SCREENS.items():
+        try:
+            screens[name] = screen_mask(index, expression)
+        except ValueError as e:
+            log.error(f"{log_prefix} ❌ Скрин '{name}' пропущен: {e}")
+    return screens
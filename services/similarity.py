@@ -0,0 +1,104 @@
+# services/similarity.py
+
+"""
+Поиск похожих монет ("coins like this") по вектору метрик структуры.
+
+Признаки (config.SIMILARITY_FEATURES) берутся из колоночного индекса
+снимка и нормируются z-score (среднее/стд по снимку), поэтому Hurst
+(~0.5) и фрактальная размерность (~1..2) весят одинаково. Пропуски = среднее (0 после
+нормировки). По матрице один раз на версию кэша строится KD-дерево
+(scipy.spatial.cKDTree): запрос k соседей — O(log n).
+"""
+
+import logging
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import config
+from .columnar_index import ColumnarIndex
+
+log = logging.getLogger(__name__)
+
+
+class SimilarityIndex:
+    """
+    Нормированная матрица признаков снимка + KD-дерево.
+    """
+
+    def __init__(self, index: ColumnarIndex, features: Optional[List[str]] = None):
+        self.index = index
+        self.features = list(features or config.SIMILARITY_FEATURES)
+        matrix = np.column_stack([index.column(f) for f in self.features])
+
+        # Монеты без единой метрики в дерево не попадают
+        self.rows = np.flatnonzero(~np.isnan(matrix).all(axis=1))
+        matrix = matrix[self.rows]
+
+        with warnings.catch_warnings():
+            # Пустой снимок / колонка без значений -> NaN (заменяются ниже)
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(matrix, axis=0)
+            std = np.nanstd(matrix, axis=0)
+        self.mean = np.nan_to_num(mean)
+        self.std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+
+        self.matrix = self._normalize(matrix)
+        self.tree = cKDTree(self.matrix) if len(self.matrix) else None
+        self._positions = {int(row): pos for pos, row in enumerate(self.rows)}
+        self._by_symbol = {
+            coin.get('symbol'): i for i, coin in enumerate(index.coins) if coin.get('symbol')
+        }
+
+    def _normalize(self, values: np.ndarray) -> np.ndarray:
+        return np.nan_to_num((values - self.mean) / self.std, nan=0.0)
+
+    def _row_of(self, symbol: str) -> Optional[int]:
+        row = self.index.row_of(symbol)
+        return row if row is not None else self._by_symbol.get(symbol)
+
+    def vector_of(self, symbol: str) -> Optional[np.ndarray]:
+        """Нормированный вектор монеты (full_symbol или symbol)."""
+        row = self._row_of(symbol)
+        if row is None or row not in self._positions:
+            return None
+        return self.matrix[self._positions[row]]
+
+    def vector_from_values(self, values: Dict[str, float]) -> np.ndarray:
+        """Нормированный вектор из {признак: значение}; пропуски = среднее."""
+        unknown = [name for name in values if name not in self.features]
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(unknown)}. Supported: {', '.join(self.features)}")
+        raw = np.array([values.get(f, np.nan) for f in self.features], dtype=np.float64)
+        return self._normalize(raw)
+
+    def nearest(self, vector: np.ndarray, k: int = 10, exclude_row: Optional[int] = None) -> List[Dict[str, Any]]:
+        """k ближайших монет: [{'full_symbol', 'symbol', 'distance', <признаки>}]."""
+        if self.tree is None:
+            return []
+        count = min(k + (1 if exclude_row is not None else 0), len(self.rows))
+        distances, positions = self.tree.query(vector, k=count)
+        distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+
+        result = []
+        for distance, pos in zip(distances, positions):
+            row = int(self.rows[pos])
+            if row == exclude_row:
+                continue
+            coin = self.index.coins[row]
+            result.append({
+                'full_symbol': coin.get('full_symbol'),
+                'symbol': coin.get('symbol'),
+                'distance': float(distance),
+                **{f: coin.get(f) for f in self.features}
+            })
+        return result[:k]
+
+    def similar_to(self, symbol: str, k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Похожие на монету (без нее самой). None — монеты нет в снимке."""
+        vector = self.vector_of(symbol)
+        if vector is None:
+            return None
+        return self.nearest(vector, k, exclude_row=self._row_of(symbol))
@@ -0,0 +1,82 @@
+# tests/test_analysis_deadline.py
+
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+
+from analysis.deadline import RunDeadline
+from analysis.stage_3_wave_binance import run_binance_wave
+from services import exchange_controller
+
+# --- Данные для моков ---
+
+def _coin(symbol, volume):
+    return {'symbol': symbol, 'full_symbol': f"{symbol}:USDT", 'volume_24h_usd': volume, 'exchanges': ['binanceusdm']}
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def reset_controllers(mocker):
+    mocker.patch('config.ANALYSIS_BATCH_SIZE', 2)
+    exchange_controller.reset_controllers()
+    yield
+    exchange_controller.reset_controllers()
+
+
+@pytest.fixture
+def mock_exchange():
+    mock_ex = MagicMock()
+    mock_ex.id = 'binanceusdm'
+    return mock_ex
+
+# --- Тесты ---
+
+def test_run_deadline_budget(mocker):
+    mock_time = mocker.patch('analysis.deadline.time.monotonic', return_value=100.0)
+    deadline = RunDeadline(300, reserve_seconds=60)
+
+    assert deadline.enabled
+    assert deadline.work_time_left() == 240.0
+    assert deadline.cap_timeout(500.0) == 240.0
+    assert not deadline.should_stop_scheduling()
+
+    mock_time.return_value = 100.0 + 250
+    assert deadline.should_stop_scheduling()
+    assert deadline.hit
+
+    unlimited = RunDeadline(None)
+    assert not unlimited.enabled
+    assert unlimited.cap_timeout(500.0) == 500.0
+    assert not unlimited.should_stop_scheduling()
+
+
+@pytest.mark.asyncio
+async def test_wave_processes_by_volume_and_stops_at_deadline(mocker, mock_exchange):
+    """
+    Пачка 1 (самые ликвидные) успевает, медленная монета отменяется
+    по дедлайну, пачка 2 не планируется.
+    """
+    delays = {'BIG/USDT': 0.01, 'MID/USDT': 5.0, 'SMALL/USDT': 0.01, 'TINY/USDT': 0.01}
+    started = []
+
+    async def fake_analyze(coin_data, exchange, btc_cache_1d, df_1d, log_prefix="", run_cache=None):
+        started.append(coin_data['symbol'])
+        await asyncio.sleep(delays[coin_data['symbol']])
+        return {'symbol': coin_data['symbol']}, None, 0
+
+    mocker.patch('analysis.stage_3_wave_binance._analyze_with_retry', side_effect=fake_analyze)
+
+    coins = {
+        'TINY/USDT': (_coin('TINY/USDT', 1e6), None),
+        'BIG/USDT': (_coin('BIG/USDT', 9e8), None),
+        'SMALL/USDT': (_coin('SMALL/USDT', 5e6), None),
+        'MID/USDT': (_coin('MID/USDT', 5e7), None),
+    }
+    deadline = RunDeadline(0.2, reserve_seconds=0.0)
+
+    results, skipped = await run_binance_wave(coins, mock_exchange, None, "[Test]", deadline=deadline)
+
+    assert started == ['BIG/USDT', 'MID/USDT']
+    assert [r['symbol'] for r in results] == ['BIG/USDT']
+    assert skipped == {'MID/USDT', 'SMALL/USDT', 'TINY/USDT'}
+    assert deadline.hit
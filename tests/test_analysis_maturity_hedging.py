@@ -0,0 +1,144 @@
+# tests/test_analysis_maturity_hedging.py
+
+import pytest
+import asyncio
+import pandas as pd
+from unittest.mock import MagicMock
+
+from analysis.stage_2_maturity import HedgePolicy, _check_coin_maturity_task
+
+# --- Данные для моков ---
+
+DF_1D = pd.DataFrame({'close': range(200)})
+
+COIN = {'symbol': 'SOL/USDT:USDT', 'full_symbol': 'SOL/USDT:USDT:USDT', 'exchanges': ['binanceusdm', 'bybit']}
+
+EXCHANGES = {'binanceusdm': MagicMock(), 'bybit': MagicMock()}
+
+
+def _fake_check(delays, results, calls):
+    """Фейковая проверка одной биржи: задержка + заданный результат."""
+    async def _check(coin_data, exchange_obj, exchange_id, log_prefix_task):
+        calls.append(exchange_id)
+        await asyncio.sleep(delays[exchange_id])
+        return results[exchange_id]
+    return _check
+
+# --- Тесты ---
+
+def test_hedge_delay_uses_default_until_enough_samples():
+    policy = HedgePolicy(percentile=0.9, default_delay=7.0, min_samples=5)
+    assert policy.hedge_delay('binanceusdm') == 7.0
+
+    for seconds in [2.0, 2.0, 2.0, 2.0, 3.0]:
+        policy.record('binanceusdm', seconds)
+
+    assert policy.hedge_delay('binanceusdm') == 3.0
+    assert policy.hedge_delay('bybit') == 7.0
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_does_not_start_fallback(mocker):
+    calls = []
+    mocker.patch(
+        'analysis.stage_2_maturity._maturity_check_single_exchange',
+        side_effect=_fake_check(
+            {'binanceusdm': 0.01, 'bybit': 0.01},
+            {'binanceusdm': (DF_1D, None), 'bybit': (DF_1D, None)},
+            calls
+        )
+    )
+    policy = HedgePolicy(default_delay=1.0)
+
+    _, df_1d, skip_reason, exchange_id = await _check_coin_maturity_task(COIN, EXCHANGES, None, "[Test]", policy)
+
+    assert df_1d is DF_1D and skip_reason is None
+    assert exchange_id == 'binanceusdm'
+    assert calls == ['binanceusdm']
+    assert len(policy.latencies['binanceusdm']) == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged(mocker):
+    calls = []
+    mocker.patch(
+        'analysis.stage_2_maturity._maturity_check_single_exchange',
+        side_effect=_fake_check(
+            {'binanceusdm': 5.0, 'bybit': 0.01},
+            {'binanceusdm': (DF_1D, None), 'bybit': (DF_1D, None)},
+            calls
+        )
+    )
+    policy = HedgePolicy(default_delay=0.05)
+
+    _, df_1d, _, exchange_id = await _check_coin_maturity_task(COIN, EXCHANGES, None, "[Test]", policy)
+
+    assert exchange_id == 'bybit'
+    assert calls == ['binanceusdm', 'bybit']
+    assert policy.stats['hedged'] == 1
+    # Отмененный запрос не "учит" политику
+    assert 'binanceusdm' not in policy.latencies
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_back(mocker):
+    calls = []
+    mocker.patch(
+        'analysis.stage_2_maturity._maturity_check_single_exchange',
+        side_effect=_fake_check(
+            {'binanceusdm': 0.01, 'bybit': 0.01},
+            {'binanceusdm': (None, "Maturity (Need 180, Got 90 on binanceusdm)"), 'bybit': (DF_1D, None)},
+            calls
+        )
+    )
+    policy = HedgePolicy(default_delay=1.0)
+
+    _, df_1d, _, exchange_id = await _check_coin_maturity_task(COIN, EXCHANGES, None, "[Test]", policy)
+
+    assert exchange_id == 'bybit' and df_1d is DF_1D
+    assert policy.stats['fallback_after_failure'] == 1
+    assert policy.stats['hedged'] == 0
+
+
+@pytest.mark.asyncio
+async def test_all_exchanges_fail_returns_last_error(mocker):
+    calls = []
+    mocker.patch(
+        'analysis.stage_2_maturity._maturity_check_single_exchange',
+        side_effect=_fake_check(
+            {'binanceusdm': 0.01, 'bybit': 0.01},
+            {'binanceusdm': (None, "Maturity (Timeout on binanceusdm)"),
+             'bybit': (None, "Maturity (Need 180, Got 30 on bybit)")},
+            calls
+        )
+    )
+
+    _, df_1d, skip_reason, exchange_id = await _check_coin_maturity_task(COIN, EXCHANGES, None, "[Test]", HedgePolicy())
+
+    assert df_1d is None and exchange_id is None
+    assert skip_reason == "Maturity (Need 180, Got 30 on bybit)"
+
+
+@pytest.mark.asyncio
+async def test_cancel_during_hedge_delay_cancels_primary_fetch(mocker):
+    """Таймаут батча отменяет монету во время задержки хеджа -> запрос к бирже тоже отменяется."""
+    cancelled = []
+
+    async def _slow_check(coin_data, exchange_obj, exchange_id, log_prefix_task):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(exchange_id)
+            raise
+
+    mocker.patch('analysis.stage_2_maturity._maturity_check_single_exchange', side_effect=_slow_check)
+    policy = HedgePolicy(default_delay=5.0)
+
+    coin_task = asyncio.create_task(_check_coin_maturity_task(COIN, EXCHANGES, None, "[Test]", policy))
+    await asyncio.sleep(0.05)
+    coin_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await coin_task
+    await asyncio.sleep(0)
+
+    assert cancelled == ['binanceusdm']
@@ -0,0 +1,123 @@
+# tests/test_analysis_maturity_prescreen.py
+
+import pytest
+import time
+import pandas as pd
+from unittest.mock import AsyncMock, MagicMock
+
+from analysis import stage_2_prescreen
+from analysis.stage_2_prescreen import (
+    get_listing_timestamp_ms,
+    prescreen_maturity,
+    remember_mature,
+    load_known_mature,
+    MS_PER_DAY
+)
+from analysis.stage_2_maturity import run_maturity_stage
+
+# --- Данные для моков ---
+
+NOW_MS = int(time.time() * 1000)
+
+
+def _coin(symbol, exchanges=('binanceusdm',)):
+    return {'symbol': symbol, 'full_symbol': f"{symbol}:USDT", 'exchanges': list(exchanges)}
+
+
+def _market(age_days, key='created'):
+    ts = NOW_MS - int(age_days * MS_PER_DAY)
+    if key == 'created':
+        return {'created': ts, 'info': {}}
+    return {'created': None, 'info': {key: str(ts)}}
+
+
+MOCK_MARKETS_MAP = {
+    'binanceusdm': {
+        'OLD/USDT:USDT': _market(400),
+        'NEW/USDT:USDT': _market(30),
+        'EDGE/USDT:USDT': _market(181),
+        'NODATE/USDT:USDT': {'info': {}},
+    },
+    'bybit': {
+        'BYB/USDT:USDT': _market(365, key='launchTime'),
+    }
+}
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def isolate_known_mature(tmp_path, mocker):
+    """Кэш известных зрелых -> временный файл, память сброшена."""
+    mocker.patch('config.MATURITY_CACHE_PATH', str(tmp_path / "known_mature.json"))
+    mocker.patch('config.MIN_CANDLES_FOR_MATURITY', 180)
+    mocker.patch('config.MATURITY_PRESCREEN_MARGIN_DAYS', 5)
+    stage_2_prescreen._known_mature = None
+    yield
+    stage_2_prescreen._known_mature = None
+
+# --- Тесты ---
+
+def test_get_listing_timestamp_ms():
+    assert get_listing_timestamp_ms({'created': 1590739200000}) == 1590739200000
+    assert get_listing_timestamp_ms({'info': {'onboardDate': '1590739200000'}}) == 1590739200000
+    assert get_listing_timestamp_ms({'info': {'launchTime': '0'}}) is None
+    assert get_listing_timestamp_ms({}) is None
+
+
+def test_prescreen_splits_by_listing_age():
+    coins = [
+        _coin('OLD/USDT:USDT'),
+        _coin('NEW/USDT:USDT'),
+        _coin('EDGE/USDT:USDT'),
+        _coin('NODATE/USDT:USDT'),
+        _coin('BYB/USDT:USDT', exchanges=('bybit',)),
+    ]
+
+    accepted, borderline, rejected = prescreen_maturity(coins, MOCK_MARKETS_MAP, "[Test]")
+
+    assert {c['symbol'] for c in accepted} == {'OLD/USDT:USDT', 'BYB/USDT:USDT'}
+    assert {c['symbol'] for c in borderline} == {'EDGE/USDT:USDT', 'NODATE/USDT:USDT'}
+    assert sum(rejected.values(), []) == ['NEW/USDT:USDT']
+
+
+def test_prescreen_uses_known_mature_cache():
+    remember_mature(['NODATE/USDT:USDT:USDT'], "[Test]")
+
+    # "Рестарт": память сброшена, кэш читается с диска
+    stage_2_prescreen._known_mature = None
+    assert 'NODATE/USDT:USDT:USDT' in load_known_mature()
+
+    accepted, borderline, _ = prescreen_maturity([_coin('NODATE/USDT:USDT')], MOCK_MARKETS_MAP, "[Test]")
+
+    assert [c['symbol'] for c in accepted] == ['NODATE/USDT:USDT']
+    assert borderline == []
+
+
+@pytest.mark.asyncio
+async def test_run_maturity_stage_fetches_only_borderline(mocker):
+    """Свечи 1d загружаются ТОЛЬКО для пограничных монет."""
+    df_1d = pd.DataFrame({'close': range(181)})
+    mock_fetch = mocker.patch(
+        "analysis.stage_2_maturity.data_fetcher.fetch_all_ohlcv_data",
+        new_callable=AsyncMock,
+        return_value={'1d': df_1d}
+    )
+    mock_ex = MagicMock()
+    mock_ex.id = 'binanceusdm'
+
+    coins = [_coin('OLD/USDT:USDT'), _coin('NEW/USDT:USDT'), _coin('EDGE/USDT:USDT')]
+
+    mature_map, skipped = await run_maturity_stage(
+        coins, {'binanceusdm': mock_ex}, None, "[Test]", markets_map=MOCK_MARKETS_MAP
+    )
+
+    assert mock_fetch.await_count == 1
+    assert mock_fetch.await_args.args[1] == 'EDGE/USDT:USDT'
+
+    assert mature_map['OLD/USDT:USDT'][1] is None        # принята по дате листинга
+    assert mature_map['EDGE/USDT:USDT'][1] is df_1d      # принята по свечам
+    assert 'NEW/USDT:USDT' not in mature_map
+    assert any('NEW/USDT:USDT' in s for s in skipped.values())
+
+    # Зрелые монеты запомнены для следующих запусков
+    assert load_known_mature() == {'OLD/USDT:USDT:USDT', 'EDGE/USDT:USDT:USDT'}
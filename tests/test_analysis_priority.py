@@ -0,0 +1,52 @@
+# tests/test_analysis_priority.py
+
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from analysis.priority import prioritize_coins, priority_sort_key
+
+# --- Данные для моков ---
+
+NOW = datetime(2025, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _coin(symbol, volume):
+    return {'symbol': symbol, 'full_symbol': f"{symbol}:USDT", 'volume_24h_usd': volume}
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def priority_config(mocker):
+    mocker.patch('config.PRIORITY_WEIGHTS', {'volume': 0.6, 'category': 0.2, 'staleness': 0.2})
+    mocker.patch('config.PRIORITY_STALENESS_HORIZON_HOURS', 24)
+
+# --- Тесты ---
+
+def test_volume_only_without_history():
+    coins = [_coin('LOW/USDT', 1e6), _coin('HIGH/USDT', 1e9), _coin('MID/USDT', 5e7)]
+
+    ordered = prioritize_coins(coins, {}, now=NOW)
+
+    assert [c['symbol'] for c in ordered] == ['HIGH/USDT', 'MID/USDT', 'LOW/USDT']
+    assert all('_priority' in c for c in ordered)
+
+
+def test_staleness_and_category_can_outrank_volume():
+    """
+    У A объем чуть выше, но его метрики свежие и категория низкая;
+    у B метрики устарели на сутки и категория высокая -> B первым.
+    """
+    coins = [_coin('A/USDT', 2e8), _coin('B/USDT', 1e8), _coin('C/USDT', 1e6)]
+    previous_meta = {
+        'A/USDT:USDT': {'category': 1, 'analyzed_at': NOW - timedelta(minutes=10)},
+        'B/USDT:USDT': {'category': 6, 'analyzed_at': (NOW - timedelta(hours=30)).replace(tzinfo=None)},
+    }
+
+    ordered = prioritize_coins(coins, previous_meta, now=NOW)
+
+    assert [c['symbol'] for c in ordered] == ['B/USDT', 'A/USDT', 'C/USDT']
+
+
+def test_sort_key_falls_back_to_volume():
+    coins = [_coin('X/USDT', 1.0), _coin('Y/USDT', 2.0)]
+    assert sorted(coins, key=priority_sort_key, reverse=True)[0]['symbol'] == 'Y/USDT'
@@ -0,0 +1,119 @@
+# tests/test_analysis_refresh.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from analysis.refresh import due_timeframes, plan_refresh, merge_with_previous
+from analysis.stage_3_wave_binance import _analyze_coin_metrics_task
+from metrics.calculator import metric_timeframe
+
+# --- Данные для моков ---
+
+NOW = datetime(2025, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+COIN = {
+    'symbol': 'SOL/USDT:USDT', 'full_symbol': 'SOL/USDT:USDT:USDT', 'name': 'SOL',
+    'quoteCurrency': 'USDT', 'usdPrice': 100.0, 'volume_24h_usd': 1e8,
+    'change24h': 1.0, 'exchanges': ['binanceusdm'], 'logoUrl': None
+}
+
+
+def _make_df(rows=300):
+    index = pd.date_range('2025-01-01', periods=rows, freq='h', name='timestamp')
+    close = 100 + np.cumsum(np.random.default_rng(1).normal(0, 1, rows))
+    return pd.DataFrame(
+        {'open': close, 'high': close + 1, 'low': close - 1, 'close': close, 'volume': 1000.0},
+        index=index
+    )
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def refresh_config(mocker):
+    mocker.patch('config.TIMEFRAME_REFRESH_HOURS', {'1h': 1, '2h': 2, '4h': 4, '12h': 12, '1d': 24})
+    mocker.patch('config.TIMEFRAME_REFRESH_TOLERANCE_MINUTES', 5)
+
+# --- Тесты ---
+
+def test_due_timeframes_by_cadence():
+    stamps = {tf: NOW - timedelta(hours=3) for tf in ['1h', '2h', '4h', '12h', '1d']}
+    assert due_timeframes(stamps, NOW) == ['1h', '2h']
+
+    # Допуск: пересчитан 58 минут назад -> 1h уже "просрочен"
+    stamps['1h'] = (NOW - timedelta(minutes=58)).replace(tzinfo=None)
+    assert due_timeframes(stamps, NOW) == ['1h', '2h']
+
+    assert due_timeframes(None, NOW) == ['1h', '2h', '4h', '12h', '1d']
+
+
+def test_plan_refresh_marks_coins():
+    fresh = {tf: NOW - timedelta(minutes=30) for tf in ['1h', '2h', '4h', '12h', '1d']}
+    coins = [dict(COIN), {**COIN, 'full_symbol': 'NEW/USDT:USDT:USDT'}]
+
+    summary = plan_refresh(coins, {COIN['full_symbol']: {'analyzed_at_tf': fresh}}, now=NOW)
+
+    assert coins[0]['_due_timeframes'] == []
+    assert coins[1]['_due_timeframes'] == ['1h', '2h', '4h', '12h', '1d']
+    assert summary == {'1h': 1, '2h': 1, '4h': 1, '12h': 1, '1d': 1}
+
+
+def test_merge_keeps_metrics_of_not_refreshed_timeframes():
+    old_stamp = NOW - timedelta(hours=10)
+    previous = {
+        'hurst_1h': 0.4, 'hurst_1d': 0.7, 'trend_quality_1d_w20': 0.9,
+        'btc_corr_stability_correlation_std': 0.1, 'usdPrice': 90.0,
+        'analyzed_at_tf': {'1h': old_stamp, '1d': old_stamp}
+    }
+    result = {'hurst_1h': 0.5, 'usdPrice': 100.0, 'analyzed_at_tf': {'1h': NOW}}
+
+    merged = merge_with_previous(result, previous)
+
+    assert merged['hurst_1h'] == 0.5
+    assert merged['usdPrice'] == 100.0
+    assert merged['hurst_1d'] == 0.7
+    assert merged['trend_quality_1d_w20'] == 0.9
+    assert merged['btc_corr_stability_correlation_std'] == 0.1
+    assert merged['analyzed_at_tf'] == {'1h': NOW, '1d': old_stamp}
+
+
+def test_metric_timeframe():
+    assert metric_timeframe('trend_quality_12h_w20') == '12h'
+    assert metric_timeframe('btc_corr_1d_w30') == '1d'
+    assert metric_timeframe('usdPrice') is None
+
+
+@pytest.mark.asyncio
+async def test_wave_task_fetches_only_due_timeframes(mocker):
+    fetch = mocker.patch(
+        'analysis.stage_3_wave_binance.data_fetcher.fetch_all_ohlcv_data',
+        return_value={'1h': _make_df()}
+    )
+    mock_exchange = MagicMock()
+    mock_exchange.id = 'binanceusdm'
+    coin = {**COIN, '_due_timeframes': ['1h']}
+
+    final_data, error = await _analyze_coin_metrics_task(coin, mock_exchange, pd.DataFrame(), _make_df())
+
+    assert error is None
+    assert list(fetch.call_args.args[2]) == ['1h']
+    assert list(final_data['analyzed_at_tf']) == ['1h']
+    assert 'hurst_1h' in final_data
+    assert not any(metric_timeframe(k) == '1d' for k in final_data if k != 'analyzed_at_tf')
+
+
+@pytest.mark.asyncio
+async def test_wave_task_nothing_due_skips_fetch(mocker):
+    fetch = mocker.patch('analysis.stage_3_wave_binance.data_fetcher.fetch_all_ohlcv_data')
+    mock_exchange = MagicMock()
+    mock_exchange.id = 'binanceusdm'
+
+    final_data, error = await _analyze_coin_metrics_task(
+        {**COIN, '_due_timeframes': []}, mock_exchange, pd.DataFrame(), None
+    )
+
+    assert error is None
+    assert final_data['analyzed_at_tf'] == {}
+    fetch.assert_not_called()
@@ -0,0 +1,120 @@
+# tests/test_analysis_staging.py
+
+import pytest
+from unittest.mock import MagicMock
+
+from analysis.staging import StagedResults
+from services import mongo_service
+
+# --- Данные для моков ---
+
+def _result(symbol, **metrics):
+    return {'symbol': symbol, 'full_symbol': f"{symbol}:USDT", 'volume_24h_usd': 1e6, **metrics}
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture
+def fake_staging(mocker):
+    """Промежуточная коллекция в памяти вместо MongoDB."""
+    store = {'docs': {}, 'promoted': None, 'expected_count': None}
+
+    async def write(collection_name, docs, log_prefix=""):
+        for doc in docs:
+            store['docs'][doc['full_symbol']] = dict(doc)
+        return len(docs)
+
+    async def set_fields(collection_name, fields_by_symbol, log_prefix=""):
+        for full_symbol, fields in fields_by_symbol.items():
+            store['docs'][full_symbol].update(fields)
+        return len(fields_by_symbol)
+
+    async def promote(collection_name, log_prefix="", expected_count=None):
+        if expected_count is not None and expected_count != len(store['docs']):
+            return 0
+        store['promoted'] = collection_name
+        store['expected_count'] = expected_count
+        return len(store['docs'])
+
+    mocker.patch('config.STAGED_WRITES_ENABLED', True)
+    mocker.patch('analysis.staging.mongo_service.prepare_staging_collection', return_value=True)
+    mocker.patch('analysis.staging.mongo_service.write_coins_chunk', side_effect=write)
+    mocker.patch('analysis.staging.mongo_service.set_coins_fields', side_effect=set_fields)
+    mocker.patch('analysis.staging.mongo_service.promote_staging_collection', side_effect=promote)
+    return store
+
+# --- Тесты ---
+
+@pytest.mark.asyncio
+async def test_chunks_are_merged_and_promoted(fake_staging):
+    previous = {'A/USDT:USDT': {'hurst_1d': 0.7, 'analyzed_at_tf': {'1d': 'old'}}}
+    staging = StagedResults('run-1', previous, "[Test]")
+    await staging.start()
+
+    await staging.write([_result('A/USDT', hurst_1h=0.5, analyzed_at_tf={'1h': 'new'})])
+    await staging.write([_result('B/USDT', hurst_1h=0.4)])
+    saved = await staging.promote({'A/USDT:USDT': 6, 'B/USDT:USDT': 1}, expected_count=2)
+
+    assert saved == 2
+    assert fake_staging['promoted'] == 'coin-sifter__staging_run-1'
+    assert fake_staging['expected_count'] == 2
+    doc_a = fake_staging['docs']['A/USDT:USDT']
+    assert doc_a['hurst_1d'] == 0.7 and doc_a['hurst_1h'] == 0.5
+    assert doc_a['is_stale'] is False
+    assert doc_a['category'] == 6
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_blocks_promotion(fake_staging, mocker):
+    mocker.patch('analysis.staging.mongo_service.write_coins_chunk', return_value=0)
+    staging = StagedResults('run-2', log_prefix="[Test]")
+    await staging.start()
+
+    await staging.write([_result('A/USDT')])
+
+    assert not staging.usable
+    assert await staging.promote({}) == 0
+    assert fake_staging['promoted'] is None
+
+
+@pytest.mark.asyncio
+async def test_promote_rejects_unexpected_count(fake_staging):
+    staging = StagedResults('run-5', log_prefix="[Test]")
+    await staging.start()
+
+    await staging.write([_result('A/USDT')])
+
+    assert await staging.promote({}, expected_count=2) == 0
+    assert fake_staging['promoted'] is None
+
+
+def test_promote_renames_with_drop_target(mocker):
+    mock_collection = MagicMock()
+    # Документов без 'full_symbol' нет
+    mock_collection.count_documents.side_effect = lambda query: 0 if 'full_symbol' in query else 3
+    mock_collection.find.return_value = [{'_id': 'run-active'}]
+    mock_collection.distinct.return_value = ['run-resumable']
+    mock_db = MagicMock()
+    mock_db.__getitem__.return_value = mock_collection
+    mock_db.list_collection_names.return_value = [
+        'coin-sifter',
+        'coin-sifter__staging_old',
+        'coin-sifter__staging_run-active',
+        'coin-sifter__staging_run-resumable',
+    ]
+    mock_client = MagicMock()
+    mock_client.__getitem__.return_value = mock_db
+    mocker.patch.object(mongo_service, 'get_mongo_client', return_value=mock_client)
+
+    assert mongo_service._promote_staging_collection_sync('coin-sifter__staging_run-3', "[Test]", expected_count=3) == 3
+    mock_collection.rename.assert_called_once_with('coin-sifter', dropTarget=True)
+    # Коллекции активного и прерванного (с контрольными точками) запусков остаются
+    mock_db.drop_collection.assert_called_once_with('coin-sifter__staging_old')
+
+    # Неполная промежуточная коллекция не подменяет рабочую
+    mock_collection.rename.reset_mock()
+    assert mongo_service._promote_staging_collection_sync('coin-sifter__staging_run-4', "[Test]", expected_count=5) == 0
+    mock_collection.rename.assert_not_called()
+
+    # Пустая промежуточная коллекция не подменяет рабочую
+    mock_collection.count_documents.side_effect = lambda query: 0
+    assert mongo_service._promote_staging_collection_sync('coin-sifter__staging_run-4', "[Test]") == 0
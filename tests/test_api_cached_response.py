@@ -0,0 +1,90 @@
+# tests/test_api_cached_response.py
+
+import pytest
+import httpx
+from httpx import ASGITransport
+from fastapi import FastAPI, Request
+
+from api.cached_response import cached_response, etag_matches, choose_encoding
+from services.data_cache_service import prepare_body, dumps_json
+
+# --- Мини-приложение с готовым телом ---
+
+PREPARED = prepare_body(dumps_json({"count": 1, "data": [{"symbol": "BTC/USDT:USDT", "hurst_4h": 0.61}]}), "application/json")
+
+LARGE_DATA = [{"symbol": f"C{i}/USDT:USDT", "hurst_4h": 0.5 + i / 1e4} for i in range(500)]
+LARGE = prepare_body(dumps_json({"count": len(LARGE_DATA), "data": LARGE_DATA}), "application/json")
+
+app = FastAPI()
+
+
+@app.get("/view")
+async def view(request: Request):
+    return cached_response(request, PREPARED)
+
+
+@app.get("/large")
+async def large(request: Request):
+    return cached_response(request, LARGE)
+
+# --- Тесты ---
+
+def test_etag_matches_handles_lists_weak_tags_and_wildcard():
+    etag = PREPARED["etag"]
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_view_returns_empty_304():
+    async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.get("/view")
+        assert first.status_code == 200
+        assert first.json() == {"count": 1, "data": [{"symbol": "BTC/USDT:USDT", "hurst_4h": 0.61}]}
+
+        second = await client.get("/view", headers={"If-None-Match": first.headers["etag"]})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == first.headers["etag"]
+
+
+def test_choose_encoding_respects_q_values_and_availability():
+    available = {"gzip": {}, "br": {}}
+
+    assert choose_encoding("gzip, deflate, br", available) == "br"
+    assert choose_encoding("gzip, br;q=0.5", available) == "gzip"
+    assert choose_encoding("br;q=0, gzip;q=0", available) is None
+    assert choose_encoding("*", {"gzip": {}}) == "gzip"
+    assert choose_encoding("identity", available) is None
+    assert choose_encoding("gzip", {}) is None
+
+
+@pytest.mark.asyncio
+async def test_large_view_is_served_precompressed():
+    assert "gzip" in LARGE["encoded"] and not PREPARED["encoded"]
+
+    async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == len(LARGE["encoded"]["gzip"]["body"])
+        assert response.json()["count"] == 500
+
+        plain = await client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.content == LARGE["body"]
+
+        br = await client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+        assert br.headers["content-encoding"] == "br"
+        assert br.content == LARGE["body"]
+        assert br.headers["etag"] == LARGE["encoded"]["br"]["etag"]
+
+        # ETag сжатого варианта тоже дает 304
+        cached = await client.get("/large", headers={
+            "Accept-Encoding": "identity", "If-None-Match": response.headers["etag"]
+        })
+        assert cached.status_code == 304
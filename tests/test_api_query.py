@@ -0,0 +1,49 @@
+# tests/test_api_query.py
+
+import pytest
+import httpx
+from httpx import ASGITransport
+from fastapi import FastAPI
+
+from api.endpoints.query import query_router
+from api.security import verify_token
+from services.columnar_index import ColumnarIndex
+
+# --- Мини-приложение с роутером запросов ---
+
+COINS = [
+    {"full_symbol": "A/USDT:USDT:USDT", "symbol": "A/USDT:USDT", "hurst_4h": 0.70, "category": 5},
+    {"full_symbol": "B/USDT:USDT:USDT", "symbol": "B/USDT:USDT", "hurst_4h": 0.40, "category": 2},
+]
+
+app = FastAPI()
+app.include_router(query_router)
+app.dependency_overrides[verify_token] = lambda: True
+
+
+@pytest.fixture
+def views(mocker):
+    views = {"index": ColumnarIndex(COINS), "screens": {}}
+    mocker.patch("api.endpoints.query.get_filtered_views", return_value=views)
+    return views
+
+# --- Тесты ---
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [
+    {"filters": {"hurst_4h": {"min": [1]}}},
+    {"filters": {"category": [{"x": 1}]}},
+    {"cursor": "garbage"},
+])
+async def test_malformed_query_returns_400(views, body):
+    async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/coins/query", json=body)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_valid_query_returns_page(views):
+    async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/coins/query", json={"filters": {"hurst_4h": {"min": 0.5}}})
+    assert response.status_code == 200
+    assert [row["full_symbol"] for row in response.json()["data"]] == ["A/USDT:USDT:USDT"]
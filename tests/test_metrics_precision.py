@@ -0,0 +1,122 @@
+# tests/test_metrics_precision.py
+
+import pytest
+import logging
+import numpy as np
+import pandas as pd
+from unittest.mock import AsyncMock, MagicMock
+
+from services.data_fetcher import fetch_all_ohlcv_data, get_ohlcv_dtype
+from metrics.calculator import calculate_all_metrics
+from metrics.precision import calculate_precision_drift, summarize_precision_drift
+
+logging.getLogger("metrics").setLevel(logging.ERROR)
+
+# --- Данные для моков ---
+
+MOCK_OHLCV_DATA = [
+    [1678886400000, 100, 110, 90, 105, 1000],
+    [1678886500000, 105, 115, 100, 110, 1200],
+]
+
+
+def _make_ohlcv(n, seed, freq):
+    """Хелпер: синтетический OHLCV (случайное блуждание) в float64."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = np.roll(close, 1)
+    open_[0] = close[0]
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    index = pd.date_range("2024-01-01", periods=n, freq=freq)
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(1000, 5000, n)
+    }, index=index)
+
+
+@pytest.fixture
+def ohlcv_map():
+    return {
+        '1h': _make_ohlcv(400, 1, 'h'),
+        '4h': _make_ohlcv(300, 2, '4h'),
+        '1d': _make_ohlcv(200, 3, 'D'),
+    }
+
+
+@pytest.fixture
+def btc_1d():
+    return _make_ohlcv(200, 42, 'D')
+
+
+# --- Тесты для get_ohlcv_dtype ---
+
+def test_get_ohlcv_dtype(mocker):
+    mocker.patch('config.OHLCV_PRECISION', 'float32')
+    assert get_ohlcv_dtype() is np.float32
+
+    mocker.patch('config.OHLCV_PRECISION', 'float64')
+    assert get_ohlcv_dtype() is np.float64
+
+    # Неизвестное значение -> безопасный float64
+    mocker.patch('config.OHLCV_PRECISION', 'float16')
+    assert get_ohlcv_dtype() is np.float64
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_ohlcv_data_float32(mocker):
+    """В режиме float32 загруженные DataFrame хранятся в float32."""
+    mocker.patch('config.OHLCV_PRECISION', 'float32')
+    mock_exchange = MagicMock()
+    mock_exchange.parse8601.return_value = 1678886400000
+    mocker.patch(
+        "services.data_fetcher.fetch_ohlcv",
+        new_callable=AsyncMock,
+        return_value=MOCK_OHLCV_DATA
+    )
+
+    result_map = await fetch_all_ohlcv_data(mock_exchange, "BTC/USDT", {'1h': 7}, "[Test]")
+
+    assert (result_map['1h'].dtypes == np.float32).all()
+
+
+# --- Тесты для calculate_all_metrics (float32) ---
+
+def test_calculate_all_metrics_float32_returns_python_floats(ohlcv_map, btc_1d):
+    """Метрики из float32-данных приводятся к float (BSON не умеет np.float32)."""
+    data_32 = {tf: df.astype(np.float32) for tf, df in ohlcv_map.items()}
+
+    metrics = calculate_all_metrics(data_32, btc_1d.astype(np.float32))
+
+    assert metrics
+    assert all(type(v) is float for v in metrics.values())
+
+
+# --- Тесты для отчета о дрейфе ---
+
+def test_precision_drift_report(ohlcv_map, btc_1d):
+    report = calculate_precision_drift(ohlcv_map, btc_1d)
+
+    assert 'hurst_1h' in report
+    assert 'btc_corr_1d_w30' in report
+    for row in report.values():
+        assert set(row) == {'float64', 'float32', 'abs_diff', 'rel_diff'}
+        assert row['abs_diff'] >= 0
+
+    # Лог-доходности считаются в float64 -> дрейф корреляции пренебрежимо мал
+    assert report['btc_corr_1d_w30']['rel_diff'] < 1e-4
+
+
+def test_summarize_precision_drift():
+    reports = [
+        {'hurst_1h': {'float64': 0.5, 'float32': 0.5001, 'abs_diff': 1e-4, 'rel_diff': 2e-4}},
+        {'hurst_1h': {'float64': 0.6, 'float32': 0.6, 'abs_diff': 0.0, 'rel_diff': 0.0}},
+    ]
+
+    summary = summarize_precision_drift(reports)
+
+    assert summary['hurst_1h']['coins'] == 2
+    assert summary['hurst_1h']['max_abs_diff'] == pytest.approx(1e-4)
+    assert summary['hurst_1h']['mean_rel_diff'] == pytest.approx(1e-4)
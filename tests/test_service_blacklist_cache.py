@@ -0,0 +1,55 @@
+# tests/test_service_blacklist_cache.py
+
+import pytest
+from unittest.mock import AsyncMock
+
+from services import blacklist_cache
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture
+def fetch(mocker):
+    """Сбрасывает кэш и мокает чтение коллекции 'blacklist'."""
+    mocker.patch.object(blacklist_cache, '_blacklist', frozenset())
+    mocker.patch.object(blacklist_cache, '_version', 0)
+    mocker.patch.object(blacklist_cache, '_loaded_at', 0.0)
+    return mocker.patch(
+        'services.blacklist_cache.mongo_service.fetch_blacklist_symbols',
+        new_callable=AsyncMock, return_value={'SOL', 'DOGE'}
+    )
+
+# --- Тесты ---
+
+@pytest.mark.asyncio
+async def test_blacklist_is_served_from_cache_within_ttl(fetch):
+    first = await blacklist_cache.get_blacklist()
+    second = await blacklist_cache.get_blacklist()
+
+    assert first == second == frozenset({'SOL', 'DOGE'})
+    fetch.assert_awaited_once()
+    assert blacklist_cache.get_blacklist_version() == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads_and_bumps_version_only_on_change(fetch):
+    await blacklist_cache.get_blacklist()
+
+    # Содержимое не изменилось -> версия та же
+    blacklist_cache.invalidate_blacklist("[Test]")
+    await blacklist_cache.get_blacklist()
+    assert fetch.await_count == 2
+    assert blacklist_cache.get_blacklist_version() == 1
+
+    fetch.return_value = {'SOL'}
+    blacklist_cache.invalidate_blacklist("[Test]")
+    assert await blacklist_cache.get_blacklist() == frozenset({'SOL'})
+    assert blacklist_cache.get_blacklist_version() == 2
+
+
+@pytest.mark.asyncio
+async def test_mongo_error_keeps_previous_blacklist(fetch):
+    await blacklist_cache.get_blacklist()
+
+    fetch.side_effect = ConnectionError("mongo down")
+    assert await blacklist_cache.get_blacklist(force_reload=True) == frozenset({'SOL', 'DOGE'})
+    assert blacklist_cache.get_blacklist_version() == 1
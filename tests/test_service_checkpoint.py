@@ -0,0 +1,94 @@
+# tests/test_service_checkpoint.py
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from services import checkpoint_service
+from services.checkpoint_service import RunCheckpoint, _df_to_doc, _doc_to_df
+
+# --- Данные для моков ---
+
+COIN = {'symbol': 'SOL/USDT:USDT', 'full_symbol': 'SOL/USDT:USDT:USDT', 'exchanges': ['binanceusdm']}
+
+
+def _make_df(rows=5):
+    index = pd.date_range('2025-01-01', periods=rows, freq='D', name='timestamp')
+    data = np.arange(rows * 5, dtype=float).reshape(rows, 5)
+    return pd.DataFrame(data, index=index, columns=['open', 'high', 'low', 'close', 'volume'])
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture
+def fake_store(mocker):
+    """Хранилище контрольных точек в памяти вместо MongoDB."""
+    store = {}
+
+    def save(run_id, stage, docs, log_prefix=""):
+        for doc in docs:
+            store[(run_id, stage, doc['symbol'])] = {**doc, 'run_id': run_id, 'stage': stage}
+        return len(docs)
+
+    def load(run_id, stage, log_prefix=""):
+        return [d for (r, st, _), d in store.items() if r == run_id and st == stage]
+
+    def clear(run_id, log_prefix=""):
+        keys = [k for k in store if k[0] == run_id]
+        for k in keys:
+            del store[k]
+        return len(keys)
+
+    mocker.patch('config.CHECKPOINTS_ENABLED', True)
+    mocker.patch.object(checkpoint_service, '_save_docs_sync', side_effect=save)
+    mocker.patch.object(checkpoint_service, '_load_docs_sync', side_effect=load)
+    mocker.patch.object(checkpoint_service, '_clear_sync', side_effect=clear)
+    return store
+
+# --- Тесты ---
+
+def test_df_roundtrip():
+    df = _make_df()
+    restored = _doc_to_df(_df_to_doc(df))
+
+    pd.testing.assert_frame_equal(restored, df, check_freq=False)
+    assert _df_to_doc(None) is None and _doc_to_df(None) is None
+
+
+@pytest.mark.asyncio
+async def test_stage_checkpoints_roundtrip(fake_store):
+    cp = RunCheckpoint('run-1', "[Test]")
+    df_1d = _make_df(200)
+
+    assert await cp.load_stage1() is None
+    assert await cp.load_stage2() is None
+
+    await cp.save_stage1([COIN], {'Volume': {'ADA/USDT:USDT'}})
+    await cp.save_stage2({COIN['symbol']: (COIN, df_1d)}, {'Maturity (Young)': ['NEW/USDT:USDT']})
+    await cp.save_stage3_results([{'symbol': COIN['symbol'], 'hurst_1d': 0.6}])
+
+    # "Рестарт": новый объект с тем же run_id
+    resumed = RunCheckpoint('run-1', "[Test]")
+
+    coins, skipped = await resumed.load_stage1()
+    assert coins == [COIN]
+    assert skipped == {'Volume': ['ADA/USDT:USDT']}
+
+    mature_map, skipped_2 = await resumed.load_stage2()
+    assert list(mature_map) == [COIN['symbol']]
+    assert len(mature_map[COIN['symbol']][1]) == 200
+    assert skipped_2 == {'Maturity (Young)': ['NEW/USDT:USDT']}
+
+    assert await resumed.load_stage3_results() == [{'symbol': COIN['symbol'], 'hurst_1d': 0.6}]
+
+    await resumed.clear()
+    assert fake_store == {}
+
+
+@pytest.mark.asyncio
+async def test_disabled_checkpoint_is_noop(fake_store, mocker):
+    mocker.patch('config.CHECKPOINTS_ENABLED', False)
+    cp = RunCheckpoint('run-2', "[Test]")
+
+    await cp.save_stage1([COIN], {})
+    assert fake_store == {}
+    assert await cp.load_stage1() is None
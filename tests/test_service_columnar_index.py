@@ -0,0 +1,101 @@
+# tests/test_service_columnar_index.py
+
+import math
+import pytest
+
+from services.columnar_index import ColumnarIndex, run_query, encode_cursor, decode_cursor
+
+# --- Данные для моков ---
+
+COINS = [
+    {"full_symbol": "A/USDT:USDT:USDT", "symbol": "A/USDT:USDT", "hurst_4h": 0.70, "category": 5},
+    {"full_symbol": "B/USDT:USDT:USDT", "symbol": "B/USDT:USDT", "hurst_4h": 0.40, "category": 2},
+    {"full_symbol": "C/USDT:USDT:USDT", "symbol": "C/USDT:USDT", "hurst_4h": math.nan, "category": 5},
+    {"full_symbol": "D/USDT:USDT:USDT", "symbol": "D/USDT:USDT", "hurst_4h": 0.60, "category": 5},
+    {"full_symbol": "E/USDT:USDT:USDT", "symbol": "E/USDT:USDT", "category": 4},
+]
+
+
+@pytest.fixture
+def index():
+    return ColumnarIndex(COINS)
+
+
+def _names(result):
+    return [row["full_symbol"][0] for row in result["data"]]
+
+# --- Тесты ---
+
+def test_range_and_in_filters_with_sort(index):
+    result = run_query(index, filters={"hurst_4h": {"min": 0.5}, "category": [5]}, sort=["-hurst_4h"])
+
+    assert result["total"] == 2
+    assert _names(result) == ["A", "D"]
+
+
+def test_missing_values_sort_last_and_projection(index):
+    result = run_query(index, sort=["hurst_4h"], fields=["full_symbol", "hurst_4h"])
+
+    assert _names(result) == ["B", "D", "A", "C", "E"]
+    assert set(result["data"][0]) == {"full_symbol", "hurst_4h"}
+
+
+def test_multi_key_sort(index):
+    result = run_query(index, sort=["-category", "-hurst_4h"])
+    assert _names(result) == ["A", "D", "C", "E", "B"]
+
+
+def test_cursor_pagination_walks_all_rows(index):
+    seen, cursor = [], None
+    while True:
+        page = run_query(index, sort=["-category", "-hurst_4h"], limit=2, cursor=cursor)
+        seen += _names(page)
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["A", "D", "C", "E", "B"]
+
+
+def test_cursor_continues_after_last_symbol_on_new_snapshot(index):
+    first = run_query(index, sort=["-hurst_4h"], limit=2)
+    assert _names(first) == ["A", "D"]
+
+    # Новый снимок: перед последней показанной монетой появилась еще одна
+    refreshed = ColumnarIndex([{"full_symbol": "Z/USDT:USDT:USDT", "hurst_4h": 0.9}] + COINS)
+    second = run_query(refreshed, sort=["-hurst_4h"], limit=2, cursor=first["next_cursor"])
+    assert _names(second) == ["B", "C"]
+
+
+def test_invalid_requests_raise_value_error(index):
+    with pytest.raises(ValueError):
+        run_query(index, filters={"no_such_metric": {"min": 1}})
+    with pytest.raises(ValueError):
+        run_query(index, fields=["no_such_field"])
+    with pytest.raises(ValueError):
+        run_query(index, cursor="garbage")
+
+
+@pytest.mark.parametrize("filters", [
+    {"hurst_4h": {"min": [1]}},
+    {"hurst_4h": {"max": {"a": 1}}},
+    {"category": [5, [4]]},
+    {"category": "abc"},
+    {"category": True},
+])
+def test_malformed_filter_values_raise_value_error(index, filters):
+    with pytest.raises(ValueError):
+        run_query(index, filters=filters)
+
+
+def test_numeric_string_filter_values_are_accepted(index):
+    assert _names(run_query(index, filters={"category": {"min": "5"}})) == ["A", "C", "D"]
+
+
+def test_negative_or_malformed_cursor_is_rejected(index):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor(-5, None))
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor(2, 123))
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        run_query(index, cursor=encode_cursor(-2, None))
+    assert decode_cursor(encode_cursor(2, "A/USDT:USDT:USDT")) == (2, "A/USDT:USDT:USDT")
@@ -174,4 +174,78 @@ async def test_cache_returns_stale_on_error(mock_db_call, mocker):
     assert data2 == MOCK_COIN_DATA_1 
     
     # БД была вызвана 2 раза (первый успех, вторая ошибка)
-    assert mock_db_call.call_count == 2
\ No newline at end of file
+    assert mock_db_call.call_count == 2
+
+# --- Производные представления ---
+
+VIEW_COINS = [
+    {"symbol": "BTC/USDT:USDT", "full_symbol": "BTC/USDT:USDT:USDT", "exchanges": ["binanceusdm"], "category": 1, "btc_corr_1d_w30": 1.0},
+    {"symbol": "SOL/USDT:USDT", "full_symbol": "SOL/USDT:USDT:USDT", "exchanges": ["bybit"], "category": 2, "btc_corr_1d_w30": 0.8},
+    {"symbol": "DOGE/USDT:USDT", "full_symbol": "DOGE/USDT:USDT:USDT", "exchanges": ["bybit"], "category": 3, "btc_corr_1d_w30": 0.2},
+]
+
+
+@pytest.fixture
+def views_sources(mocker):
+    data_cache_service._views = None
+    data_cache_service._cache_version = 0
+    mocker.patch("services.data_cache_service.get_all_coins_from_mongo_async", AsyncMock(return_value=VIEW_COINS))
+    blacklist = mocker.patch("services.data_cache_service.get_blacklist", AsyncMock(return_value=frozenset({"SOL"})))
+    version = mocker.patch("services.data_cache_service.get_blacklist_version", return_value=1)
+    build = mocker.spy(data_cache_service, "build_filtered_views")
+    yield blacklist, version, build
+    data_cache_service._views = None
+
+
+def test_build_filtered_views_applies_blacklist_and_correlation():
+    views = data_cache_service.build_filtered_views(VIEW_COINS, frozenset({"SOL"}))
+
+    assert [c["symbol"] for c in views["coins"]] == ["BTC/USDT:USDT"]
+    assert views["formatted"] == [{"symbol": "BTCUSDT", "exchanges": ["BINANCE"], "category": 1}]
+    assert views["stats"] == {"blacklist": 1, "low_correlation": 1}
+    assert views["bodies"]["csv"]["body"].decode().splitlines()[0].startswith("symbol,full_symbol")
+    assert views["bodies"]["filtered"]["etag"] != views["bodies"]["formatted"]["etag"]
+
+
+@pytest.mark.asyncio
+async def test_views_built_once_per_cache_and_blacklist_version(views_sources):
+    blacklist, version, build = views_sources
+
+    first = await data_cache_service.get_filtered_views()
+    second = await data_cache_service.get_filtered_views()
+    assert first is second
+    assert build.call_count == 1
+
+    # Новый черный список -> пересборка
+    blacklist.return_value = frozenset()
+    version.return_value = 2
+    third = await data_cache_service.get_filtered_views()
+    assert build.call_count == 2
+    assert len(third["coins"]) == 2
+
+    # Перезагрузка кэша монет -> пересборка
+    await get_cached_coins_data(force_reload=True)
+    await data_cache_service.get_filtered_views()
+    assert build.call_count == 3
+
+
+def test_csv_stream_matches_pandas_and_yields_chunks():
+    import io
+    import math
+    import pandas as pd
+    import config
+
+    coins = [
+        {**coin, "hurst_4h": math.nan if i == 1 else 0.5 + i / 10, "bogus_field": "x"}
+        for i, coin in enumerate(VIEW_COINS)
+    ]
+    columns = data_cache_service.csv_columns(coins)
+    chunks = list(data_cache_service.iter_csv_chunks(coins, columns, chunk_rows=2))
+
+    expected = io.StringIO()
+    df = pd.DataFrame(coins)
+    df[[c for c in config.DATABASE_SCHEMA if c in df.columns]].to_csv(expected, index=False)
+
+    assert len(chunks) == 2
+    assert "bogus_field" not in columns
+    assert b"".join(chunks).decode() == expected.getvalue()
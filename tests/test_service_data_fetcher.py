@@ -1,5 +1,6 @@
 # tests/test_service_data_fetcher.py
 
+import asyncio
 import pytest
 import pandas as pd
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -8,6 +9,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from services.data_fetcher import (
     fetch_all_coins_data, 
     fetch_all_ohlcv_data,
+    OhlcvRunCache,
     _extract_base_symbol # Тестируем утилиту напрямую
 )
 
@@ -62,13 +64,13 @@ def mock_config(mocker):
 
 @pytest.fixture
 def mock_exchange(mocker):
-    """Создает мок 'exchange' и 'initialize_exchange'."""
+    """Создает мок 'exchange' и 'get_exchange' (реестр бирж)."""
     mock_ex = MagicMock()
     mock_ex.id = 'binanceusdm'
     
-    # Мокаем 'initialize_exchange'
+    # Мокаем 'get_exchange' (реестр)
     mocker.patch(
-        "services.data_fetcher.initialize_exchange",
+        "services.data_fetcher.get_exchange",
         new_callable=AsyncMock,
         return_value=mock_ex
     )
@@ -76,9 +78,9 @@ def mock_exchange(mocker):
 
 @pytest.fixture
 def mock_api_calls(mocker):
-    """Мокает 'fetch_markets' и 'fetch_tickers'."""
+    """Мокает 'get_filtered_markets' (кэш рынков) и 'fetch_tickers'."""
     mock_markets = mocker.patch(
-        "services.data_fetcher.fetch_markets",
+        "services.data_fetcher.get_filtered_markets",
         new_callable=AsyncMock,
         return_value=MOCK_MARKETS
     )
@@ -188,16 +190,16 @@ async def test_fetch_all_coins_aggregation(mocker, mock_config, mock_api_calls):
     mock_ex_bybit = MagicMock()
     mock_ex_bybit.id = 'bybit'
     
-    # Мокаем 'initialize_exchange', чтобы он вернул оба
+    # Мокаем 'get_exchange' (реестр), чтобы он вернул оба
     mocker.patch(
-        "services.data_fetcher.initialize_exchange",
+        "services.data_fetcher.get_exchange",
         new_callable=AsyncMock,
         side_effect=[mock_ex_binance, mock_ex_bybit]
     )
     
-    # Мокаем 'fetch_markets'
+    # Мокаем 'get_filtered_markets' (кэш рынков)
     mock_markets = mocker.patch(
-        "services.data_fetcher.fetch_markets",
+        "services.data_fetcher.get_filtered_markets",
         new_callable=AsyncMock,
         return_value=MOCK_MARKETS # Обе биржи вернут одинаковые рынки
     )
@@ -276,4 +278,73 @@ async def test_fetch_all_ohlcv_data(mocker):
     # 3. Значения - это pd.DataFrame
     assert isinstance(result_map['1h'], pd.DataFrame)
     assert len(result_map['1h']) == len(MOCK_OHLCV_DATA)
-    assert result_map['1h'].index.name == 'timestamp'
\ No newline at end of file
+    assert result_map['1h'].index.name == 'timestamp'
+
+@pytest.mark.asyncio
+async def test_fetch_all_ohlcv_data_keeps_successful_tfs_in_run_cache(mocker):
+    """
+    Один ТФ упал -> результат пустой, но успешные ТФ остаются в кэше запуска,
+    и повторная попытка загружает ТОЛЬКО упавший ТФ.
+    """
+    mock_exchange = MagicMock()
+    mock_exchange.id = 'binanceusdm'
+    mock_exchange.parse8601.return_value = 1678886400000
+
+    async def flaky_fetch(exchange, symbol, timeframe, since, limit, log_prefix):
+        return None if timeframe == '12h' else MOCK_OHLCV_DATA
+
+    mock_api_call = mocker.patch("services.data_fetcher.fetch_ohlcv", side_effect=flaky_fetch)
+
+    tf_config = {'1h': 7, '4h': 30, '12h': 60}
+    run_cache = OhlcvRunCache()
+
+    # Попытка 1: 12h провален
+    result_map = await fetch_all_ohlcv_data(mock_exchange, "BTC/USDT", tf_config, "[Test]", run_cache)
+    assert result_map == {}
+    assert len(run_cache) == 2
+
+    # Попытка 2: биржа "восстановилась"
+    mock_api_call.side_effect = None
+    mock_api_call.return_value = MOCK_OHLCV_DATA
+    mock_api_call.reset_mock()
+
+    result_map = await fetch_all_ohlcv_data(mock_exchange, "BTC/USDT", tf_config, "[Test]", run_cache)
+
+    assert set(result_map) == {'1h', '4h', '12h'}
+    assert [c.args[2] for c in mock_api_call.call_args_list] == ['12h']
+    assert run_cache.hits == 2
+
+    run_cache.drop_symbol('binanceusdm', "BTC/USDT")
+    assert len(run_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_ohlcv_data_caches_finished_tfs_on_cancel(mocker):
+    """
+    Таймаут монеты отменяет загрузку на середине -> уже загруженные ТФ
+    остаются в кэше запуска.
+    """
+    mock_exchange = MagicMock()
+    mock_exchange.id = 'binanceusdm'
+    mock_exchange.parse8601.return_value = 1678886400000
+
+    async def slow_fetch(exchange, symbol, timeframe, since, limit, log_prefix):
+        if timeframe == '12h':
+            await asyncio.sleep(10)
+        return MOCK_OHLCV_DATA
+
+    mocker.patch("services.data_fetcher.fetch_ohlcv", side_effect=slow_fetch)
+
+    tf_config = {'1h': 7, '4h': 30, '12h': 60}
+    run_cache = OhlcvRunCache()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            fetch_all_ohlcv_data(mock_exchange, "BTC/USDT", tf_config, "[Test]", run_cache),
+            timeout=0.05
+        )
+
+    assert len(run_cache) == 2
+    assert run_cache.get('binanceusdm', "BTC/USDT", '1h') is not None
+    assert run_cache.get('binanceusdm', "BTC/USDT", '4h') is not None
+    assert run_cache.get('binanceusdm', "BTC/USDT", '12h') is None
@@ -0,0 +1,105 @@
+# tests/test_service_exchange_controller.py
+
+import pytest
+import asyncio
+import ccxt
+from unittest.mock import AsyncMock, MagicMock
+
+from services import exchange_controller
+from services.exchange_controller import ExchangeController, get_controller
+from services.exchange_utils import retry_on_network_error
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def controller_config(mocker):
+    mocker.patch('config.MAX_CONCURRENT_PER_EXCHANGE', 8)
+    mocker.patch('config.CIRCUIT_WINDOW_SIZE', 10)
+    mocker.patch('config.CIRCUIT_MIN_CALLS', 4)
+    mocker.patch('config.CIRCUIT_FAILURE_RATE', 0.5)
+    mocker.patch('config.CIRCUIT_COOLDOWN_SECONDS', 0.05)
+    mocker.patch('config.AIMD_DECREASE_FACTOR', 0.5)
+    mocker.patch('config.AIMD_DECREASE_INTERVAL_SECONDS', 0.0)
+    mocker.patch('config.EXCHANGE_SLOW_CALL_SECONDS', 5.0)
+    exchange_controller.reset_controllers()
+    yield
+    exchange_controller.reset_controllers()
+
+# --- Тесты ---
+
+def test_aimd_decrease_and_additive_recovery():
+    c = ExchangeController('bybit')
+    assert c.concurrency == 8
+
+    c.record_failure()
+    assert c.concurrency == 4
+    c.record_failure()
+    assert c.concurrency == 2
+
+    # +1 примерно за каждые 'limit' успешных ответов
+    for _ in range(3):
+        c.record_success(0.1)
+    assert c.concurrency == 3
+
+    # Медленный ответ = сигнал перегрузки
+    c.record_success(10.0)
+    assert c.concurrency == 1
+    assert c.scale_batch_size(50) == 6
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_half_open_probe_closes_it():
+    c = ExchangeController('bybit')
+    for _ in range(2):
+        c.record_success(0.1)
+    for _ in range(2):
+        c.record_failure()
+
+    assert c.is_open()
+
+    # Запрос ждет окончания паузы, затем идет единственным пробным
+    await asyncio.wait_for(c.acquire(), timeout=1.0)
+    assert c.state == exchange_controller.STATE_HALF_OPEN
+    assert c.in_flight == 1
+
+    c.release(True, 0.1)
+    assert c.state == exchange_controller.STATE_CLOSED
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_blocks_extra_requests():
+    c = ExchangeController('bybit', max_concurrency=2)
+    await c.acquire()
+    await c.acquire()
+
+    waiter = asyncio.create_task(c.acquire())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    c.release(True, 0.1)
+    await asyncio.wait_for(waiter, timeout=1.0)
+    assert c.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_decorator_feeds_controller(mocker):
+    mocker.patch('services.exchange_utils.asyncio.sleep', new_callable=AsyncMock)
+
+    exchange = MagicMock()
+    exchange.id = 'bybit'
+    calls = {'n': 0}
+
+    @retry_on_network_error()
+    async def fetch_something(exchange, log_prefix):
+        calls['n'] += 1
+        if calls['n'] == 1:
+            raise ccxt.NetworkError("boom")
+        return {'ok': True}
+
+    result = await fetch_something(exchange, "[Test]")
+
+    assert result == {'ok': True}
+    stats = get_controller('bybit').get_stats()
+    assert stats['failure'] == 1
+    assert stats['success'] == 1
+    assert stats['in_flight'] == 0
@@ -0,0 +1,116 @@
+# tests/test_service_exchange_registry.py
+
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from services import exchange_registry
+from services.exchange_registry import (
+    get_exchange,
+    discard_exchange,
+    ensure_healthy_exchanges,
+    close_all_exchanges
+)
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    """Сбрасывает глобальный реестр перед каждым тестом."""
+    exchange_registry._exchanges.clear()
+    exchange_registry._created_at.clear()
+    yield
+    exchange_registry._exchanges.clear()
+    exchange_registry._created_at.clear()
+
+
+def _make_mock_exchange(ex_id):
+    mock_ex = MagicMock()
+    mock_ex.id = ex_id
+    mock_ex.close = AsyncMock()
+    mock_ex.fetch_time = AsyncMock(return_value=1700000000000)
+    return mock_ex
+
+
+@pytest.fixture
+def mock_init(mocker):
+    """Мокает 'initialize_exchange': каждый вызов -> новый мок-экземпляр."""
+    return mocker.patch(
+        "services.exchange_registry.initialize_exchange",
+        new_callable=AsyncMock,
+        side_effect=lambda ex_id, log_prefix="": _make_mock_exchange(ex_id)
+    )
+
+# --- Тесты ---
+
+@pytest.mark.asyncio
+async def test_get_exchange_reuses_instance(mock_init):
+    """Повторные вызовы (этапы / запуски) получают ОДИН экземпляр."""
+    ex1 = await get_exchange('binanceusdm', "[Test]")
+    ex2 = await get_exchange('binanceusdm', "[Test]")
+
+    assert ex1 is ex2
+    mock_init.assert_called_once()
+    ex1.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_exchange_concurrent_creates_once(mock_init):
+    """Одновременные вызовы не создают дубликатов (lock)."""
+    results = await asyncio.gather(*[get_exchange('bybit', "[Test]") for _ in range(5)])
+
+    assert all(r is results[0] for r in results)
+    mock_init.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_exchange_recycles_expired(mock_init, mocker):
+    """Экземпляр старше EXCHANGE_MAX_AGE_SECONDS пересоздается."""
+    mocker.patch('config.EXCHANGE_MAX_AGE_SECONDS', 100)
+    mock_time = mocker.patch('services.exchange_registry.time.time', return_value=1000.0)
+
+    ex1 = await get_exchange('bybit', "[Test]")
+    mock_time.return_value = 1200.0
+    ex2 = await get_exchange('bybit', "[Test]")
+
+    assert ex1 is not ex2
+    ex1.close.assert_awaited_once()
+    assert mock_init.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_ensure_healthy_recycles_on_failed_healthcheck(mock_init):
+    """Провал health-check -> старый экземпляр закрыт, создан новый."""
+    old_ex = await get_exchange('binanceusdm', "[Test]")
+    old_ex.fetch_time.side_effect = Exception("Connection reset")
+
+    healthy = await ensure_healthy_exchanges(['binanceusdm'], "[Test]")
+
+    assert healthy['binanceusdm'] is not old_ex
+    old_ex.close.assert_awaited_once()
+    assert mock_init.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_ensure_healthy_keeps_healthy_instance(mock_init):
+    ex = await get_exchange('binanceusdm', "[Test]")
+
+    healthy = await ensure_healthy_exchanges(['binanceusdm', 'bybit'], "[Test]")
+
+    assert healthy['binanceusdm'] is ex
+    assert 'bybit' in healthy
+    ex.fetch_time.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_discard_and_close_all(mock_init):
+    ex_a = await get_exchange('binanceusdm', "[Test]")
+    ex_b = await get_exchange('bybit', "[Test]")
+
+    await discard_exchange('binanceusdm', "[Test]")
+    ex_a.close.assert_awaited_once()
+    assert 'binanceusdm' not in exchange_registry._exchanges
+
+    await close_all_exchanges("[Test]")
+    ex_b.close.assert_awaited_once()
+    assert exchange_registry._exchanges == {}
@@ -0,0 +1,76 @@
+# tests/test_service_export.py
+
+import io
+import asyncio
+import math
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services import export_service
+
+# --- Данные для моков ---
+
+TS = datetime(2025, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+COINS = [
+    {"symbol": "BTC/USDT:USDT", "full_symbol": "BTC/USDT:USDT:USDT", "exchanges": ["binanceusdm", "bybit"],
+     "category": 1.0, "hurst_4h": 0.61, "btc_corr_1d_w30": 1.0, "analyzed_at": TS},
+    {"symbol": "SOL/USDT:USDT", "full_symbol": "SOL/USDT:USDT:USDT", "exchanges": ["bybit"],
+     "category": None, "hurst_4h": math.nan, "btc_corr_1d_w30": 0.8, "analyzed_at": TS},
+]
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture
+def views(mocker):
+    export_service._exports, export_service._exports_key = {}, None
+    mocker.patch(
+        "services.export_service.get_filtered_views",
+        AsyncMock(return_value={"key": (1, 1), "coins": COINS})
+    )
+    return mocker.spy(export_service, "serialize_table")
+
+# --- Тесты ---
+
+def test_table_is_typed_from_database_schema():
+    table = export_service.build_table(COINS, export_service.resolve_columns(COINS, None))
+
+    assert table.schema.field("hurst_4h").type == pa.float64()
+    assert table.schema.field("category").type == pa.int16()
+    assert table.schema.field("exchanges").type == pa.list_(pa.string())
+    assert table.schema.field("analyzed_at").type == pa.timestamp("us", tz="UTC")
+    assert table.column("category").to_pylist() == [1, None]
+    assert table.column("hurst_4h").null_count == 1
+
+
+def test_unknown_projection_column_is_rejected():
+    with pytest.raises(ValueError):
+        export_service.resolve_columns(COINS, ["hurst_4h", "no_such_metric"])
+
+
+@pytest.mark.asyncio
+async def test_current_export_is_built_once_per_version(views):
+    first = await export_service.get_export("parquet", ["hurst_4h", "symbol"])
+    second = await export_service.get_export("parquet", ["symbol", "hurst_4h"])
+
+    assert first is second
+    assert views.call_count == 1
+    table = pq.read_table(io.BytesIO(first["body"]))
+    assert table.column_names == ["symbol", "hurst_4h"]
+
+    arrow = await export_service.get_export("arrow")
+    table = pa.ipc.open_file(arrow["body"]).read_all()
+    assert table.num_rows == 2 and "btc_corr_1d_w30" in table.column_names
+    assert "gzip" in arrow["encoded"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_build_export_once(views):
+    results = await asyncio.gather(*(export_service.get_export("arrow", ["hurst_4h"]) for _ in range(5)))
+
+    assert all(result is results[0] for result in results)
+    assert views.call_count == 1
@@ -0,0 +1,64 @@
+# tests/test_service_history.py
+
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from services import history_service
+
+# --- Данные для моков ---
+
+TS = datetime(2025, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+COIN = {
+    'symbol': 'SOL/USDT:USDT', 'full_symbol': 'SOL/USDT:USDT:USDT', 'name': 'SOL',
+    'usdPrice': 150.0, 'volume_24h_usd': 1e9, 'category': 6, 'is_stale': False,
+    'hurst_4h': 0.61, 'btc_corr_1d_w30': 0.8, 'exchanges': ['binanceusdm'],
+    'analyzed_at': TS, 'analyzed_at_tf': {'4h': TS, '1d': TS}
+}
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture
+def mock_collection(mocker):
+    collection = MagicMock()
+    mocker.patch.object(history_service, '_get_collection', return_value=collection)
+    return collection
+
+# --- Тесты ---
+
+def test_history_point_keeps_only_numeric_metrics():
+    point = history_service._history_point(COIN, TS, run_id='run-1')
+
+    assert point == {
+        'ts': TS, 'meta': {'full_symbol': 'SOL/USDT:USDT:USDT'}, 'run_id': 'run-1',
+        'usdPrice': 150.0, 'volume_24h_usd': 1e9, 'category': 6,
+        'hurst_4h': 0.61, 'btc_corr_1d_w30': 0.8
+    }
+
+
+def test_history_point_skips_metrics_carried_from_previous_run():
+    # 1d не пересчитывался: метрика и отметка перенесены из прошлого документа (наивный UTC из Mongo)
+    carried = {**COIN, 'analyzed_at_tf': {'4h': TS, '1d': datetime(2025, 9, 30, 12, 0)}}
+
+    point = history_service._history_point(carried, TS)
+
+    assert point['hurst_4h'] == 0.61
+    assert 'btc_corr_1d_w30' not in point
+    assert point['usdPrice'] == 150.0
+
+
+def test_append_skips_stale_coins(mock_collection):
+    stale = {**COIN, 'full_symbol': 'OLD/USDT:USDT:USDT', 'is_stale': True}
+
+    assert history_service._append_run_metrics_sync([COIN, stale], TS) == 1
+    points = mock_collection.insert_many.call_args.args[0]
+    assert [p['meta']['full_symbol'] for p in points] == ['SOL/USDT:USDT:USDT']
+
+
+def test_history_query_by_symbol_range_and_metrics():
+    start = datetime(2025, 9, 1, tzinfo=timezone.utc)
+    query, projection = history_service._history_query('SOL/USDT:USDT:USDT', ['hurst_4h'], start, None)
+
+    assert query == {'meta.full_symbol': 'SOL/USDT:USDT:USDT', 'ts': {'$gte': start}}
+    assert projection == {'_id': 0, 'ts': 1, 'hurst_4h': 1}
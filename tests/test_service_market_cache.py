@@ -0,0 +1,123 @@
+# tests/test_service_market_cache.py
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from services import market_cache
+from services.market_cache import (
+    get_filtered_markets,
+    get_cached_symbols,
+    load_snapshots
+)
+
+# --- Данные для моков ---
+
+MOCK_RAW_MARKETS = {
+    'BTC/USDT:USDT': {'symbol': 'BTC/USDT:USDT', 'active': True, 'type': 'swap', 'quote': 'USDT'},
+    'SOL/USDT:USDT': {'symbol': 'SOL/USDT:USDT', 'active': True, 'type': 'swap', 'quote': 'USDT'},
+    'OLD/USDT:USDT': {'symbol': 'OLD/USDT:USDT', 'active': False, 'type': 'swap', 'quote': 'USDT'},
+    'ETH/USDC:USDC': {'symbol': 'ETH/USDC:USDC', 'active': True, 'type': 'swap', 'quote': 'USDC'},
+    'BTC/USDT': {'symbol': 'BTC/USDT', 'active': True, 'type': 'spot', 'quote': 'USDT'},
+}
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture(autouse=True)
+def reset_market_cache(tmp_path, mocker):
+    """Изолирует кэш: пустая память и временная папка для снимков."""
+    mocker.patch('config.MARKET_CACHE_DIR', str(tmp_path))
+    mocker.patch('config.MARKET_CACHE_TTL_SECONDS', 3600)
+    for store in (market_cache._raw_markets, market_cache._fingerprints,
+                  market_cache._loaded_at, market_cache._filtered_index):
+        store.clear()
+    yield
+
+
+@pytest.fixture
+def mock_exchange():
+    mock_ex = MagicMock()
+    mock_ex.id = 'binanceusdm'
+    mock_ex.markets = None
+    return mock_ex
+
+
+@pytest.fixture
+def mock_load(mocker):
+    return mocker.patch(
+        "services.market_cache.load_markets_raw",
+        new_callable=AsyncMock,
+        return_value=MOCK_RAW_MARKETS
+    )
+
+# --- Тесты ---
+
+@pytest.mark.asyncio
+async def test_filtered_index_and_memory_hit(mock_exchange, mock_load):
+    """Первый вызов загружает рынки, второй берет их из памяти."""
+    markets1 = await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+    markets2 = await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+
+    assert set(markets1) == {'BTC/USDT:USDT', 'SOL/USDT:USDT'}
+    assert markets2 is markets1  # Индекс построен один раз
+    mock_load.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_separate_index_per_quote_set(mock_exchange, mock_load):
+    usdt = await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+    both = await get_filtered_markets(mock_exchange, ['USDC', 'USDT'], "[Test]")
+
+    assert 'ETH/USDC:USDC' not in usdt
+    assert set(both) == {'BTC/USDT:USDT', 'SOL/USDT:USDT', 'ETH/USDC:USDC'}
+    mock_load.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_disk_snapshot_used_after_restart(mock_exchange, mock_load):
+    """После "рестарта" (пустая память) рынки читаются со снимка, биржа не вызывается."""
+    await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+
+    market_cache._raw_markets.clear()
+    market_cache._loaded_at.clear()
+    market_cache._fingerprints.clear()
+    market_cache._filtered_index.clear()
+
+    fresh_exchange = MagicMock()
+    fresh_exchange.id = 'binanceusdm'
+    fresh_exchange.markets = None
+
+    markets = await get_filtered_markets(fresh_exchange, ['USDT'], "[Test]")
+
+    assert set(markets) == {'BTC/USDT:USDT', 'SOL/USDT:USDT'}
+    mock_load.assert_awaited_once()
+    # Рынки переданы в экземпляр ccxt (без собственного load_markets)
+    fresh_exchange.set_markets.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiry_reloads_and_falls_back_on_error(mock_exchange, mock_load, mocker):
+    mock_time = mocker.patch('services.market_cache.time.time', return_value=1000.0)
+    await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+
+    # TTL истек, биржа недоступна -> используем устаревшие данные
+    mock_time.return_value = 1000.0 + 3601
+    mock_load.return_value = None
+    markets = await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+
+    assert set(markets) == {'BTC/USDT:USDT', 'SOL/USDT:USDT'}
+    assert mock_load.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_cached_symbols_without_exchange(mock_exchange, mock_load):
+    assert get_cached_symbols('binanceusdm') is None
+
+    await get_filtered_markets(mock_exchange, ['USDT'], "[Test]")
+    market_cache._raw_markets.clear()
+    market_cache._filtered_index.clear()
+    market_cache._fingerprints.clear()
+
+    loaded = await load_snapshots(['binanceusdm', 'bybit'], "[Test]")
+
+    assert loaded == 1
+    assert get_cached_symbols('binanceusdm', ['USDT']) == ['BTC/USDT:USDT', 'SOL/USDT:USDT']
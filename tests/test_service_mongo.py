@@ -39,11 +39,10 @@ async def test_load_blacklist_success(mocker):
         {"symbol": "SOL"},
         {} # Пустой документ для проверки устойчивости
     ]
-    mock_collection.find.return_value = mock_blacklist_docs
-    
-    # 3. Связываем моки
-    mock_db.blacklist = mock_collection
-    mock_client.general = mock_db
+    # 3. Связываем моки (async-курсор: 'async for doc in find(...)')
+    mock_collection.find.return_value.__aiter__.return_value = mock_blacklist_docs
+    mock_db.__getitem__.return_value = mock_collection
+    mock_client.__getitem__.return_value = mock_db
     
     # --- (ИЗМЕНЕНИЕ №1) ИСПРАВЛЕНИЕ AssertionError ---
     # Мокаем 'os.getenv', чтобы он вернул фейковый URL.
@@ -51,8 +50,8 @@ async def test_load_blacklist_success(mocker):
     mocker.patch('os.getenv', return_value='mongodb://fake-url-for-test')
     # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
-    # 4. Мокаем 'MongoClient' из pymongo, чтобы он вернул наш мок
-    mocker.patch("services.mongo_service.MongoClient", return_value=mock_client)
+    # 4. Мокаем 'AsyncMongoClient' из pymongo, чтобы он вернул наш мок
+    mocker.patch("services.mongo_service.AsyncMongoClient", return_value=mock_client)
 
     # 5. Вызываем тестируемую функцию
     blacklist = await load_blacklist_from_mongo_async(log_prefix="[Test]")
@@ -80,9 +79,9 @@ async def test_load_blacklist_connection_error(mocker):
     mocker.patch('os.getenv', return_value='mongodb://fake-url-for-test')
     # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
-    # 1. Мокаем 'MongoClient', чтобы он вызвал ошибку при создании
+    # 1. Мокаем 'AsyncMongoClient', чтобы он вызвал ошибку при создании
     mocker.patch(
-        "services.mongo_service.MongoClient", 
+        "services.mongo_service.AsyncMongoClient", 
         side_effect=Exception("Connection Failed")
     )
     
@@ -121,4 +120,131 @@ async def test_mongo_client_singleton(mocker):
     assert client3 is mock_client_instance
     
     # Главная проверка: MongoClient (класс) был вызван только 1 раз
-    mock_mongo_client_class.assert_called_once()
\ No newline at end of file
+    mock_mongo_client_class.assert_called_once()
+
+def _mock_db(mocker, collections, counts):
+    """Мок БД 'general': коллекции по имени, count_documents -> counts[имя]."""
+    from services import mongo_service
+
+    mock_collections = {}
+
+    def get_collection(name):
+        if name not in mock_collections:
+            mock_collection = MagicMock()
+            mock_collection.count_documents.side_effect = (
+                lambda query: 0 if 'full_symbol' in query else counts.get(name, 0)
+            )
+            mock_collections[name] = mock_collection
+        return mock_collections[name]
+
+    mock_db = MagicMock()
+    mock_db.__getitem__.side_effect = get_collection
+    mock_db.list_collection_names.return_value = collections
+    mock_client = MagicMock()
+    mock_client.__getitem__.return_value = mock_db
+    mocker.patch.object(mongo_service, 'get_mongo_client', return_value=mock_client)
+    return mock_db, get_collection
+
+
+def test_save_coins_swaps_collection_atomically(mocker):
+    """
+    Сохранение не очищает рабочую коллекцию: версия пишется рядом,
+    проверяется и подменяет 'coin-sifter' через rename(dropTarget=True).
+    """
+    from services import mongo_service
+
+    docs = [{'full_symbol': 'A/USDT:USDT'}, {'full_symbol': 'B/USDT:USDT'}]
+    counts = {}
+    mock_db, get_collection = _mock_db(mocker, ['coin-sifter', 'coin-sifter__staging_old'], counts)
+    mocker.patch.object(
+        mongo_service, 'staging_collection_name', return_value='coin-sifter__staging_save_1'
+    )
+    counts['coin-sifter__staging_save_1'] = 2
+
+    assert mongo_service._save_coins_to_mongo_v3_sync(docs, "[Test]") == 2
+
+    get_collection('coin-sifter').delete_many.assert_not_called()
+    get_collection('coin-sifter').aggregate.assert_called_once_with([{'$out': 'coin-sifter__previous'}])
+    get_collection('coin-sifter__staging_save_1').rename.assert_called_once_with('coin-sifter', dropTarget=True)
+    mock_db.drop_collection.assert_called_once_with('coin-sifter__staging_old')
+
+
+def test_save_coins_incomplete_version_is_not_promoted(mocker):
+    from services import mongo_service
+
+    mock_db, get_collection = _mock_db(mocker, ['coin-sifter'], {'coin-sifter__staging_save_2': 1})
+    mocker.patch.object(
+        mongo_service, 'staging_collection_name', return_value='coin-sifter__staging_save_2'
+    )
+
+    docs = [{'full_symbol': 'A/USDT:USDT'}, {'full_symbol': 'B/USDT:USDT'}]
+    assert mongo_service._save_coins_to_mongo_v3_sync(docs, "[Test]") == 0
+
+    get_collection('coin-sifter__staging_save_2').rename.assert_not_called()
+    mock_db.drop_collection.assert_called_once_with('coin-sifter__staging_save_2')
+
+
+def test_diff_compares_datetimes_in_utc(mocker):
+    """
+    Mongo возвращает наивные datetime (UTC) -> одинаковый момент в aware-виде
+    не считается изменением (в т.ч. внутри 'analyzed_at_tf').
+    """
+    from datetime import datetime, timezone, timedelta
+    from services import mongo_service
+
+    stored_at = datetime(2024, 5, 1, 12, 0, 0, 123000)
+    old_doc = {'_id': 1, 'full_symbol': 'A', 'analyzed_at_tf': {'1h': stored_at}, 'last_updated': stored_at}
+
+    same = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    same_in_msk = same.astimezone(timezone(timedelta(hours=3)))
+    to_set, to_unset = mongo_service._diff_coin_doc(
+        {'full_symbol': 'A', 'analyzed_at_tf': {'1h': same_in_msk}, 'last_updated': same}, old_doc
+    )
+    assert to_set == {} and to_unset == {}
+
+    later = datetime(2024, 5, 1, 13, 0, tzinfo=timezone.utc)
+    to_set, _ = mongo_service._diff_coin_doc(
+        {'full_symbol': 'A', 'analyzed_at_tf': {'1h': later}, 'last_updated': same}, old_doc
+    )
+    assert to_set == {'analyzed_at_tf': {'1h': later}}
+
+
+def test_rollback_restores_previous_version(mocker):
+    from services import mongo_service
+
+    mock_db, get_collection = _mock_db(mocker, ['coin-sifter', 'coin-sifter__previous'], {'coin-sifter__previous': 5})
+
+    assert mongo_service._rollback_coins_collection_sync("[Test]") == 5
+    get_collection('coin-sifter__previous').rename.assert_called_once_with('coin-sifter', dropTarget=True)
+
+
+def test_diff_upsert_writes_only_changed_fields(mocker):
+    from services import mongo_service
+
+    current = [
+        {'_id': 1, 'full_symbol': 'A', 'hurst_1d': 0.5, 'usdPrice': 10.0, 'old_metric': 1.0},
+        {'_id': 2, 'full_symbol': 'B', 'hurst_1d': 0.6, 'usdPrice': 20.0},
+        {'_id': 3, 'full_symbol': 'GONE', 'hurst_1d': 0.1},
+    ]
+    mock_collection = MagicMock()
+    mock_collection.find.return_value = current
+    mock_client = MagicMock()
+    mock_client.__getitem__.return_value.__getitem__.return_value = mock_collection
+    mocker.patch.object(mongo_service, 'get_mongo_client', return_value=mock_client)
+
+    new_docs = [
+        {'full_symbol': 'A', 'hurst_1d': 0.5 + 1e-9, 'usdPrice': 11.0},   # цена изменилась, hurst в допуске
+        {'full_symbol': 'B', 'hurst_1d': 0.6, 'usdPrice': 20.0},           # без изменений
+        {'full_symbol': 'NEW', 'hurst_1d': 0.7, 'usdPrice': 1.0},
+    ]
+    saved, report = mongo_service._upsert_coins_diff_sync(new_docs, "[Test]")
+
+    assert saved == 3
+    assert (report['inserted'], report['updated'], report['unchanged'], report['deleted']) == (1, 1, 1, 1)
+    assert report['bytes_written'] < report['bytes_full']
+
+    operations = mock_collection.bulk_write.call_args.args[0]
+    update_a = next(op for op in operations if type(op).__name__ == 'UpdateOne')
+    assert update_a._doc == {'$set': {'usdPrice': 11.0}, '$unset': {'old_metric': ""}}
+    delete = next(op for op in operations if type(op).__name__ == 'DeleteMany')
+    assert delete._filter == {'full_symbol': {'$in': ['GONE']}}
@@ -0,0 +1,171 @@
+# tests/test_service_mongo_async.py
+
+import pytest
+import asyncio
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from services import mongo_service
+
+# --- Локальная замена MongoDB (async API pymongo) ---
+
+
+class FakeAsyncCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key, direction):
+        self._docs = sorted(self._docs, key=lambda d: d.get(key), reverse=direction == -1)
+        return self
+
+    def limit(self, n):
+        self._docs = self._docs[:n]
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        # Как у драйвера: каждая порция — точка переключения event loop
+        await asyncio.sleep(0)
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeAsyncCollection:
+    def __init__(self):
+        self.docs = []
+
+    @staticmethod
+    def _matches(doc, query):
+        return all(doc.get(k) == v for k, v in query.items())
+
+    @staticmethod
+    def _project(doc, projection):
+        if not projection:
+            return dict(doc)
+        include = {k for k, v in projection.items() if v}
+        if include:
+            out = {k: v for k, v in doc.items() if k in include}
+            if projection.get('_id', 1):
+                out['_id'] = doc['_id']
+            return out
+        return {k: v for k, v in doc.items() if k not in projection}
+
+    def find(self, query=None, projection=None):
+        return FakeAsyncCursor([
+            self._project(d, projection) for d in self.docs if self._matches(d, query or {})
+        ])
+
+    async def insert_one(self, doc):
+        doc = {'_id': ObjectId(), **doc}
+        self.docs.append(doc)
+        return SimpleNamespace(inserted_id=doc['_id'])
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if self._matches(doc, query):
+                doc.update(update.get('$set', {}))
+                return SimpleNamespace(matched_count=1)
+        return SimpleNamespace(matched_count=0)
+
+    async def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not self._matches(d, query)]
+        return SimpleNamespace(deleted_count=before - len(self.docs))
+
+    async def create_index(self, *args, **kwargs):
+        return 'index'
+
+
+class FakeAsyncClient:
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+        self.dbs = {}
+        self.closed = False
+
+    def __getitem__(self, name):
+        return self.dbs.setdefault(name, _FakeDb())
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeAsyncCollection()
+        return self[name]
+
+# --- Фикстуры (Настройка тестов) ---
+
+@pytest.fixture
+def fake_client(mocker):
+    mocker.patch('os.getenv', return_value='mongodb://fake-url-for-test')
+    client_class = mocker.patch('services.mongo_service.AsyncMongoClient', side_effect=FakeAsyncClient)
+    mongo_service._async_mongo_client = None
+    yield client_class
+    mongo_service._async_mongo_client = None
+    mongo_service._async_client_loop = None
+
+# --- Тесты ---
+
+@pytest.mark.asyncio
+async def test_log_lifecycle(fake_client):
+    log_id = await mongo_service.create_mongo_log_entry("Запуск")
+    await mongo_service.update_mongo_log_status(log_id, "Завершен", "ok", coins_saved=7)
+    await mongo_service.update_mongo_log_fields(log_id, {'coverage': {'fresh': 7}})
+
+    logs = await mongo_service.get_mongo_logs(limit=10)
+    assert len(logs) == 1
+    assert logs[0]['id'] == log_id
+    assert logs[0]['status'] == "Завершен" and logs[0]['coins_saved'] == 7
+    assert logs[0]['coverage'] == {'fresh': 7}
+
+    assert await mongo_service.clear_all_mongo_logs("[Test]") == 1
+    assert await mongo_service.get_mongo_logs() == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_pool_without_threads(fake_client, mocker):
+    """
+    Параллельные запросы API идут через один async-клиент (пул) и не
+    занимают потоки (asyncio.to_thread не вызывается).
+    """
+    to_thread = mocker.patch('services.mongo_service.asyncio.to_thread')
+    client = mongo_service.get_async_mongo_client("[Test]")
+    coins = client[mongo_service.DB_NAME][mongo_service.COINS_COLLECTION]
+    coins.docs = [{'_id': ObjectId(), 'full_symbol': f"C{i}/USDT:USDT", 'category': 1} for i in range(20)]
+    client[mongo_service.DB_NAME][mongo_service.BLACKLIST_COLLECTION].docs = [{'_id': ObjectId(), 'symbol': 'SOL'}]
+
+    results = await asyncio.gather(*(
+        [mongo_service.get_all_coins_from_mongo_async("[Test]") for _ in range(25)]
+        + [mongo_service.load_blacklist_from_mongo_async("[Test]") for _ in range(25)]
+    ))
+
+    assert all(len(r) == 20 and '_id' not in r[0] for r in results[:25])
+    assert all(r == {'SOL'} for r in results[25:])
+    fake_client.assert_called_once()
+    assert fake_client.call_args.kwargs['maxPoolSize'] == mongo_service.ASYNC_MAX_POOL_SIZE
+    to_thread.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_client_of_previous_loop_is_closed(fake_client):
+    """Смена event loop (например, новый тест/воркер): прежний клиент закрывается, а не "утекает"."""
+    old_loop = asyncio.new_event_loop()
+    old_loop.close()
+    old_client = FakeAsyncClient()
+    mongo_service._async_mongo_client = old_client
+    mongo_service._async_client_loop = old_loop
+
+    client = mongo_service.get_async_mongo_client("[Test]")
+    await asyncio.sleep(0)
+
+    assert client is not old_client
+    assert old_client.closed
+    assert mongo_service.get_async_mongo_client("[Test]") is client
+    fake_client.assert_called_once()
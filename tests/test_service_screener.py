@@ -0,0 +1,76 @@
+# tests/test_service_screener.py
+
+import math
+import pytest
+
+import config
+from services.columnar_index import ColumnarIndex
+from services.screener import compile_screen, screen_mask, build_saved_screens
+
+# --- Данные для моков ---
+
+COINS = [
+    {"full_symbol": "A", "hurst_4h": 0.70, "adx_above_25_pct_90d_4h": 55.0, "category": 5},
+    {"full_symbol": "B", "hurst_4h": 0.60, "adx_above_25_pct_90d_4h": 20.0, "category": 6},
+    {"full_symbol": "C", "hurst_4h": math.nan, "adx_above_25_pct_90d_4h": 80.0, "category": 4},
+    {"full_symbol": "D", "hurst_4h": 0.40, "adx_above_25_pct_90d_4h": 45.0, "category": 2},
+]
+
+
+@pytest.fixture
+def index():
+    return ColumnarIndex(COINS)
+
+# --- Тесты ---
+
+def test_expression_evaluates_to_mask(index):
+    mask = screen_mask(index, "hurst_4h > 0.55 and adx_above_25_pct_90d_4h > 40 and category >= 4")
+    assert mask.tolist() == [True, False, False, False]
+
+
+def test_or_not_chains_and_arithmetic(index):
+    assert screen_mask(index, "0.5 < hurst_4h < 0.65 or category <= 2").tolist() == [False, True, False, True]
+    # NaN не проходит ни сравнение, ни 'not'
+    assert screen_mask(index, "not hurst_4h > 0.5").tolist() == [False, False, False, True]
+    assert screen_mask(index, "not (hurst_4h > 0.5 or category >= 6)").tolist() == [False, False, False, True]
+    assert screen_mask(index, "adx_above_25_pct_90d_4h / 100 - hurst_4h > 0").tolist() == [False, False, False, True]
+
+
+def test_constant_subexpressions_are_folded(index):
+    assert screen_mask(index, "hurst_4h > 1 / 2 + 0.1").tolist() == [True, False, False, False]
+    assert screen_mask(index, "-(2 * 3) < 0").tolist() == [True, True, True, True]
+    # Деление на 0 в константе — ошибка выражения (а не 500)
+    with pytest.raises(ValueError, match="Division by zero"):
+        compile_screen("1/0 > 0")
+    with pytest.raises(ValueError, match="Division by zero"):
+        compile_screen("hurst_4h > 1 / (2 - 2)")
+
+
+def test_compiled_once_per_expression_text():
+    compile_screen.cache_clear()
+    compile_screen("category >= 4")
+    compile_screen("category >= 4")
+    assert compile_screen.cache_info().hits == 1
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('ls')",
+    "symbol == 1",
+    "no_such_metric > 1",
+    "hurst_4h",
+    "hurst_4h ** 2 > 1",
+    "hurst_4h in [1, 2]",
+    "hurst_4h >",
+    "",
+])
+def test_unsafe_or_invalid_expressions_are_rejected(index, expression):
+    with pytest.raises(ValueError):
+        screen_mask(index, expression)
+
+
+def test_saved_screens_are_precomputed(index, mocker):
+    mocker.patch.object(config, "SAVED_SCREENS", {"top": "category >= 5", "broken": "nope > 1"})
+
+    screens = build_saved_screens(index)
+    assert list(screens) == ["top"]
+    assert screens["top"].tolist() == [True, True, False, False]
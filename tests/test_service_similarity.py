@@ -0,0 +1,65 @@
+# tests/test_service_similarity.py
+
+import math
+import time
+import numpy as np
+import pytest
+
+from services.columnar_index import ColumnarIndex
+from services.similarity import SimilarityIndex
+
+FEATURES = ["hurst_4h", "fractal_dimension_4h", "mci_4h"]
+
+# --- Данные для моков ---
+
+COINS = [
+    {"full_symbol": "A/USDT:USDT:USDT", "symbol": "A/USDT:USDT", "hurst_4h": 0.70, "fractal_dimension_4h": 1.30, "mci_4h": 0.60},
+    {"full_symbol": "B/USDT:USDT:USDT", "symbol": "B/USDT:USDT", "hurst_4h": 0.69, "fractal_dimension_4h": 1.31, "mci_4h": 0.58},
+    {"full_symbol": "C/USDT:USDT:USDT", "symbol": "C/USDT:USDT", "hurst_4h": 0.40, "fractal_dimension_4h": 1.70, "mci_4h": 0.20},
+    {"full_symbol": "D/USDT:USDT:USDT", "symbol": "D/USDT:USDT", "hurst_4h": 0.45, "fractal_dimension_4h": 1.65, "mci_4h": math.nan},
+    {"full_symbol": "E/USDT:USDT:USDT", "symbol": "E/USDT:USDT"},
+]
+
+
+@pytest.fixture
+def similarity():
+    return SimilarityIndex(ColumnarIndex(COINS), features=FEATURES)
+
+# --- Тесты ---
+
+def test_similar_to_symbol_excludes_itself(similarity):
+    result = similarity.similar_to("A/USDT:USDT:USDT", k=2)
+
+    assert [r["full_symbol"] for r in result] == ["B/USDT:USDT:USDT", "D/USDT:USDT:USDT"]
+    assert result[0]["distance"] < result[1]["distance"]
+    # Поиск и по короткому symbol
+    assert similarity.similar_to("C/USDT:USDT", k=1)[0]["full_symbol"] == "D/USDT:USDT:USDT"
+
+
+def test_coin_without_metrics_is_not_indexed(similarity):
+    assert similarity.similar_to("E/USDT:USDT:USDT") is None
+    assert similarity.similar_to("NOPE") is None
+    assert len(similarity.similar_to("A/USDT:USDT:USDT", k=10)) == 3
+
+
+def test_vector_query_and_unknown_feature(similarity):
+    vector = similarity.vector_from_values({"hurst_4h": 0.41, "fractal_dimension_4h": 1.69, "mci_4h": 0.21})
+    assert similarity.nearest(vector, k=1)[0]["full_symbol"] == "C/USDT:USDT:USDT"
+
+    with pytest.raises(ValueError):
+        similarity.vector_from_values({"no_such_feature": 1.0})
+
+
+def test_query_is_fast_on_thousands_of_coins():
+    rng = np.random.default_rng(7)
+    coins = [
+        {"full_symbol": f"C{i}", **dict(zip(FEATURES, rng.random(3)))}
+        for i in range(5000)
+    ]
+    similarity = SimilarityIndex(ColumnarIndex(coins), features=FEATURES)
+
+    started = time.perf_counter()
+    for i in range(200):
+        similarity.similar_to(f"C{i}", k=10)
+    per_query = (time.perf_counter() - started) / 200
+    assert per_query < 0.005